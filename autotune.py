@@ -0,0 +1,197 @@
+#####################################################################
+#                                                                   #
+# Red Pitaya PID (pyrpl) step-response autotuning                   #
+#                                                                   #
+# Fits a first-order-plus-dead-time (FOPDT) model                   #
+#   G(s) = K exp(-L s) / (1 + T s)                                  #
+# to an open-loop step response and proposes PI gains for the      #
+# PID's controller C(s) = p + 2 pi i / s (i in Hz, as in pyrpl).    #
+# All fits and margin searches are NumPy grid evaluations.          #
+#                                                                   #
+#####################################################################
+
+import numpy as np
+
+# Gain ranges of the modified bitstream: p has 12 fractional bits in a
+# 24-bit register, i (the integrator unity-gain frequency) was doubled to 2.5 MHz
+P_MAX = 2 ** 11
+I_MAX = 2.5e6
+# Default target: phase margin in degrees
+PHASE_MARGIN = 60.0
+
+# Grid sizes of the model fit (each refined once) and of the frequency searches
+FIT_GRID = 64
+FIT_POINTS = 512
+FREQ_POINTS = 2000
+
+
+def _step_basis(t, delay, tau):
+    """Unit FOPDT step responses for every (delay, tau) pair: shape delay.shape + t.shape."""
+    shifted = t - delay[..., None]
+    return np.where(shifted > 0, -np.expm1(-np.clip(shifted, 0, None) / tau[..., None]), 0.0)
+
+
+def _grid_fit(t, y, delays, taus):
+    """Best (delay, tau, amplitude, offset, residual) of y ~ offset + amplitude * basis over the grids.
+
+    The linear least-squares amplitude and offset are solved in closed form
+    for all (delay, tau) pairs at once.
+    """
+    d, T = np.meshgrid(delays, taus, indexing='ij')
+    basis = _step_basis(t, d, T)
+    n = len(y)
+    s_b = basis.sum(axis=-1)
+    s_bb = np.einsum('ijk,ijk->ij', basis, basis)
+    s_by = basis @ y
+    s_y = y.sum()
+    det = n * s_bb - s_b ** 2
+    with np.errstate(divide='ignore', invalid='ignore'):
+        amplitude = np.where(det > 0, (n * s_by - s_b * s_y) / det, 0.0)
+    offset = (s_y - amplitude * s_b) / n
+    residual = y @ y - offset * s_y - amplitude * s_by
+    i, j = np.unravel_index(np.argmin(residual), residual.shape)
+    return d[i, j], T[i, j], amplitude[i, j], offset[i, j], residual[i, j]
+
+
+def fit_fopdt(t, y, step):
+    """Fit an FOPDT model to the response y(t) to an input step of size `step` at t = 0.
+
+    Samples before the step (t < 0) only inform the fitted offset. Returns a
+    dict with gain K, time constant tau and delay L (seconds), the offset,
+    the fitted curve and the RMS residual. The coarse grid is refined once
+    around its optimum.
+    """
+    t = np.asarray(t, dtype=float)
+    y = np.asarray(y, dtype=float)
+    if len(t) > FIT_POINTS:
+        block = len(t) // FIT_POINTS
+        n = block * FIT_POINTS
+        t = t[:n].reshape(-1, block).mean(axis=1)
+        y = y[:n].reshape(-1, block).mean(axis=1)
+    span = t[-1]
+    if span <= 0:
+        raise ValueError('No samples after the step')
+    dt = float(np.median(np.diff(t)))
+    delays = np.linspace(0.0, span / 2, FIT_GRID)
+    taus = np.geomspace(dt / 4, 2 * span, FIT_GRID)
+    delay, tau = _grid_fit(t, y, delays, taus)[:2]
+
+    d_step = delays[1] - delays[0]
+    ratio = (taus[1] / taus[0]) ** 2
+    delays = np.linspace(max(0.0, delay - d_step), delay + d_step, FIT_GRID)
+    taus = np.geomspace(tau / ratio, tau * ratio, FIT_GRID)
+    delay, tau, amplitude, offset, residual = _grid_fit(t, y, delays, taus)
+
+    fitted = offset + amplitude * _step_basis(t, np.asarray(delay), np.asarray(tau))
+    return {
+        'gain': float(amplitude / step),
+        'tau': float(tau),
+        'delay': float(delay),
+        'offset': float(offset),
+        'rms_residual': float(np.sqrt(max(residual, 0.0) / len(y))),
+        'time': t,
+        'response': y,
+        'fit': fitted,
+    }
+
+
+def _frequencies(model):
+    """Angular frequency grid covering the model's corner and delay frequencies."""
+    scale = min(model['tau'], model['delay']) if model['delay'] > 0 else model['tau']
+    return np.geomspace(1e-3 / max(model['tau'], model['delay']), 1e3 / scale, FREQ_POINTS)
+
+
+def plant_response(model, w):
+    return model['gain'] * np.exp(-1j * w * model['delay']) / (1 + 1j * w * model['tau'])
+
+
+def ultimate_gain(model):
+    """(Ku, Pu): proportional gain and period at which the model loop oscillates.
+
+    Solves arg G(jw) = -180 deg; without delay the FOPDT model never gets
+    there and (inf, None) is returned.
+    """
+    if model['delay'] <= 0:
+        return float('inf'), None
+    w = _frequencies(model)
+    phase = -np.arctan(w * model['tau']) - w * model['delay']
+    k = np.argmax(phase <= -np.pi)
+    if phase[k] > -np.pi:
+        return float('inf'), None
+    # Linear interpolation between the grid points around the crossing
+    w180 = np.interp(-np.pi, phase[k - 1:k + 1][::-1], w[k - 1:k + 1][::-1]) if k else w[0]
+    ku = np.sqrt(1 + (w180 * model['tau']) ** 2) / abs(model['gain'])
+    return float(ku), float(2 * np.pi / w180)
+
+
+def loop_margins(model, p, i):
+    """Crossover frequency (Hz), phase margin and gain margin (deg, factor) of the loop with gains p, i.
+
+    p and i may be arrays of the same shape; the results then are arrays too.
+    """
+    w = _frequencies(model)
+    p = np.asarray(p, dtype=float)[..., None]
+    i = np.asarray(i, dtype=float)[..., None]
+    loop = (p + 2 * np.pi * i / (1j * w)) * plant_response(model, w)
+    magnitude = np.abs(loop)
+    phase = np.unwrap(np.angle(loop), axis=-1)
+    # Last crossing of |L| = 1 from above, i.e. the loop bandwidth
+    above = magnitude >= 1
+    crossing = np.where(above.any(axis=-1), FREQ_POINTS - 1 - np.argmax(above[..., ::-1], axis=-1), 0)
+    wc = w[crossing]
+    phase_margin = np.degrees(np.take_along_axis(phase, crossing[..., None], axis=-1)[..., 0]) + 180.0
+    # Phase margin is defined modulo 360 deg
+    phase_margin = (phase_margin + 180.0) % 360.0 - 180.0
+    below = phase <= -np.pi
+    k = np.argmax(below, axis=-1)
+    gain_margin = np.where(below.any(axis=-1),
+                           1 / np.take_along_axis(magnitude, k[..., None], axis=-1)[..., 0], np.inf)
+    return wc / (2 * np.pi), phase_margin, gain_margin
+
+
+def simc_gains(model, tau_c):
+    """SIMC PI gains for closed-loop time constant tau_c: p = T / (K (tau_c + L)), Ti = min(T, 4 (tau_c + L))."""
+    tau_c = np.asarray(tau_c, dtype=float)
+    kc = model['tau'] / (abs(model['gain']) * (tau_c + model['delay']))
+    ti = np.minimum(model['tau'], 4 * (tau_c + model['delay']))
+    sign = np.sign(model['gain']) or 1.0
+    return sign * kc, sign * kc / (2 * np.pi * ti)
+
+
+def propose_pi(model, bandwidth=None, phase_margin=None, p_max=P_MAX, i_max=I_MAX):
+    """PI gains for a target loop bandwidth (Hz) or, by default, phase margin (deg).
+
+    For a phase margin the fastest SIMC tuning that keeps it is searched on a
+    grid of closed-loop time constants. Gains beyond the register ranges are
+    clipped and 'limited' says which; the margins are those of the returned gains.
+    """
+    if bandwidth is not None:
+        tau_c = 1 / (2 * np.pi * float(bandwidth))
+        target = {'bandwidth': float(bandwidth)}
+    else:
+        phase_margin = PHASE_MARGIN if phase_margin is None else float(phase_margin)
+        scale = max(model['delay'], model['tau'] / 100)
+        candidates = np.geomspace(scale / 20, 100 * max(model['tau'], scale), 200)
+        _, margins, _ = loop_margins(model, *simc_gains(model, candidates))
+        ok = margins >= phase_margin
+        tau_c = candidates[np.argmax(ok)] if ok.any() else candidates[-1]
+        target = {'phase_margin': phase_margin}
+    p, i = simc_gains(model, tau_c)
+    limited = []
+    if abs(p) > p_max:
+        p = np.copysign(p_max, p)
+        limited.append('p')
+    if abs(i) > i_max:
+        i = np.copysign(i_max, i)
+        limited.append('i')
+    crossover, margin, gain_margin = loop_margins(model, p, i)
+    return {
+        'p': float(p),
+        'i': float(i),
+        'tau_c': float(tau_c),
+        'target': target,
+        'crossover': float(crossover),
+        'phase_margin': float(margin),
+        'gain_margin': float(gain_margin),
+        'limited': limited,
+    }
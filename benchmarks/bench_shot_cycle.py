@@ -0,0 +1,215 @@
+#####################################################################
+#                                                                   #
+# Red Pitaya PID (pyrpl) shot-cycle benchmark                       #
+#                                                                   #
+# Compiles shots with the labscript device into temporary HDF5      #
+# files and drives the BLACS worker through the shot path against   #
+# the simulated board (simulation.py) with realistic per-access     #
+# latency. Wall time, register accesses and bytes moved per call    #
+# are compared with baseline.json; exceeding a threshold fails.     #
+# Wall time gets an absolute slack on top of its relative limit.    #
+#                                                                   #
+# Usage (labscript, h5py and blacs must be importable):             #
+#   python benchmarks/bench_shot_cycle.py [--repeats N]             #
+#   python benchmarks/bench_shot_cycle.py --update-baseline         #
+#                                                                   #
+#####################################################################
+
+import argparse
+import importlib
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+HERE = Path(__file__).resolve().parent
+BASELINE = HERE / 'baseline.json'
+
+# The package is the repository directory itself; import it by name from its parent
+sys.path.insert(0, str(HERE.parent.parent))
+PACKAGE = HERE.parent.name
+
+DEVICE_NAME = 'red_pitaya'
+# 0.5 ms per round trip and ~10 MB/s, typical of the pyrpl monitor server over a LAN
+SIM_ADDRESS = 'sim://bench?latency=0.0005&bandwidth=10e6&scope_wait=0'
+
+# Relative thresholds used when baseline.json does not set its own
+TOLERANCE = {'accesses': 1.25, 'bytes': 1.25, 'wall_time': 2.0}
+# Wall time may also exceed its baseline by this many seconds: sub-ms phases are below timing noise
+WALL_TIME_SLACK = 5e-3
+
+
+def compile_shot(path, arrays):
+    """Compile a shot with the labscript device setting the given {channel: setpoint array}."""
+    import labscript
+    from labscript_devices.DummyPseudoclock.labscript_devices import DummyPseudoclock
+    device_module = importlib.import_module(f'{PACKAGE}.labscript_devices')
+
+    labscript.labscript_init(path, new=True, overwrite=True, load_globals_values=False)
+    DummyPseudoclock('pseudoclock')
+    device = device_module.red_pitaya_pyrpl_pid(DEVICE_NAME, ip_addr=SIM_ADDRESS)
+    for channel, array in arrays.items():
+        device.set_setpoint_array(channel, array)
+    labscript.start()
+    labscript.stop(1.0)
+    labscript.labscript_cleanup()
+    return path
+
+
+def make_worker():
+    """Create and initialise the BLACS worker without a BLACS process around it."""
+    workers = importlib.import_module(f'{PACKAGE}.blacs_workers')
+    worker = workers.red_pitaya_pyrpl_pid_worker.__new__(workers.red_pitaya_pyrpl_pid_worker)
+    worker.ip_addr = SIM_ADDRESS
+    worker.fast_attach = False
+    # BLACS sets this; it names the calibration file shared with the compiled shots
+    worker.device_name = DEVICE_NAME
+    worker.init()
+    return worker
+
+
+def measure(client, func, repeats):
+    """Call func() `repeats` times; return per-call median wall time, accesses and bytes."""
+    times = []
+    accesses = []
+    nbytes = []
+    for _ in range(repeats):
+        client.reset_counters()
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+        accesses.append(client.read_count + client.write_count)
+        nbytes.append(client.bytes_read + client.bytes_written)
+    return {
+        'wall_time': statistics.median(times),
+        'accesses': statistics.median(accesses),
+        'bytes': statistics.median(nbytes),
+    }
+
+
+def run(repeats):
+    simulation = importlib.import_module(f'{PACKAGE}.simulation')
+    tmpdir = tempfile.mkdtemp(prefix='rp_pid_bench_')
+    # Compiler and worker share a calibration file in tmpdir, not the user's ~/.red_pitaya_pyrpl_pid
+    calibration = importlib.import_module(f'{PACKAGE}.calibration')
+    calibration.CALIBRATION_DIR = tmpdir
+    rng = np.random.default_rng(0)
+    shots = [
+        compile_shot(os.path.join(tmpdir, f'shot_{k}.h5'), {
+            'in1': rng.uniform(0.0, 0.5, 16).tolist(),
+            'in2': rng.uniform(0.0, 0.5, 16).tolist(),
+        })
+        for k in range(2)
+    ]
+
+    # The simulated board is created by the first connection, so its counters cover the whole init
+    start = time.perf_counter()
+    worker = make_worker()
+    init_time = time.perf_counter() - start
+    client = simulation.get_board('bench').client
+    results = {'init': {
+        'wall_time': init_time,
+        'accesses': client.read_count + client.write_count,
+        'bytes': client.bytes_read + client.bytes_written,
+    }}
+
+    shot_cycle = iter(range(10 ** 9))
+
+    def new_shot():
+        # Alternate between two shots so that every upload is a real change
+        worker.transition_to_buffered(DEVICE_NAME, shots[next(shot_cycle) % 2], {}, False)
+
+    def repeat_shot():
+        worker.transition_to_buffered(DEVICE_NAME, shots[0], {}, False)
+
+    def cycle_sources():
+        for source in ('analog_setpoint', 'digital_setpoint_in1', 'digital_setpoint_in2'):
+            worker.set_setpoint_source(source)
+
+    phases = {
+        'transition_to_buffered': new_shot,
+        'transition_to_buffered_unchanged': repeat_shot,
+        'transition_to_manual': worker.transition_to_manual,
+        'abort_buffered': worker.abort_buffered,
+        'set_setpoint_source': cycle_sources,
+        'check_hardware_status': worker.check_hardware_status,
+    }
+    for name, func in phases.items():
+        func()  # warm up caches as in a running experiment
+        results[name] = measure(client, func, repeats)
+    worker.shutdown()
+    return results
+
+
+def compare(results, baseline):
+    """Return a list of human-readable threshold violations."""
+    failures = []
+    tolerance = dict(TOLERANCE, **baseline.get('tolerance', {}))
+    for phase, expected in baseline.get('phases', {}).items():
+        if phase not in results:
+            failures.append(f"{phase}: missing from the results")
+            continue
+        for metric, reference in expected.items():
+            limit = reference * tolerance[metric]
+            rule = f"x {tolerance[metric]}"
+            if metric == 'wall_time' and reference + WALL_TIME_SLACK > limit:
+                limit = reference + WALL_TIME_SLACK
+                rule = f"+ {WALL_TIME_SLACK:g} s"
+            value = results[phase][metric]
+            if value > limit:
+                failures.append(f"{phase}: {metric} {value:.6g} exceeds {limit:.6g} "
+                                f"(baseline {reference:.6g} {rule})")
+    return failures
+
+
+def report(results):
+    print(f"{'phase':<36}{'wall ms':>10}{'accesses':>10}{'bytes':>10}")
+    for phase, row in results.items():
+        print(f"{phase:<36}{row['wall_time'] * 1e3:>10.2f}{row['accesses']:>10.0f}{row['bytes']:>10.0f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--repeats', type=int, default=10, help='calls per phase (median is reported)')
+    parser.add_argument('--update-baseline', action='store_true', help='write the results to baseline.json')
+    parser.add_argument('--output', help='also write the results to this JSON file')
+    args = parser.parse_args(argv)
+
+    results = run(args.repeats)
+    report(results)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+
+    if args.update_baseline:
+        tolerance = TOLERANCE
+        if BASELINE.exists():
+            with open(BASELINE, 'r', encoding='utf-8') as f:
+                tolerance = json.load(f).get('tolerance', TOLERANCE)
+        with open(BASELINE, 'w', encoding='utf-8') as f:
+            json.dump({'address': SIM_ADDRESS, 'tolerance': tolerance, 'phases': results}, f, indent=2)
+            f.write('\n')
+        print(f"Baseline written to {BASELINE}")
+        return 0
+
+    if not BASELINE.exists():
+        print("No baseline.json yet, run with --update-baseline")
+        return 0
+    with open(BASELINE, 'r', encoding='utf-8') as f:
+        failures = compare(results, json.load(f))
+    if failures:
+        print('\nREGRESSION: shot path exceeds the baseline thresholds')
+        for failure in failures:
+            print('  ' + failure)
+        return 1
+    print('\nAll phases within the baseline thresholds')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
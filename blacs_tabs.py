@@ -9,11 +9,14 @@
 #                                                                   #
 #####################################################################
 
-print("Loading Red Pitaya PID BLACS Tab...")
+import time
+_import_started = time.perf_counter()
 
 import os
 from pathlib import Path
 
+import numpy as np
+
 from blacs.device_base_class import DeviceTab
 from blacs.tab_base_classes import define_state, MODE_MANUAL, MODE_BUFFERED, MODE_TRANSITION_TO_MANUAL
 
@@ -24,12 +27,30 @@ from qtutils.qt.QtWidgets import QLabel, QComboBox, QPushButton, QMessageBox, QS
 from qtutils.qt.QtCore import QTimer
 from qtutils.qt.QtWidgets import *  # noqa: F401,F403
 
-import pyqtgraph as pg
+from .autotune import PHASE_MARGIN, propose_pi
+from .calibration import OUT_MAX, OUT_MIN, OUT_ZERO
+from .event_log import LEVELS, format_events
+from .pid_registers import RegisterShadow
+from .ring_buffer import RingBuffer
+
+# Rolling plot defaults
+PLOT_WINDOW = 5.0       # seconds of history shown
+PLOT_INTERVAL = 100     # ms between plot updates
+SAMPLE_RATE = 100.0     # Hz, worker-side sampler rate
 
-# calibrate the output range
-OUT_MAX = 2.031
-OUT_MIN = 0.007
-OUT_ZERO = (OUT_MAX + OUT_MIN) / 2
+# Parameter edits are merged and sent at most once per interval
+EDIT_INTERVAL = 100     # ms
+EDIT_PENDING_STYLE = 'background-color: #FFF3C4;'
+EDIT_ERROR_STYLE = 'background-color: #F8C8C8;'
+
+# Lock-health indicator: poll interval and colour per monitor state
+HEALTH_INTERVAL = 250   # ms
+HEALTH_STYLES = {
+    'idle': 'background-color: #D0D0D0; font-weight: bold; padding: 2px;',
+    'locked': 'background-color: #8FD98F; font-weight: bold; padding: 2px;',
+    'warning': 'background-color: #F5D36B; font-weight: bold; padding: 2px;',
+    'lost': 'background-color: #F07070; font-weight: bold; padding: 2px;',
+}
 
 
 class red_pitaya_pyrpl_pid_tab(DeviceTab):
@@ -41,6 +62,8 @@ class red_pitaya_pyrpl_pid_tab(DeviceTab):
 
     def initialise_GUI(self):
         """Build the GUI from .ui if available, otherwise create a simple one programmatically."""
+        self._timing = {'import': IMPORT_TIME}
+        gui_started = time.perf_counter()
         layout = self.get_tab_layout()
         ui_path = Path(__file__).parent / 'red_pitaya_pyrpl_pid.ui'
 
@@ -66,6 +89,14 @@ class red_pitaya_pyrpl_pid_tab(DeviceTab):
         if not self._has_loaded_ui:
             self._setup_fallback_signal_connections()
 
+        self._timing['build_ui'] = time.perf_counter() - gui_started
+        # Runs once the event loop is back, i.e. after the tab has first been painted
+        QTimer.singleShot(0, lambda: self._record_first_paint(gui_started))
+
+    def _record_first_paint(self, gui_started):
+        self._timing['first_paint'] = time.perf_counter() - gui_started
+        self.logger.info('Startup timing: %s', ', '.join(f"{key} {value * 1e3:.0f} ms" for key, value in self._timing.items()))
+
     def _build_fallback_ui(self, layout):
         """Create a basic PID control UI programmatically."""
         scroll = QScrollArea()
@@ -86,6 +117,15 @@ class red_pitaya_pyrpl_pid_tab(DeviceTab):
         status_layout.addWidget(self.pause_pid_button, 1, 1, 1, 1)
         self.output_to_zero_button = QPushButton('Output to Zero and Pause')
         status_layout.addWidget(self.output_to_zero_button, 1, 2, 1, 1)
+        self.lock_health_label = QLabel('Lock: not monitored')
+        self.lock_health_label.setStyleSheet(HEALTH_STYLES['idle'])
+        status_layout.addWidget(self.lock_health_label, 3, 0, 1, 2)
+        self.lock_monitor_checkbox = QCheckBox('Monitor lock')
+        self.auto_relock_checkbox = QCheckBox('Auto relock')
+        monitor_controls = QHBoxLayout()
+        monitor_controls.addWidget(self.lock_monitor_checkbox)
+        monitor_controls.addWidget(self.auto_relock_checkbox)
+        status_layout.addLayout(monitor_controls, 3, 2, 1, 1)
 
         # setpoint_source
         setpoint_source_group = QGroupBox('Setpoint Source')
@@ -208,45 +248,138 @@ class red_pitaya_pyrpl_pid_tab(DeviceTab):
         self.plot_group.setMinimumHeight(450)
         
         plot_layout = QVBoxLayout(self.plot_group)
+        self._plot_layout = plot_layout
         
-        self.plot_widget = pg.PlotWidget(self.plot_group, title="PID Error and Ival")
-        self.plot_widget.setLabel('bottom', 'Relative Time (s)')
-        self.plot_widget.setLabel('left', 'Error (Input-Setpoint)')
-        self.plot_widget.showGrid(x=True, y=True)
-
-        self.right_axis = pg.ViewBox()
-        self.plot_widget.showAxis('right')
-        self.plot_widget.scene().addItem(self.right_axis)
-        self.plot_widget.getAxis('right').linkToView(self.right_axis)
-        self.right_axis.setXLink(self.plot_widget)
-
-        self.error_line = self.plot_widget.plot(pen=pg.mkPen('y', width=2), name='Error=Input-Setpoint')
-
-        self.ival_line = pg.PlotDataItem(pen=pg.mkPen('r', width=2), name='Ival')
-        self.right_axis.addItem(self.ival_line)
-        self.plot_widget.getAxis('right').setLabel('Ival')
-
-        legend = pg.LegendItem(offset=(70, 30))
-        legend.setParentItem(self.plot_widget.graphicsItem())
-        legend.addItem(self.error_line, name='Error=Input-Setpoint')
-        legend.addItem(self.ival_line, name='Ival')
-
-        def updateViews():
-            self.right_axis.setGeometry(self.plot_widget.getViewBox().sceneBoundingRect())
-            self.right_axis.linkedViewChanged(self.plot_widget.getViewBox(), self.right_axis.XAxis)
-        self.plot_widget.getViewBox().sigResized.connect(updateViews)
-
-        # Set initial range and disable auto-scaling to fix the x-axis
-        self.plot_widget.setXRange(0, 5, padding=0)
-        self.plot_widget.setLimits(xMin=0, xMax=5)
-        self.plot_widget.setYRange(-1, 1)
-
-        plot_layout.addWidget(self.plot_widget)
+        # The plot itself is built (and pyqtgraph imported) when the rolling plot is first started
+        self.plot_widget = None
+        self._plot_placeholder = QLabel('Start the rolling plot to show the error and ival.')
+        self._plot_placeholder.setAlignment(Qt.AlignCenter)
+        plot_layout.addWidget(self._plot_placeholder, 1)
+        plot_controls = QHBoxLayout()
         self.btn_rolling_plot = QPushButton('Start Rolling Plot')
         self.btn_rolling_plot.setCheckable(True)
-        plot_layout.addWidget(self.btn_rolling_plot)
+        plot_controls.addWidget(self.btn_rolling_plot)
+        plot_controls.addWidget(QLabel('Window (s):'))
+        self.plot_window_spin = QDoubleSpinBox()
+        self.plot_window_spin.setRange(1.0, 24 * 3600.0)
+        self.plot_window_spin.setDecimals(1)
+        self.plot_window_spin.setValue(PLOT_WINDOW)
+        plot_controls.addWidget(self.plot_window_spin)
+        plot_controls.addWidget(QLabel('Rate (Hz):'))
+        self.sample_rate_spin = QDoubleSpinBox()
+        self.sample_rate_spin.setRange(1.0, 2000.0)
+        self.sample_rate_spin.setDecimals(0)
+        self.sample_rate_spin.setValue(SAMPLE_RATE)
+        plot_controls.addWidget(self.sample_rate_spin)
+        plot_layout.addLayout(plot_controls)
         self._auto_plot_timer = QTimer()
-        self._auto_plot_timer.setInterval(100)  # 10Hz update rate
+        self._auto_plot_timer.setInterval(PLOT_INTERVAL)  # 10Hz update rate
+        self._plot_window = PLOT_WINDOW
+        self._sample_rate = SAMPLE_RATE
+        self._rolling = None
+
+        # Calibration
+        calibration_group = QGroupBox('Calibration')
+        calibration_layout = QGridLayout(calibration_group)
+        calibration_layout.addWidget(QLabel('Input:'), 0, 0)
+        self.cal_channel_combo = QComboBox()
+        self.cal_channel_combo.addItems(['both', 'in1', 'in2'])
+        calibration_layout.addWidget(self.cal_channel_combo, 0, 1)
+        calibration_layout.addWidget(QLabel('Reference (V):'), 0, 2)
+        self.cal_reference_edit = QLineEdit('0.0')
+        calibration_layout.addWidget(self.cal_reference_edit, 0, 3)
+        self.btn_cal_measure = QPushButton('Measure Point')
+        self.btn_cal_clear = QPushButton('Clear Points')
+        self.btn_cal_fit = QPushButton('Fit && Save Inputs')
+        calibration_layout.addWidget(self.btn_cal_measure, 1, 0, 1, 2)
+        calibration_layout.addWidget(self.btn_cal_clear, 1, 2)
+        calibration_layout.addWidget(self.btn_cal_fit, 1, 3)
+        calibration_layout.addWidget(QLabel('Loopback:'), 2, 0)
+        self.cal_output_combo = QComboBox()
+        self.cal_output_combo.addItems(['out1 -> in1', 'out2 -> in2', 'out1 -> in2', 'out2 -> in1'])
+        calibration_layout.addWidget(self.cal_output_combo, 2, 1, 1, 2)
+        self.btn_cal_output = QPushButton('Calibrate Output')
+        calibration_layout.addWidget(self.btn_cal_output, 2, 3)
+        self.cal_result_label = QLabel('No calibration run yet')
+        self.cal_result_label.setWordWrap(True)
+        calibration_group.setToolTip(
+            'Calibrations are saved to the calibration_file of the connection table, or to '
+            '~/.red_pitaya_pyrpl_pid/<device>.yml without one. That file is the only source: '
+            'the worker and the shot compiler both read it, the built-in defaults apply while it does not exist.')
+        calibration_layout.addWidget(self.cal_result_label, 3, 0, 1, 4)
+        # Autotune
+        autotune_group = QGroupBox('Autotune')
+        autotune_layout = QGridLayout(autotune_group)
+        autotune_layout.addWidget(QLabel('Target:'), 0, 0)
+        self.autotune_target_combo = QComboBox()
+        self.autotune_target_combo.addItems(['phase margin (deg)', 'bandwidth (Hz)'])
+        autotune_layout.addWidget(self.autotune_target_combo, 0, 1)
+        self.autotune_target_edit = QLineEdit(str(PHASE_MARGIN))
+        autotune_layout.addWidget(self.autotune_target_edit, 0, 2)
+        autotune_layout.addWidget(QLabel('Step:'), 0, 3)
+        self.autotune_step_edit = QLineEdit('0.1')
+        autotune_layout.addWidget(self.autotune_step_edit, 0, 4)
+        self.btn_autotune = QPushButton('Run Autotune')
+        self.btn_autotune_apply = QPushButton('Apply P/I')
+        self.btn_autotune_apply.setEnabled(False)
+        autotune_layout.addWidget(self.btn_autotune, 1, 0, 1, 3)
+        autotune_layout.addWidget(self.btn_autotune_apply, 1, 3, 1, 2)
+        self.autotune_label = QLabel('No autotune run yet')
+        self.autotune_label.setWordWrap(True)
+        autotune_layout.addWidget(self.autotune_label, 2, 0, 1, 5)
+        # Last autotune() result and the proposal previewed for the current target
+        self._autotune = None
+        self._autotune_proposal = None
+        # Diagnostics
+        diagnostics_group = QGroupBox('Diagnostics')
+        diagnostics_layout = QGridLayout(diagnostics_group)
+        self.perf_checkbox = QCheckBox('Record latency')
+        self.btn_perf_refresh = QPushButton('Refresh Stats')
+        self.btn_perf_reset = QPushButton('Reset Stats')
+        self.btn_perf_export = QPushButton('Export...')
+        diagnostics_layout.addWidget(self.perf_checkbox, 0, 0)
+        diagnostics_layout.addWidget(self.btn_perf_refresh, 0, 1)
+        diagnostics_layout.addWidget(self.btn_perf_reset, 0, 2)
+        diagnostics_layout.addWidget(self.btn_perf_export, 0, 3)
+        self.perf_text = QPlainTextEdit()
+        self.perf_text.setReadOnly(True)
+        self.perf_text.setFont(QFont('Courier New', 8))
+        self.perf_text.setMinimumHeight(150)
+        diagnostics_layout.addWidget(self.perf_text, 1, 0, 1, 4)
+        self.log_level_combo = QComboBox()
+        self.log_level_combo.addItems(LEVELS)
+        self.btn_log_show = QPushButton('Show Recent Log')
+        self.btn_log_clear = QPushButton('Clear Log')
+        diagnostics_layout.addWidget(QLabel('Log level'), 2, 0)
+        diagnostics_layout.addWidget(self.log_level_combo, 2, 1)
+        diagnostics_layout.addWidget(self.btn_log_show, 2, 2)
+        diagnostics_layout.addWidget(self.btn_log_clear, 2, 3)
+        self.log_text = QPlainTextEdit()
+        self.log_text.setReadOnly(True)
+        self.log_text.setFont(QFont('Courier New', 8))
+        self.log_text.setMinimumHeight(150)
+        diagnostics_layout.addWidget(self.log_text, 3, 0, 1, 4)
+
+        # Output calibration used to convert the limits, updated from the worker
+        self._out_zero = OUT_ZERO
+        self._out_slope = 1.0
+
+        # Last view model applied by _apply_view()
+        self._view = {}
+        self._view_version = None
+
+        # Coalesced parameter edits: latest value per parameter, flushed by _edit_timer
+        self._pending_edits = {}
+        self._edit_widgets = {}
+        self._edits_in_flight = False
+        self._edit_timer = QTimer()
+        self._edit_timer.setSingleShot(True)
+        self._edit_timer.setInterval(EDIT_INTERVAL)
+        self._edit_timer.timeout.connect(self._flush_edits)
+
+        self._health_timer = QTimer()
+        self._health_timer.setInterval(HEALTH_INTERVAL)
+        self._health_timer.timeout.connect(self._update_lock_health)
 
         # Layout
         grid.addWidget(status_group, 0, 0, 1, 3)
@@ -254,6 +387,9 @@ class red_pitaya_pyrpl_pid_tab(DeviceTab):
         grid.addWidget(sequence_group, 1, 1, 1, 1)
         grid.addWidget(params_group, 2, 0)
         grid.addWidget(self.plot_group, 2, 1)
+        grid.addWidget(calibration_group, 3, 0, 1, 2)
+        grid.addWidget(autotune_group, 4, 0, 1, 2)
+        grid.addWidget(diagnostics_group, 5, 0, 1, 2)
         grid.setColumnStretch(0, 1)
         grid.setColumnStretch(1, 2)
 
@@ -263,24 +399,47 @@ class red_pitaya_pyrpl_pid_tab(DeviceTab):
 
     def _setup_fallback_signal_connections(self):
     # Parameters - use Windfreak style: direct connection to @define_state methods
-        self.setpoint_edit.returnPressed.connect(self._set_setpoint)
-        self.p_edit.returnPressed.connect(self._set_p)
-        self.i_edit.returnPressed.connect(self._set_i)
-        self.min_edit.returnPressed.connect(self._apply_limits)
-        self.max_edit.returnPressed.connect(self._apply_limits)
-        self.ival_edit.returnPressed.connect(self._set_ival)
+        # Parameter edits go through the coalescing edit channel, see _queue_edit()
+        self.setpoint_edit.returnPressed.connect(lambda: self._queue_number_edit('setpoint', self.setpoint_edit))
+        self.p_edit.returnPressed.connect(lambda: self._queue_number_edit('p', self.p_edit))
+        self.i_edit.returnPressed.connect(lambda: self._queue_number_edit('i', self.i_edit))
+        self.min_edit.returnPressed.connect(self._queue_limits)
+        self.max_edit.returnPressed.connect(self._queue_limits)
+        self.ival_edit.returnPressed.connect(lambda: self._queue_number_edit('ival', self.ival_edit))
         self.btn_refresh.clicked.connect(self._check_hardware_status)
-        self.input_combo.currentTextChanged.connect(self._set_input)
-        self.output_combo.currentTextChanged.connect(lambda text: self._set_output_direct(text) if text else None)
+        self.input_combo.currentTextChanged.connect(
+            lambda text: self._queue_edit('input', text, self.input_combo) if text else None)
+        self.output_combo.currentTextChanged.connect(
+            lambda text: self._queue_edit('output_direct', text, self.output_combo) if text else None)
         self.btn_enable.clicked.connect(self._enable_pid)
         self.btn_disable.clicked.connect(self._disable_pid) 
         self.btn_reset.clicked.connect(self._reset_pid)
-        self.pause_gains_combo.currentTextChanged.connect(self._set_pause_gains)
+        self.pause_gains_combo.currentTextChanged.connect(
+            lambda text: self._queue_edit('pause_gains', text, self.pause_gains_combo) if text else None)
         self.setpoint_source_combo.currentTextChanged.connect(self._set_setpoint_source)
         self.btn_rolling_plot.toggled.connect(self._toggle_rolling_plot)
+        self.plot_window_spin.valueChanged.connect(self._set_plot_window)
+        self.sample_rate_spin.valueChanged.connect(self._set_sample_rate)
         self.write_to_config_button.clicked.connect(self._write_to_config)
         self.pause_pid_button.clicked.connect(self._pause_pid)
         self.output_to_zero_button.clicked.connect(self._output_to_zero)
+        self.btn_cal_measure.clicked.connect(self._measure_calibration_point)
+        self.btn_cal_clear.clicked.connect(self._clear_calibration_points)
+        self.btn_cal_fit.clicked.connect(self._fit_input_calibration)
+        self.btn_cal_output.clicked.connect(self._calibrate_output)
+        self.btn_autotune.clicked.connect(self._run_autotune)
+        self.btn_autotune_apply.clicked.connect(self._apply_autotune)
+        self.autotune_target_combo.currentTextChanged.connect(self._autotune_target_changed)
+        self.autotune_target_edit.returnPressed.connect(self._preview_autotune)
+        self.perf_checkbox.toggled.connect(self._set_perf_enabled)
+        self.btn_perf_refresh.clicked.connect(self._refresh_perf_stats)
+        self.btn_perf_reset.clicked.connect(self._reset_perf_stats)
+        self.btn_perf_export.clicked.connect(self._export_perf_stats)
+        self.log_level_combo.currentTextChanged.connect(self._set_log_level)
+        self.lock_monitor_checkbox.toggled.connect(self._set_lock_monitor)
+        self.auto_relock_checkbox.toggled.connect(self._set_auto_relock)
+        self.btn_log_show.clicked.connect(self._show_recent_log)
+        self.btn_log_clear.clicked.connect(self._clear_recent_log)
 
         # Sequence control connections
         self.use_sequence_checkbox.toggled.connect(self._set_use_sequence)
@@ -290,215 +449,108 @@ class red_pitaya_pyrpl_pid_tab(DeviceTab):
         self.setpoint_index_edit.returnPressed.connect(self._set_setpoint_index)
 
 
-    # === WINDFREAK STYLE INDIVIDUAL PARAMETER METHODS ===
-
-    @define_state(MODE_MANUAL, True)
-    def _set_p(self, *args):
-        """Set P parameter - Windfreak style"""
-        try:
-            text = self.p_edit.text()
-            val = float(text)
-            result = yield(self.queue_work(self.primary_worker, 'set_p', val))
-
-            # Update UI with actual hardware value
-            if isinstance(result, (int, float)):
-                self.p_edit.setText(f"{result:.6f}")
-
-            self._update_status(f"P = {result}")
-        except Exception as e:
-            print(f"[TABS] _set_p error: {e}")
-            self._update_status(f"Error: {e}")
-        return
-
-    @define_state(MODE_MANUAL, True)
-    def _set_i(self, *args):
-        """Set I parameter - Windfreak style"""
-        try:
-            text = self.i_edit.text()
-            val = float(text)
-            print(f"[DEBUG] _set_i called with value: {val}")
-
-            result = yield(self.queue_work(self.primary_worker, 'set_i', val))
-            print(f"[DEBUG] _set_i result: {result}")
-
-            # Update UI with actual hardware value
-            if isinstance(result, (int, float)):
-                self.i_edit.setText(f"{result:.6f}")
-                
-            self._update_status(f"I = {result}")
-        except Exception as e:
-            print(f"[TABS] _set_i error: {e}")
-            self._update_status(f"Error: {e}")
-        return
-
-    @define_state(MODE_MANUAL, True)
-    def _set_ival(self, *args):
-        """Set ival parameter - Windfreak style"""
-        try:
-            text = self.ival_edit.text()
-            val = float(text)
-            print(f"[DEBUG] _set_ival called with value: {val}")
-            
-            result = yield(self.queue_work(self.primary_worker, 'set_ival', val))
-            print(f"[DEBUG] _set_ival result: {result}")
-            
-            # Update UI with actual hardware value
-            if isinstance(result, (int, float)):
-                self.ival_edit.setText(f"{result:.6f}")
-                
-            self._update_status(f"ival = {result}")
-        except Exception as e:
-            print(f"[TABS] _set_ival error: {e}")
-            self._update_status(f"Error: {e}")
-        return
-
-    @define_state(MODE_MANUAL, True)
-    def _set_setpoint(self, *args):
-        """Set Setpoint parameter - Windfreak style"""
-        try:
-            text = self.setpoint_edit.text()
-            val = float(text)
-            print(f"[DEBUG] _set_setpoint called with value: {val}")
-            
-            result = yield(self.queue_work(self.primary_worker, 'set_setpoint', val))
-            print(f"[DEBUG] _set_setpoint result: {result}")
-            
-            # Update UI with actual hardware value
-            if isinstance(result, (int, float)):
-                self.setpoint_edit.setText(f"{result:.6f}")
-                
-            self._update_status(f"Setpoint = {result}")
-        except Exception as e:
-            print(f"[TABS] _set_setpoint error: {e}")
-            self._update_status(f"Error: {e}")
-        return
-
     @define_state(MODE_MANUAL, True)
     def _check_hardware_status(self, *args):
-        """Check detailed hardware status and update UI values - Windfreak style"""
+        """Refresh the tab from one refresh_view() call."""
         try:
-            print(f"[DEBUG] _check_hardware_status called")
-            
-            result = yield(self.queue_work(self.primary_worker, 'check_hardware_status'))
-            print(f"[TABS] Hardware status result: {result}")
-                
-            # Show key status in UI
-            if isinstance(result, dict) and 'error' not in result:
-                # Initialize paused variable at the start
-                paused = result.get('paused', False)
-                
-                # Update UI input fields with current hardware values
-                try:
-                    self.p_edit.setText(f"{result.get('p', 0.0):.6f}")
-                    self.i_edit.setText(f"{result.get('i', 0.0):.6f}")
-                    self.ival_edit.setText(f"{result.get('ival', 0.0):.6f}")
-                    self.setpoint_edit.setText(f"{result.get('setpoint', 0.0):.6f}")
-                    
-                    # Update other fields too
-                    self.min_edit.setText(f"{result.get('min_voltage', OUT_MIN):.6f}")
-                    self.max_edit.setText(f"{result.get('max_voltage', OUT_MAX):.6f}")
-
-                    # Update combo boxes
-                    self.pause_gains_combo.blockSignals(True)
-                    self.pause_gains_combo.setCurrentText(result['pause_gains'])
-                    self.pause_gains_combo.blockSignals(False)
-                    
-                    self.setpoint_source_combo.blockSignals(True)
-                    self.setpoint_source_combo.setCurrentText(result['setpoint_source'])
-                    self.setpoint_source_combo.blockSignals(False)
-                    print(f"[DEBUG] Setpoint source: {result['setpoint_source']}")
-
-                    # Convert digital_setpoint_array to string for display
-                    array_data = result.get('digital_setpoint_array', [])
-                    array_str = str(array_data)
-                    
-                    self.setpoint_array_edit.blockSignals(True)
-                    self.setpoint_array_edit.setText(array_str)
-                    self.setpoint_array_edit.blockSignals(False)
-
-                    self.setpoint_index_edit.blockSignals(True)
-                    self.setpoint_index_edit.setText(f"{result['setpoint_index']}")
-                    self.setpoint_index_edit.blockSignals(False)
-
-                    # Update sequence value display (only the value label, not the description label)
-                    self.sequence_value_label.setText(f"{result.get('setpoint_in_sequence', 0.0):.6f}")
-
-                    if result['setpoint_source'] == 'analog_setpoint':
-                        self.setpoint_edit.setEnabled(False)
-                        self.input_combo.setEnabled(False)
-                        self.output_combo.setEnabled(False)
-                        self._set_use_sequence(False)
-                        self._reset_sequence_index()
-                    elif result['setpoint_source'] == 'digital_setpoint_in1':
-                        self.setpoint_edit.setEnabled(True)
-                        self.input_combo.setEnabled(True)
-                        self.output_combo.setEnabled(True)
-                        if result['use_setpoint_sequence']:
-                            self._set_use_sequence(True)
-                        else:
-                            self._set_use_sequence(False)
-                        self.input_combo.blockSignals(True)
-                        self.input_combo.clear()
-                        self.input_combo.addItem('in1')
-                        self.input_combo.setCurrentText(result['input'])
-                        self.input_combo.blockSignals(False)
-                        self.output_combo.blockSignals(True)
-                        self.output_combo.clear()
-                        self.output_combo.addItems(['out1','off'])
-                        self.output_combo.setCurrentText(result['output_direct'])
-                        self.output_combo.blockSignals(False)
-                    elif result['setpoint_source'] == 'digital_setpoint_in2':
-                        self.setpoint_edit.setEnabled(True)
-                        self.input_combo.setEnabled(True)
-                        self.output_combo.setEnabled(True)
-                        if result['use_setpoint_sequence']:
-                            self._set_use_sequence(True)
-                        else:
-                            self._set_use_sequence(False)
-                        self.input_combo.blockSignals(True)
-                        self.input_combo.clear()
-                        self.input_combo.addItem('in2')
-                        self.input_combo.setCurrentText(result['input'])
-                        self.input_combo.blockSignals(False)
-                        self.output_combo.blockSignals(True)
-                        self.output_combo.clear()
-                        self.output_combo.addItems(['out2', 'off'])
-                        self.output_combo.setCurrentText(result['output_direct'])
-                        self.output_combo.blockSignals(False)
-
-                    print(f"[DEBUG] Updated UI fields: p={result.get('p')}, i={result.get('i')}, ival={result.get('ival')}, setpoint={result.get('setpoint')}, min_voltage={result.get('min_voltage')}, max_voltage={result.get('max_voltage')}, input={result.get('input')}, output={result.get('output_direct')}, pause_gains={result.get('pause_gains')}, paused={paused}")
-                    print(f"[DEBUG] Updated UI fields: {result}")
-
-                except Exception as ui_error:
-                    print(f"[TABS] Error updating UI fields: {ui_error}")
-
-                wrap_flag = result['sequence_wrap_flag']
-                # Set wrap flag display with human-readable text and colors
-                if wrap_flag:
-                    self.wrap_flag_label.setText("Triggered")
-                    self.wrap_flag_label.setStyleSheet('color: #00FF00; font-weight: bold; background-color: rgba(0, 255, 0, 30); padding: 2px; border-radius: 3px;')
-                else:
-                    self.wrap_flag_label.setText("Not Triggered")
-                    self.wrap_flag_label.setStyleSheet('color: #666666; font-weight: normal;')
-                            
-
-                self._update_status(f"Updated UI fields, paused={paused}")
-            else:
-                self._update_status(f"Hardware status error: {result}")
-                
+            view = yield(self.queue_work(self.primary_worker, 'refresh_view'))
+            self._apply_view(view)
         except Exception as e:
-            print(f"[TABS] _check_hardware_status error: {e}")
+            self.logger.error('_check_hardware_status error: %s', e)
             self._update_status(f"Status check error: {e}")
-        return
+
+    def _apply_view(self, view):
+        """Update only the widgets whose field changed since the last view; no worker calls."""
+        if not isinstance(view, dict) or 'error' in view:
+            self._update_status(f"Hardware status error: {view}")
+            return
+        if view['version'] == self._view_version:
+            # Only the fields the FPGA updates on its own can have moved
+            self._apply_volatile_fields(view)
+            self._update_status(f"Up to date, paused={view['paused']}")
+            return
+        changed = {name for name, value in view.items() if name not in self._view or self._view[name] != value}
+        if 'output_calibration' in changed:
+            self._out_zero = view['output_calibration']['zero']
+            self._out_slope = view['output_calibration']['slope']
+
+        # Fields with an edit still pending keep showing the edit
+        for name, edit in (('p', self.p_edit), ('i', self.i_edit),
+                           ('setpoint', self.setpoint_edit), ('min_voltage', self.min_edit),
+                           ('max_voltage', self.max_edit)):
+            if name in changed and name not in self._pending_edits:
+                edit.setText(f"{view[name]:.6f}")
+
+        if 'setpoint_source' in changed:
+            self._set_combo(self.setpoint_source_combo, view['setpoint_source'])
+            digital = view['setpoint_source'] != 'analog_setpoint'
+            self.setpoint_edit.setEnabled(digital)
+            self.input_combo.setEnabled(digital)
+            self.output_combo.setEnabled(digital)
+        if 'input_options' in changed:
+            self._set_combo(self.input_combo, view['input'], view['input_options'])
+        elif 'input' in changed and 'input' not in self._pending_edits:
+            self._set_combo(self.input_combo, view['input'])
+        if 'output_options' in changed:
+            self._set_combo(self.output_combo, view['output_direct'], view['output_options'])
+        elif 'output_direct' in changed and 'output_direct' not in self._pending_edits:
+            self._set_combo(self.output_combo, view['output_direct'])
+        if 'pause_gains' in changed and 'pause_gains' not in self._pending_edits:
+            self._set_combo(self.pause_gains_combo, view['pause_gains'])
+
+        if 'use_setpoint_sequence' in changed or 'setpoint_source' in changed:
+            enabled = view['use_setpoint_sequence'] and view['setpoint_source'] != 'analog_setpoint'
+            self.use_sequence_checkbox.blockSignals(True)
+            self.use_sequence_checkbox.setChecked(bool(enabled))
+            self.use_sequence_checkbox.blockSignals(False)
+            self._set_sequence_controls_enabled(enabled)
+        if 'digital_setpoint_array' in changed:
+            self.setpoint_array_edit.setText(str(view.get('digital_setpoint_array', [])))
+        self._apply_volatile_fields(view)
+
+        self._view = view
+        self._view_version = view['version']
+        self._update_status(f"Updated {len(changed - {'version'})} fields, paused={view['paused']}")
+
+    def _apply_volatile_fields(self, view):
+        """Update the widgets of the fields the FPGA changes on its own; they do not bump the view version."""
+        changed = {name for name in RegisterShadow.VOLATILE
+                   if name in view and (name not in self._view or self._view[name] != view[name])}
+        if 'ival' in changed and 'ival' not in self._pending_edits:
+            self.ival_edit.setText(f"{view['ival']:.6f}")
+        if 'setpoint_index' in changed:
+            self.setpoint_index_edit.setText(f"{view['setpoint_index']}")
+        if 'setpoint_in_sequence' in changed:
+            self.sequence_value_label.setText(f"{view.get('setpoint_in_sequence', 0.0):.6f}")
+        if 'sequence_wrap_flag' in changed:
+            self._show_wrap_flag(view['sequence_wrap_flag'])
+        self._view.update((name, view[name]) for name in changed)
+
+    @staticmethod
+    def _set_combo(combo, text, options=None):
+        """Select text (and replace the items with options) without emitting change signals."""
+        combo.blockSignals(True)
+        if options is not None:
+            combo.clear()
+            combo.addItems(options)
+        combo.setCurrentText(text)
+        combo.blockSignals(False)
+
+    def _show_wrap_flag(self, wrap_flag):
+        # Human-readable text and colors for the sequence wrap flag
+        if wrap_flag:
+            self.wrap_flag_label.setText("Triggered")
+            self.wrap_flag_label.setStyleSheet('color: #00FF00; font-weight: bold; background-color: rgba(0, 255, 0, 30); padding: 2px; border-radius: 3px;')
+        else:
+            self.wrap_flag_label.setText("Not Triggered")
+            self.wrap_flag_label.setStyleSheet('color: #666666; font-weight: normal;')
 
     @define_state(MODE_MANUAL, True)
     def _enable_pid(self, *args):
         """Enable PID controller - Windfreak style"""
         try:
-            print(f"[DEBUG] _enable_pid called")
-            
             result = yield(self.queue_work(self.primary_worker, 'enable_pid'))
-            print(f"[DEBUG] Enable PID result: {result}")
+            self.logger.debug('Enable PID result: %s', result)
                 
             if isinstance(result, bool) and result:
                 self._update_status("PID Enabled")
@@ -506,17 +558,15 @@ class red_pitaya_pyrpl_pid_tab(DeviceTab):
                 self._update_status(f"PID enable failed: {result}")
                 
         except Exception as e:
-            print(f"[TABS] Enable PID error: {e}")
+            self.logger.error('Enable PID error: %s', e)
             self._update_status(f"Enable error: {e}")
 
     @define_state(MODE_MANUAL, True) 
     def _disable_pid(self, *args):
         """Disable PID controller - Windfreak style"""
         try:
-            print(f"[DEBUG] _disable_pid called")
-            
             result = yield(self.queue_work(self.primary_worker, 'disable_pid'))
-            print(f"[DEBUG] Disable PID result: {result}")
+            self.logger.debug('Disable PID result: %s', result)
                 
             if isinstance(result, bool) and result:
                 self._update_status("PID Disabled")
@@ -524,105 +574,98 @@ class red_pitaya_pyrpl_pid_tab(DeviceTab):
                 self._update_status(f"PID disable failed: {result}")
                 
         except Exception as e:
-            print(f"[TABS] Disable PID error: {e}")
+            self.logger.error('Disable PID error: %s', e)
             self._update_status(f"Disable error: {e}")
 
     @define_state(MODE_MANUAL, True)
     def _reset_pid(self, *args):
         """Reset PID controller - sets p, i, ival to 0"""
         try:
-            print(f"[DEBUG] _reset_pid called - will set p=0, i=0, ival=0")
-            
             result = yield(self.queue_work(self.primary_worker, 'reset_pid'))
-            print(f"[DEBUG] Reset PID result: {result}")
+            self.logger.debug('Reset PID result: %s', result)
                 
             self._update_status("PID Reset (p=0, i=0, ival=0)")
-            self._check_hardware_status()
+            self._apply_view((yield(self.queue_work(self.primary_worker, 'refresh_view'))))
 
         except Exception as e:
-            print(f"[TABS] Reset PID error: {e}")
+            self.logger.error('Reset PID error: %s', e)
             self._update_status(f"Reset error: {e}")
 
-    @define_state(MODE_MANUAL, True)
-    def _set_output_direct(self, output_value, *args):
-        """Set output direct - Windfreak style"""
-        try:
-            print(f"[DEBUG] _set_output_direct called with: {output_value}")
-            
-            result = yield(self.queue_work(self.primary_worker, 'set_output_direct', output_value))
-            print(f"[DEBUG] Set output direct result: {result}")
-            
-            # Update UI with actual hardware value
-            if isinstance(result, str):
-                self.output_combo.setCurrentText(result)
-                
-            self._update_status(f"Output set to: {result} (UI Updated)")
-                
-        except Exception as e:
-            print(f"[TABS] Set output direct error: {e}")
-            self._update_status(f"Output setting error: {e}")
+    # === COALESCING PARAMETER EDITS ===
 
-    @define_state(MODE_MANUAL, True)
-    def _set_input(self, input_value, *args):
-        """Set input - Windfreak style"""
-        try:
-            # if not input_value:  # empty string
-            #     print("[DEBUG] _set_input ignored empty value")
-            #     return
-            # print(f"[DEBUG] _set_input called with: {input_value}")
-            
-            result = yield(self.queue_work(self.primary_worker, 'set_input', input_value))
-            print(f"[DEBUG] Set input result: {result}")
-            
-            # Update UI with actual hardware value
-            if isinstance(result, str):
-                self.input_combo.setCurrentText(result)
-            
-            self._update_status(f"Input set to: {result} (UI Updated)")
-                
-        except Exception as e:
-            print(f"[TABS] Set input error: {e}")
-            self._update_status(f"Input setting error: {e}")
+    def _queue_edit(self, name, value, widget):
+        """Record an edit; only the latest value per parameter is sent, batched with the others."""
+        self._pending_edits[name] = value
+        self._edit_widgets[name] = widget
+        widget.setStyleSheet(EDIT_PENDING_STYLE)
+        self._update_status('Pending: ' + ', '.join(sorted(self._pending_edits)))
+        if not self._edits_in_flight and not self._edit_timer.isActive():
+            self._edit_timer.start()
 
-    @define_state(MODE_MANUAL, True)
-    def _apply_limits(self, *args):
-        """Apply voltage limits - Windfreak style"""
+    def _queue_number_edit(self, name, edit):
         try:
-            print(f"[DEBUG] _apply_limits called")
-            
-            # Read min and max voltage from UI, because we remove the resistor, so we need 1.02V offset
-            mn = float(self.min_edit.text())-OUT_ZERO
-            mx = float(self.max_edit.text())-OUT_ZERO
-
-            if mn >= mx:
-                self._update_status('Error: Min voltage must be less than max voltage')
-                return
-            
-            print(f"[DEBUG] Setting voltage limits: min={mn}, max={mx}")
-            
-            # Set min voltage
-            result_min = yield(self.queue_work(self.primary_worker, 'set_min_voltage', mn))
-            
-            # Set max voltage
-            result_max = yield(self.queue_work(self.primary_worker, 'set_max_voltage', mx))
-
-            result_min_ui = result_min + OUT_ZERO
-            result_max_ui = result_max + OUT_ZERO
-            # Update UI with actual hardware values
-            if isinstance(result_min, (int, float)):
-                self.min_edit.setText(f"{result_min_ui:.6f}")
-
-            if isinstance(result_max, (int, float)):
-                self.max_edit.setText(f"{result_max_ui:.6f}")
-
-            self._update_status(f'Limits: [{result_min_ui}, {result_max_ui}] V (UI Updated)')
+            value = float(edit.text())
+        except ValueError:
+            edit.setStyleSheet(EDIT_ERROR_STYLE)
+            self._update_status(f'Error: {name} needs a numeric value')
+            return
+        self._queue_edit(name, value, edit)
 
+    def _queue_limits(self):
+        """Queue min and max together; the UI shows volts at the output, the worker takes digital values."""
+        try:
+            mn = (float(self.min_edit.text()) - self._out_zero) / self._out_slope
+            mx = (float(self.max_edit.text()) - self._out_zero) / self._out_slope
         except ValueError:
-            print(f"[TABS] _apply_limits ValueError")
             self._update_status('Error: Voltage limits need numeric values')
+            return
+        if mn >= mx:
+            self._update_status('Error: Min voltage must be less than max voltage')
+            return
+        self._queue_edit('min_voltage', mn, self.min_edit)
+        self._queue_edit('max_voltage', mx, self.max_edit)
+
+    def _show_edit_value(self, name, value):
+        """Display a value read back from the worker in the widget it was edited in."""
+        widget = self._edit_widgets.get(name)
+        if widget is None:
+            return
+        if isinstance(widget, QComboBox):
+            widget.blockSignals(True)
+            widget.setCurrentText(value)
+            widget.blockSignals(False)
+        elif name in ('min_voltage', 'max_voltage'):
+            widget.setText(f"{value * self._out_slope + self._out_zero:.6f}")
+        else:
+            widget.setText(f"{value:.6f}")
+
+    @define_state(MODE_MANUAL, True)
+    def _flush_edits(self, *args):
+        """Send all pending edits to the worker as one apply_edits() call."""
+        if not self._pending_edits:
+            return
+        edits, self._pending_edits = self._pending_edits, {}
+        self._edits_in_flight = True
+        try:
+            result = yield(self.queue_work(self.primary_worker, 'apply_edits', edits))
+            for name, value in result['values'].items():
+                if name in self._pending_edits:
+                    # A newer edit is queued, keep showing it as pending
+                    continue
+                self._show_edit_value(name, value)
+                self._edit_widgets.pop(name).setStyleSheet('')
+            committed = ', '.join(f"{name}={value}" for name, value in result['values'].items())
+            self._update_status(f"Committed: {committed}")
         except Exception as e:
-            print(f"[TABS] _apply_limits error: {e}")
-            self._update_status(f'Limits setting error: {e}')
+            self.logger.error('_flush_edits error: %s', e)
+            for name in edits:
+                if name not in self._pending_edits and name in self._edit_widgets:
+                    self._edit_widgets[name].setStyleSheet(EDIT_ERROR_STYLE)
+            self._update_status(f"Error: {e}")
+        finally:
+            self._edits_in_flight = False
+            if self._pending_edits:
+                self._edit_timer.start()
 
     def _update_status(self, msg: str):
         if hasattr(self, 'status_label'):
@@ -634,149 +677,193 @@ class red_pitaya_pyrpl_pid_tab(DeviceTab):
         connection_table = self.settings['connection_table']
         device = connection_table.find_by_name(self.device_name)
         ip_addr = device.properties.get('ip_addr')
+        calibration_file = device.properties.get('calibration_file')
+        fast_attach = device.properties.get('fast_attach', True)
+        perf_stats = device.properties.get('perf_stats', False)
+        config_autosave = device.properties.get('config_autosave', 0)
+        log_level = device.properties.get('log_level', 'INFO')
+        lock_monitor = device.properties.get('lock_monitor', 0)
+        auto_relock = device.properties.get('auto_relock', False)
+        park_on_shutdown = device.properties.get('park_on_shutdown', None)
+        input_range = device.properties.get('input_range', None)
         # Always use pid1 by default, do not pass pid_module
         self.create_worker(
             'rp_pid_main_worker',
             #'labscript_devices.red_pitaya_pyrpl_pid.blacs_workers.red_pitaya_pyrpl_pid_worker',
             'user_devices.Cesium.red_pitaya_pyrpl_pid.blacs_workers.red_pitaya_pyrpl_pid_worker',
-            {'ip_addr': ip_addr}
+            {'ip_addr': ip_addr, 'calibration_file': calibration_file, 'fast_attach': fast_attach,
+             'perf_stats': perf_stats, 'config_autosave': config_autosave, 'log_level': log_level,
+             'lock_monitor': lock_monitor, 'auto_relock': auto_relock, 'park_on_shutdown': park_on_shutdown,
+             'input_range': input_range}
         )
         self.primary_worker = 'rp_pid_main_worker'
-
+        self._report_startup()
 
     @define_state(MODE_MANUAL, True)
-    def _set_pause_gains(self, *args):
-        """Set pause_gains parameter from combo box"""
-        try:
-            value = self.pause_gains_combo.currentText()
-            print(f"[DEBUG] _set_pause_gains called with value: {value}")
-            result = yield(self.queue_work(self.primary_worker, 'set_pause_gains', value))
-            print(f"[DEBUG] _set_pause_gains result: {result}")
-            self._update_status(f"pause_gains = {result}")
-        except Exception as e:
-            print(f"[TABS] _set_pause_gains error: {e}")
-            self._update_status(f"Error: {e}")
-        return
+    def _report_startup(self, *args):
+        """Show how long the worker took to start and whether it attached to running PIDs."""
+        report = yield(self.queue_work(self.primary_worker, 'get_startup_report'))
+        if report['mode'] == 'attach':
+            msg = f"Attached to running PIDs in {report['seconds']:.2f} s"
+        else:
+            reason = f" ({report['reason']})" if report['reason'] else ''
+            msg = f"Full start in {report['seconds']:.2f} s{reason}"
+        msg += f"; worker import {report['import_seconds'] * 1e3:.0f} ms, tab import {self._timing['import'] * 1e3:.0f} ms"
+        if 'first_paint' in self._timing:
+            msg += f", first paint {self._timing['first_paint'] * 1e3:.0f} ms"
+        self._update_status(msg)
+        self._check_hardware_status()
+        self._refresh_perf_stats()
+        self._show_recent_log()
+        self._update_lock_health()
+
 
     @define_state(MODE_MANUAL, True)
     def _set_setpoint_source(self, *args):#
         try:
             value = self.setpoint_source_combo.currentText()
             result = yield(self.queue_work(self.primary_worker, 'set_setpoint_source', value))
-            print(f"[DEBUG] _set_setpoint_source result: {result}")
-            # Disable setpoint, input, output and sequence controls if analog_setpoint
-            if value == 'analog_setpoint':
-                self.setpoint_edit.setEnabled(False)
-                self.input_combo.setEnabled(False)
-                self.output_combo.setEnabled(False) 
-            elif value == 'digital_setpoint_in1':
-                self.setpoint_edit.setEnabled(True)
-                self.input_combo.setEnabled(True)
-                self.output_combo.setEnabled(True)
-                self.input_combo.blockSignals(True)
-                self.input_combo.clear()
-                self.input_combo.addItem('in1')
-                self.input_combo.blockSignals(False)
-                self.input_combo.setCurrentText('in1')
-                self.output_combo.blockSignals(True)
-                self.output_combo.clear()
-                self.output_combo.addItems(['out1','off'])
-                self.output_combo.blockSignals(False)
-                self.output_combo.setCurrentText('out1')
-            elif value == 'digital_setpoint_in2':
-                self.setpoint_edit.setEnabled(True)
-                self.input_combo.setEnabled(True)
-                self.output_combo.setEnabled(True)
-                self.input_combo.blockSignals(True)
-                self.input_combo.clear()
-                self.input_combo.addItem('in2')
-                self.input_combo.blockSignals(False)
-                self.input_combo.setCurrentText('in2')
-                self.output_combo.blockSignals(True)
-                self.output_combo.clear()
-                self.output_combo.addItems(['out2', 'off'])
-                self.output_combo.blockSignals(False)
-                self.output_combo.setCurrentText('out2')
+            self.logger.debug('_set_setpoint_source result: %s', result)
+            # The view brings the combos and enabled controls in line with the new source
+            self._apply_view((yield(self.queue_work(self.primary_worker, 'refresh_view'))))
             self._update_status(f"setpoint_source = {result}")
-            self._check_hardware_status()
         except Exception as e:
-            print(f"[TABS] _set_setpoint_source error: {e}")
+            self.logger.error('_set_setpoint_source error: %s', e)
             self._update_status(f"Error: {e}")
         return
 
+    def _rolling_capacity(self):
+        """Ring buffer size for the current window at the sampler rate, with headroom."""
+        return int(self._plot_window * self._sample_rate * 1.5) + 16
+
+    def _set_plot_window(self, value):
+        """Change the rolling plot window length (seconds)."""
+        self._plot_window = float(value)
+        if self._rolling is not None:
+            self._rolling = self._rolling.resized(self._rolling_capacity())
+            self._redraw_rolling_plot()
+
+    @define_state(MODE_MANUAL, True)
+    def _set_sample_rate(self, value, *args):
+        """Change the worker sampler rate (Hz); takes effect immediately if the plot is running."""
+        self._sample_rate = float(value)
+        if self._rolling is not None:
+            self._rolling = self._rolling.resized(self._rolling_capacity())
+        if self._auto_plot_timer.isActive():
+            yield self.queue_work(self.primary_worker, 'start_sampler', self._sample_rate)
+
+    def _build_plot(self):
+        """Create the error/ival plot widget in place of the placeholder."""
+        import pyqtgraph as pg
+
+        self.plot_widget = pg.PlotWidget(self.plot_group, title="PID Error and Ival")
+        self.plot_widget.setLabel('bottom', 'Relative Time (s)')
+        self.plot_widget.setLabel('left', 'Error (Input-Setpoint)')
+        self.plot_widget.showGrid(x=True, y=True)
+
+        self.right_axis = pg.ViewBox()
+        self.plot_widget.showAxis('right')
+        self.plot_widget.scene().addItem(self.right_axis)
+        self.plot_widget.getAxis('right').linkToView(self.right_axis)
+        self.right_axis.setXLink(self.plot_widget)
+
+        self.error_line = self.plot_widget.plot(pen=pg.mkPen('y', width=2), name='Error=Input-Setpoint')
+
+        self.ival_line = pg.PlotDataItem(pen=pg.mkPen('r', width=2), name='Ival')
+        self.right_axis.addItem(self.ival_line)
+        self.plot_widget.getAxis('right').setLabel('Ival')
+
+        legend = pg.LegendItem(offset=(70, 30))
+        legend.setParentItem(self.plot_widget.graphicsItem())
+        legend.addItem(self.error_line, name='Error=Input-Setpoint')
+        legend.addItem(self.ival_line, name='Ival')
+
+        def updateViews():
+            self.right_axis.setGeometry(self.plot_widget.getViewBox().sceneBoundingRect())
+            self.right_axis.linkedViewChanged(self.plot_widget.getViewBox(), self.right_axis.XAxis)
+        self.plot_widget.getViewBox().sigResized.connect(updateViews)
+
+        # Set initial range and disable auto-scaling to fix the x-axis
+        self.plot_widget.setXRange(0, self._plot_window, padding=0)
+        self.plot_widget.setLimits(xMin=0)
+        self.plot_widget.setYRange(-1, 1)
+
+        self._plot_layout.replaceWidget(self._plot_placeholder, self.plot_widget)
+        self._plot_placeholder.deleteLater()
+        self._plot_placeholder = None
+
     def _start_rolling_plot(self):
+        if self.plot_widget is None:
+            self._build_plot()
         try:
             self._auto_plot_timer.timeout.disconnect()
         except TypeError:
             pass
         
-        self._rolling_times = []
-        self._rolling_errors = []
-        self._rolling_ivals = []
+        # columns: time since start, error, ival
+        self._rolling = RingBuffer(self._rolling_capacity(), width=3)
+        self._rolling_t0 = None
         
         self.error_line.setData([], [])
         self.ival_line.setData([], [])
         
-        self.plot_widget.setRange(xRange=[-5, 0], yRange=[-1, 1])
+        self.plot_widget.setRange(xRange=[0, self._plot_window], yRange=[-1, 1])
         
         self._auto_plot_timer.timeout.connect(self._update_rolling_plot)
         self._auto_plot_timer.start()
 
+    def _redraw_rolling_plot(self):
+        """Push the samples inside the current window to the plot (no copies)."""
+        if not len(self._rolling):
+            return
+        times = self._rolling.column(0)
+        tmax = times[-1]
+        i0 = np.searchsorted(times, tmax - self._plot_window)
+        data = self._rolling.view()[:, i0:]
+        self.error_line.setData(data[0], data[1])
+        self.ival_line.setData(data[0], data[2])
+        self.plot_widget.setXRange(max(0.0, tmax - self._plot_window), max(self._plot_window, tmax), padding=0)
+
     @define_state(MODE_MANUAL, True)
     def _update_rolling_plot(self, *args):
-        """Update rolling plot"""
+        """Fetch the samples the worker collected since the last tick and redraw"""
         try:
-            # result is a dictionary with keys 'time', 'error', 'ival'
-            result = yield self.queue_work(self.primary_worker, 'get_error_point')
+            # result is a dictionary of arrays keyed 'time', 'error', 'ival', ...
+            result = yield self.queue_work(self.primary_worker, 'get_error_batch')
             
-            if 'ERROR' in result:
-                print(f"[ERROR] Rolling plot error: {result['ERROR']}")
-                self._update_status(f": Rolling plot error: {result['ERROR'][:100]}...")
+            if not isinstance(result, dict) or not all(key in result for key in ['time', 'error', 'ival']):
+                error_msg = f"Invalid data format: {result}"
+                self.logger.error('%s', error_msg)
+                self._update_status(f"Invalid data format: {error_msg[:100]}")
                 return
             
-            if not all(key in result for key in ['time', 'error', 'ival']):
-                error_msg = f"Invalid data format: {list(result.keys())}"
-                print(f"[ERROR] {error_msg}")
-                self._update_status(f"Invalid data format: {error_msg}")
-                return
+            if result.get('sampler_error'):
+                self._update_status(f"Sampler error: {result['sampler_error'][:100]}")
             
-            if not isinstance(result['time'], (int, float)) or not isinstance(result['error'], (int, float)) or not isinstance(result['ival'], (int, float)):
-                error_msg = f"Invalid data types: time={type(result['time'])}, error={type(result['error'])}, ival={type(result['ival'])}"
-                print(f"[ERROR] {error_msg}")
-                self._update_status(f"Invalid data types: {error_msg}")
+            times = result['time']
+            if not len(times):
                 return
-            
-            self._rolling_times.append(result['time'])
-            self._rolling_errors.append(result['error'])
-            self._rolling_ivals.append(result['ival'])
-
-            # keep 5 seconds window
-            tmax = self._rolling_times[-1]
-            while self._rolling_times and tmax - self._rolling_times[0] > 5.0:
-                self._rolling_times.pop(0)
-                self._rolling_errors.pop(0)
-                self._rolling_ivals.pop(0)
-            
-            tmin = self._rolling_times[0]
-            relative_times = [t - tmin for t in self._rolling_times]
-
-            self.error_line.setData(relative_times, self._rolling_errors)
-            self.ival_line.setData(relative_times, self._rolling_ivals)
+            if self._rolling_t0 is None:
+                self._rolling_t0 = times[0]
+            self._rolling.extend(np.column_stack((times - self._rolling_t0, result['error'], result['ival'])))
+            self._redraw_rolling_plot()
             self.plot_widget.enableAutoRange(axis='y', enable=True)
         
         except Exception as e:
             import traceback
             error_msg = f"Error in _update_rolling_plot: {str(e)}\n{traceback.format_exc()}"
-            print(f"[CRITICAL] {error_msg}")
+            self.logger.critical('%s', error_msg)
             self._update_status(f"Critical error: {error_msg[:100]}...")
 
     @define_state(MODE_MANUAL, True)
     def _toggle_rolling_plot(self, checked):
         if checked:
+            yield self.queue_work(self.primary_worker, 'start_sampler', self._sample_rate)
             self._start_rolling_plot()
             self.btn_rolling_plot.setText('Stop Rolling Plot')
         else:
             self._auto_plot_timer.stop()
+            yield self.queue_work(self.primary_worker, 'stop_sampler')
             self.btn_rolling_plot.setText('Start Rolling Plot')
     
     @define_state(MODE_MANUAL, True)
@@ -787,9 +874,8 @@ class red_pitaya_pyrpl_pid_tab(DeviceTab):
     def _pause_pid(self, *args):
         """pause PID"""
         try:
-            print("[DEBUG] _pause_pid called")
             result = yield(self.queue_work(self.primary_worker, 'pause_pid'))
-            print(f"[DEBUG] Pause PID result: {result}")
+            self.logger.debug('Pause PID result: %s', result)
             if isinstance(result, dict):
                 if 'error' in result:
                     self._update_status(f"PID pause failed: {result['error']}")
@@ -803,7 +889,7 @@ class red_pitaya_pyrpl_pid_tab(DeviceTab):
             else:
                 self._update_status(f"PID pause result: {result}")
         except Exception as e:
-            print(f"[TABS] Pause PID error: {e}")
+            self.logger.error('Pause PID error: %s', e)
             self._update_status(f"Pause error: {e}")
         return
 
@@ -812,13 +898,265 @@ class red_pitaya_pyrpl_pid_tab(DeviceTab):
         """Set the output to zero."""
         try:
             result = yield self.queue_work(self.primary_worker, 'output_to_zero')
-            self._check_hardware_status()
+            self._apply_view((yield(self.queue_work(self.primary_worker, 'refresh_view'))))
             if result is not None:
                 self._update_status(f"Output set to zero and paused: {result}")
         except Exception as e:
-            print(f"[TABS] Output to zero error: {e}")
+            self.logger.error('Output to zero error: %s', e)
             self._update_status(f"Output to zero error: {e}")
 
+    # === CALIBRATION METHODS ===
+
+    @define_state(MODE_MANUAL, True)
+    def _measure_calibration_point(self, *args):
+        """Record the input reading with the reference voltage entered applied."""
+        try:
+            reference = float(self.cal_reference_edit.text())
+            channel = self.cal_channel_combo.currentText()
+            result = yield(self.queue_work(self.primary_worker, 'measure_calibration_point', reference, channel))
+            self.cal_result_label.setText('; '.join(
+                f"{ch}: {r['digital']:.6f} +- {r['noise']:.6f} at {reference} V ({r['points']} points)"
+                for ch, r in result.items()
+            ))
+        except ValueError:
+            self._update_status('Error: Reference needs a numeric value')
+        except Exception as e:
+            self.logger.error('Calibration measurement error: %s', e)
+            self._update_status(f"Calibration measurement error: {e}")
+
+    @define_state(MODE_MANUAL, True)
+    def _clear_calibration_points(self, *args):
+        yield(self.queue_work(self.primary_worker, 'clear_calibration_points', self.cal_channel_combo.currentText()))
+        self.cal_result_label.setText('Calibration points cleared')
+
+    @define_state(MODE_MANUAL, True)
+    def _fit_input_calibration(self, *args):
+        """Fit the recorded points and save the new input calibration."""
+        try:
+            result = yield(self.queue_work(self.primary_worker, 'fit_input_calibration', self.cal_channel_combo.currentText()))
+            self.cal_result_label.setText('; '.join(
+                f"{ch}: slope={r['slope']:.6f}/V, offset={r['offset']:.6f}, rms residual={r['rms_residual'] * 1e3:.3f} mV"
+                for ch, r in result.items() if ch != 'saved_to'
+            ))
+            self._apply_view((yield(self.queue_work(self.primary_worker, 'refresh_view'))))
+            self._update_status(f"Input calibration saved to {result.get('saved_to')}")
+        except Exception as e:
+            self.logger.error('Input calibration error: %s', e)
+            self._update_status(f"Input calibration error: {e}")
+
+    @define_state(MODE_MANUAL, True)
+    def _calibrate_output(self, *args):
+        """Run the DAC-to-ADC loopback calibration of the selected output."""
+        try:
+            output, input_channel = [x.strip() for x in self.cal_output_combo.currentText().split('->')]
+            result = yield(self.queue_work(self.primary_worker, 'calibrate_output', output, input_channel))
+            self._out_zero = result['zero']
+            self._out_slope = result['slope']
+            self.cal_result_label.setText(
+                f"{output}: zero={result['zero']:.6f} V, slope={result['slope']:.6f} V, "
+                f"rms residual={result['rms_residual'] * 1e3:.3f} mV, {result['saturated']} levels saturated"
+            )
+            self._apply_view((yield(self.queue_work(self.primary_worker, 'refresh_view'))))
+            self._update_status(f"Output calibration saved to {result.get('saved_to')}")
+        except Exception as e:
+            self.logger.error('Output calibration error: %s', e)
+            self._update_status(f"Output calibration error: {e}")
+
+    # === AUTOTUNE METHODS ===
+
+    def _autotune_target(self):
+        """(bandwidth, phase_margin) keyword values for the target entered."""
+        value = float(self.autotune_target_edit.text())
+        if self.autotune_target_combo.currentText().startswith('bandwidth'):
+            return value, None
+        return None, value
+
+    def _autotune_target_changed(self, text):
+        self.autotune_target_edit.setText(str(PHASE_MARGIN) if text.startswith('phase') else '1000.0')
+        self._preview_autotune()
+
+    def _preview_autotune(self, *args):
+        """Show the last autotune model and the gains proposed for the current target.
+
+        The proposal is recomputed locally from the fitted model, so changing
+        the target needs no new measurement.
+        """
+        result = self._autotune
+        if result is None:
+            return
+        try:
+            proposal = propose_pi(result, *self._autotune_target())
+        except ValueError:
+            self._update_status('Error: Autotune target needs a numeric value')
+            return
+        self._autotune_proposal = proposal
+        ku = result['ultimate_gain']
+        ultimate = (f"Ku={ku:.4g}, Pu={result['ultimate_period'] * 1e6:.4g} us" if result['ultimate_period']
+                    else 'no ultimate gain (no delay)')
+        lines = [
+            f"{result['pid']}: K={result['gain']:.4g}, tau={result['tau'] * 1e6:.4g} us, "
+            f"delay={result['delay'] * 1e6:.4g} us, {ultimate}"
+            + ('' if result['settled'] else ' (response not settled)'),
+            f"Proposed p={proposal['p']:.6g}, i={proposal['i']:.6g} Hz "
+            f"(now p={result['current']['p']:.6g}, i={result['current']['i']:.6g} Hz)",
+            f"Crossover {proposal['crossover']:.4g} Hz, phase margin {proposal['phase_margin']:.1f} deg, "
+            f"gain margin {proposal['gain_margin']:.3g}",
+        ]
+        if proposal['limited']:
+            lines.append(f"Limited by the register range: {', '.join(proposal['limited'])}")
+        self.autotune_label.setText('\n'.join(lines))
+        self.btn_autotune_apply.setEnabled(True)
+
+    @define_state(MODE_MANUAL, True)
+    def _run_autotune(self, *args):
+        """Measure the active PID's plant with a step and preview the proposed gains."""
+        try:
+            step = float(self.autotune_step_edit.text())
+            bandwidth, phase_margin = self._autotune_target()
+        except ValueError:
+            self._update_status('Error: Autotune step and target need numeric values')
+            return
+        self.btn_autotune_apply.setEnabled(False)
+        try:
+            self._update_status('Autotune running...')
+            self._autotune = yield(self.queue_work(self.primary_worker, 'autotune', step, bandwidth, phase_margin))
+            self._preview_autotune()
+            self._update_status('Autotune done; check the proposal and apply it')
+        except Exception as e:
+            self.logger.error('Autotune error: %s', e)
+            self._update_status(f"Autotune error: {e}")
+
+    @define_state(MODE_MANUAL, True)
+    def _apply_autotune(self, *args):
+        """Write the previewed P and I to the PID in one batch."""
+        proposal = self._autotune_proposal
+        if proposal is None:
+            return
+        try:
+            result = yield(self.queue_work(self.primary_worker, 'apply_autotune', proposal['p'], proposal['i']))
+            self._apply_view((yield(self.queue_work(self.primary_worker, 'refresh_view'))))
+            self._update_status(f"Autotune applied: p={result['values']['p']:.6g}, i={result['values']['i']:.6g}")
+        except Exception as e:
+            self.logger.error('Autotune apply error: %s', e)
+            self._update_status(f"Autotune apply error: {e}")
+
+    # === DIAGNOSTICS METHODS ===
+
+    @staticmethod
+    def _format_perf_stats(stats):
+        """Render get_perf_stats()['stats'] as a fixed-width table in milliseconds."""
+        lines = [f"{'call':<36}{'count':>8}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}{'bytes':>10}   (ms)"]
+        for key, row in stats.items():
+            if 'p50' not in row:
+                continue
+            lines.append(
+                f"{key:<36}{row['count']:>8}{row['p50'] * 1e3:>9.3f}{row['p95'] * 1e3:>9.3f}"
+                f"{row['p99'] * 1e3:>9.3f}{row['max'] * 1e3:>9.3f}{row['bytes']:>10}"
+            )
+        return '\n'.join(lines)
+
+    @define_state(MODE_MANUAL, True)
+    def _set_perf_enabled(self, checked, *args):
+        enabled = yield(self.queue_work(self.primary_worker, 'set_perf_enabled', checked))
+        self._update_status(f"Latency recording {'on' if enabled else 'off'}")
+
+    @define_state(MODE_MANUAL, True)
+    def _refresh_perf_stats(self, *args):
+        result = yield(self.queue_work(self.primary_worker, 'get_perf_stats'))
+        self.perf_checkbox.blockSignals(True)
+        self.perf_checkbox.setChecked(result['enabled'])
+        self.perf_checkbox.blockSignals(False)
+        self.perf_text.setPlainText(self._format_perf_stats(result['stats']))
+
+    @define_state(MODE_MANUAL, True)
+    def _reset_perf_stats(self, *args):
+        yield(self.queue_work(self.primary_worker, 'reset_perf_stats'))
+        self.perf_text.clear()
+
+    @define_state(MODE_MANUAL, True)
+    def _export_perf_stats(self, *args):
+        path, _ = QFileDialog.getSaveFileName(self.perf_text, 'Export latency stats', 'rp_pid_perf.json', 'JSON (*.json)')
+        if not path:
+            return
+        path = yield(self.queue_work(self.primary_worker, 'export_perf_stats', path))
+        self._update_status(f"Latency stats exported to {path}")
+
+    @define_state(MODE_MANUAL, True)
+    def _set_log_level(self, level, *args):
+        level = yield(self.queue_work(self.primary_worker, 'set_log_level', level))
+        self._update_status(f"Log level {level}")
+
+    @define_state(MODE_MANUAL, True)
+    def _show_recent_log(self, *args):
+        """Show the worker's in-memory log of recent events, newest at the bottom."""
+        result = yield(self.queue_work(self.primary_worker, 'get_recent_log'))
+        self.log_level_combo.blockSignals(True)
+        self.log_level_combo.setCurrentText(result['level'])
+        self.log_level_combo.blockSignals(False)
+        self.log_text.setPlainText(format_events(result['events']))
+        self.log_text.verticalScrollBar().setValue(self.log_text.verticalScrollBar().maximum())
+
+    @define_state(MODE_MANUAL, True)
+    def _clear_recent_log(self, *args):
+        yield(self.queue_work(self.primary_worker, 'clear_recent_log'))
+        self.log_text.clear()
+
+    # === LOCK HEALTH METHODS ===
+
+    def _show_lock_health(self, health):
+        """Show a get_lock_health() result in the indicator and keep the poll timer in step."""
+        relock = health['relock']
+        for checkbox, checked in ((self.lock_monitor_checkbox, health['enabled']),
+                                  (self.auto_relock_checkbox, relock['state'] != 'disabled')):
+            checkbox.blockSignals(True)
+            checkbox.setChecked(checked)
+            checkbox.blockSignals(False)
+        if not health['enabled']:
+            self._health_timer.stop()
+            self.lock_health_label.setText('Lock: not monitored')
+            self.lock_health_label.setStyleSheet(HEALTH_STYLES['idle'])
+            return
+        if not self._health_timer.isActive():
+            self._health_timer.start()
+        state = health['state']
+        text = f"Lock: {state.upper()}"
+        if health['reasons']:
+            text += f" ({', '.join(health['reasons'])})"
+        text += f"  rms {health['rms']:.3g}, lost {health['counts']['lost']}x"
+        if health['steps'] is not None:
+            text += f", steps {health['steps'][0]}/{health['steps'][1]}"
+        if relock['state'] == 'failed':
+            text += ', RELOCK GAVE UP'
+        elif relock['state'] in ('relocking', 'backoff'):
+            text += f", relocking (attempt {relock['attempt']})"
+        elif relock['state'] == 'armed' and relock['counts']['relocked']:
+            text += f", relocked {relock['counts']['relocked']}x ({relock['last_downtime'] * 1e3:.0f} ms)"
+        self.lock_health_label.setText(text)
+        self.lock_health_label.setStyleSheet(HEALTH_STYLES[state])
+        event = health['last_event']
+        if event is not None:
+            stamp = time.strftime('%H:%M:%S', time.localtime(event['time']))
+            self.lock_health_label.setToolTip(f"Last event {stamp}: {event['kind']} - {event['detail']}")
+        if health['sampler_error']:
+            self.lock_health_label.setToolTip(f"Sampler error: {health['sampler_error']}")
+
+    @define_state(MODE_MANUAL, True)
+    def _set_lock_monitor(self, checked, *args):
+        health = yield(self.queue_work(self.primary_worker, 'set_lock_monitor', checked))
+        self._show_lock_health(health)
+
+    @define_state(MODE_MANUAL, True)
+    def _set_auto_relock(self, checked, *args):
+        yield(self.queue_work(self.primary_worker, 'set_auto_relock', checked))
+        health = yield(self.queue_work(self.primary_worker, 'get_lock_health'))
+        self._show_lock_health(health)
+
+    @define_state(MODE_MANUAL | MODE_BUFFERED, False, delete_stale_states=True)
+    def _update_lock_health(self, *args):
+        """Poll the worker's lock monitor; also runs during shots, when losing the lock matters most."""
+        health = yield(self.queue_work(self.primary_worker, 'get_lock_health'))
+        self._show_lock_health(health)
+
     # === SETPOINT SEQUENCE METHODS ===
 
     @define_state(MODE_MANUAL, True)
@@ -833,21 +1171,18 @@ class red_pitaya_pyrpl_pid_tab(DeviceTab):
             self.use_sequence_checkbox.setChecked(bool(checked))
             self.use_sequence_checkbox.blockSignals(False)
             
-            # Enable/disable sequence controls based on state
-            self.array_label.setEnabled(checked)
-            self.setpoint_array_edit.setEnabled(checked)
-            self.index_label.setEnabled(checked)
-            self.setpoint_index_edit.setEnabled(checked)
-            self.current_value_label.setEnabled(checked)
-            self.sequence_value_label.setEnabled(checked)
-            self.last_setpoint_label.setEnabled(checked)
-            self.wrap_flag_label.setEnabled(checked)
-            self.reset_index_button.setEnabled(checked)
-            self.manual_step_button.setEnabled(checked)
+            self._set_sequence_controls_enabled(checked)
         except Exception as e:
-            print(f"[TABS] _set_use_sequence error: {e}")
+            self.logger.error('_set_use_sequence error: %s', e)
             self._update_status(f"Error: {e}")
 
+    def _set_sequence_controls_enabled(self, checked):
+        """Enable/disable the sequence controls (UI only)."""
+        for widget in (self.array_label, self.setpoint_array_edit, self.index_label, self.setpoint_index_edit,
+                       self.current_value_label, self.sequence_value_label, self.last_setpoint_label,
+                       self.wrap_flag_label, self.reset_index_button, self.manual_step_button):
+            widget.setEnabled(bool(checked))
+
     @define_state(MODE_MANUAL, True)
     def _set_setpoint_array(self, *args):
         """Set setpoint array from Python expression"""
@@ -911,7 +1246,7 @@ class red_pitaya_pyrpl_pid_tab(DeviceTab):
             self._update_status(f"Array set ({len(array)} elements)")
             
         except Exception as e:
-            print(f"[TABS] _set_setpoint_array error: {e}")
+            self.logger.error('_set_setpoint_array error: %s', e)
             self._update_status(f"Error: {e}")
 
     @define_state(MODE_MANUAL, True)
@@ -922,11 +1257,10 @@ class red_pitaya_pyrpl_pid_tab(DeviceTab):
             self._update_status(f"Index reset: {result}")
             
             # Reset trigger flag display to gray (Not Triggered)
-            self.wrap_flag_label.setText("Not Triggered")
-            self.wrap_flag_label.setStyleSheet('color: #666666; font-weight: normal;')
+            self._show_wrap_flag(False)
             
         except Exception as e:
-            print(f"[TABS] _reset_sequence_index error: {e}")
+            self.logger.error('_reset_sequence_index error: %s', e)
             self._update_status(f"Error: {e}")
 
     @define_state(MODE_MANUAL, True)
@@ -936,7 +1270,7 @@ class red_pitaya_pyrpl_pid_tab(DeviceTab):
             result = yield(self.queue_work(self.primary_worker, 'manually_change_setpoint'))
             self._update_status(f"Manual step: {result}")
         except Exception as e:
-            print(f"[TABS] _manually_change_setpoint error: {e}")
+            self.logger.error('_manually_change_setpoint error: %s', e)
             self._update_status(f"Error: {e}")
 
     @define_state(MODE_MANUAL, True)
@@ -955,5 +1289,8 @@ class red_pitaya_pyrpl_pid_tab(DeviceTab):
         except ValueError:
             self._update_status("Error: Invalid index (use integer 0-15)")
         except Exception as e:
-            print(f"[TABS] _set_setpoint_index error: {e}")
-            self._update_status(f"Error: {e}")
\ No newline at end of file
+            self.logger.error('_set_setpoint_index error: %s', e)
+            self._update_status(f"Error: {e}")
+
+
+IMPORT_TIME = time.perf_counter() - _import_started
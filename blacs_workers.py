@@ -8,30 +8,168 @@
 #                                                                   #
 #####################################################################
 
-print("Loading Red Pitaya PID BLACS Worker...")
+import time
+_import_started = time.perf_counter()
 
+import functools
 import json
+import logging
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
 from blacs.tab_base_classes import Worker
 import numpy as np
 
-# calibrate the output range
-OUT_MAX = 2.031
-OUT_MIN = 0.007
-OUT_ZERO = (OUT_MAX + OUT_MIN) / 2
+from . import autotune
+from .event_log import device_logger, parse_level
+from .lock_health import LockHealthMonitor
+from .relock import AutoRelock
+from .calibration import (
+    CONFIG_SECTION as CALIBRATION_SECTION, ChannelCalibration, OutputCalibration,
+    calibration_path, calibrations_from_dict, load_calibrations, save_calibrations,
+)
+from .perf import PerfRecorder, instrument_client, instrument_methods
+from .pid_registers import PidSnapshot, RegisterShadow, read_param, read_params, write_params
+from .ring_buffer import RingBuffer
+from .shot_data import SEQUENCE_LENGTH, SHOT_PARAMS, array_hash, from_counts, read_device_group
+from .simulation import SIM_SCHEME
+from .streaming import SetpointStreamer
 
-ZERO_IN1 = -0.011962890625
-HALF_IN1 = 0.42919921875
+# Type coercion applied to PID parameters before they are written (None: pass through)
+PARAM_TYPES = {
+    'input': None,
+    'output_direct': None,
+    'pause_gains': None,
+    'setpoint': float,
+    'p': float,
+    'i': float,
+    'ival': float,
+    'max_voltage': float,
+    'min_voltage': float,
+    'paused': bool,
+    'differential_mode_enabled': bool,
+    'use_setpoint_sequence': bool,
+    'setpoint_index': int,
+    'setpoint_array': list,
+}
+
+# PID parameter -> suffix of its '<pid_id>_<suffix>' key in the 'blacs' config section
+CONFIG_KEYS = {
+    'input': 'input',
+    'output_direct': 'output_direct',
+    'differential_mode_enabled': 'differential_mode',
+    'setpoint': 'setpoint',
+    'pause_gains': 'pause_gains',
+    'max_voltage': 'max_voltage',
+    'min_voltage': 'min_voltage',
+    'ival': 'ival',
+    'p': 'p',
+    'i': 'i',
+    'use_setpoint_sequence': 'use_setpoint_sequence',
+    'setpoint_index': 'setpoint_index',
+    'setpoint_array': 'digital_setpoint_array',
+}
+
+# Parameters of the active PID the tab sends through apply_edits()
+EDIT_PARAMS = ('setpoint', 'p', 'i', 'ival', 'min_voltage', 'max_voltage', 'input', 'output_direct', 'pause_gains')
+
+# Background telemetry sampler defaults
+SAMPLER_RATE = 100.0        # Hz
+SAMPLER_CAPACITY = 65536    # samples kept between two get_error_batch() polls
+SAMPLE_FIELDS = ('time', 'error', 'ival', 'input', 'setpoint_in_sequence', 'setpoint_index')
+LOCK_MONITOR_RATE = 200.0   # Hz, sampler rate requested by the lock-health monitor
+
+# Scope trace capture
+SCOPE_POINTS = 1024         # default length of the summarized trace returned to the tab
+SCOPE_TIMEOUT = 2.0         # seconds to wait for a trace on top of its duration
+
+# Top-level config key recording the board the bitstream was last loaded on
+SESSION_SECTION = 'blacs_session'
+
+# Default delay of the background config autosave, counted from the first unsaved change
+CONFIG_AUTOSAVE_DELAY = 2.0
+
+# Automated calibration
+CALIBRATION_DECIMATION = 1024   # ~134 ms per full trace
+CALIBRATION_TRACES = 4          # full traces averaged per reference level
+LOOPBACK_LEVELS = (-0.9, -0.6, -0.3, 0.0, 0.3, 0.6, 0.9)  # digital output levels driven in loopback
+INPUT_SATURATION = 0.98         # loopback readings beyond this digital level are discarded
+
+# Step-response autotuning
+AUTOTUNE_STEP = 0.1             # output step applied through the paused integrator, digital units
+AUTOTUNE_SETTLED = 0.7          # the fitted response (delay + 5 tau) must settle within this part of the trace
+AUTOTUNE_MIN_RESPONSE = 1e-3    # smallest usable response amplitude, digital units (~8 ADC steps)
+AUTOTUNE_MIN_SNR = 5.0          # response amplitude needed in units of the fit's rms residual
+
+
+def _plain(node):
+    """Convert a pyrpl config branch into plain dicts/lists."""
+    if hasattr(node, '_keys'):
+        return {key: _plain(node[key]) for key in node._keys()}
+    if isinstance(node, (list, tuple)):
+        return [_plain(item) for item in node]
+    return node
+
+
+def _exclusive(method):
+    """Run a worker method while holding the hardware lock shared with the sampler thread."""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._hw_lock:
+            return method(self, *args, **kwargs)
+    return wrapper
 
-ZERO_IN2 = -0.0052490234375
-HALF_IN2 = 0.43505859375
 
 class red_pitaya_pyrpl_pid_worker(Worker):
     def init(self):
         import sys
+        # Per-device logger; records below its level cost one level check, see set_log_level()
+        self.log, self._recent_log = device_logger(
+            getattr(self, 'device_name', 'red_pitaya_pyrpl_pid'), getattr(self, 'log_level', None) or 'INFO'
+        )
         self.current = {}
-        print(f"[WORKER] Worker init called.")
-        print(f"[WORKER] ip_addr={getattr(self, 'ip_addr', None)}")
-        print(f"[WORKER] sys.executable={sys.executable}")
+        # Serializes hardware access between BLACS calls and the sampler thread
+        self._hw_lock = threading.RLock()
+        self._sampler_thread = None
+        self._sampler_stop = threading.Event()
+        self._samples_lock = threading.Lock()
+        self._samples = RingBuffer(SAMPLER_CAPACITY, width=len(SAMPLE_FIELDS))
+        self._samples_cursor = 0
+        self._sampler_error = None
+        # client ('plot', 'lock_monitor') -> sampler rate it asked for; the thread runs while any is left
+        self._sampler_clients = {}
+        self._sampler_rate = SAMPLER_RATE
+        # Fed by the sampler thread, see set_lock_monitor()
+        self.lock_health = LockHealthMonitor()
+        self.lock_health.listeners.append(self._on_lock_lost)
+        # True from transition_to_buffered until the shot is over; the auto relock never acts then
+        self.in_shot = False
+        self.relock = AutoRelock(self)
+        # channel -> (content hash, calibration stamp) of the last setpoint array uploaded from a shot
+        self._uploaded_setpoints = {}
+        # channel -> SetpointStreamer feeding a sequence longer than the table during a shot
+        self._streamers = {}
+        self.stream_status = {}
+        # channel -> {name: register value} overridden by the running shot, restored afterwards
+        self._manual_params = {}
+        # Parsed config file and its mtime as we last wrote it, see _update_config_file()
+        self._config_lock = threading.Lock()
+        self._config_doc = None
+        self._config_mtime = None
+        self._saved_blacs_cfg = None
+        self._autosave_timer = None
+        self._autosave_delay = float(getattr(self, 'config_autosave', 0) or 0)
+        # Last view model returned by refresh_view(), without its volatile fields, and its version
+        self._view = None
+        self._view_version = 0
+        # channel -> [(reference volts, mean digital reading), ...] for fit_input_calibration()
+        self._calibration_points = {'in1': [], 'in2': []}
+        # Last autotune() result, written by apply_autotune()
+        self._autotune = None
+        self.log.info('Worker init called, ip_addr=%s, sys.executable=%s',
+                      getattr(self, 'ip_addr', None), sys.executable)
+        started = time.perf_counter()
         try:
             import numpy as np
             if not hasattr(np, 'VisibleDeprecationWarning'):
@@ -40,86 +178,197 @@ class red_pitaya_pyrpl_pid_worker(Worker):
                 np.ComplexWarning = UserWarning
             if not hasattr(np, "complex"):
                 np.complex = complex
+            self._batch = None
+            self.batch_transactions = 0
+            attached = False
+            self.startup_reason = None
+            if getattr(self, 'fast_attach', True):
+                # Reuse the running bitstream and PID state if they are ours
+                self._connect(reloadfpga=False)
+                self.startup_reason = self._attach_check()
+                attached = self.startup_reason is None
+                if not attached:
+                    self.log.info('Cannot attach to the running PIDs (%s), doing a full start', self.startup_reason)
+                    # Load the bitstream over the probe's connection instead of creating a second Pyrpl
+                    self._reload_bitstream()
+            else:
+                self._connect(reloadfpga=True)
+            self.calibration = self._load_calibration()
+            if attached:
+                self._attach_running_pids()
+            else:
+                self._full_start()
+            # Latency instrumentation, off unless requested (see set_perf_enabled())
+            self.perf = PerfRecorder()
+            self.perf.enabled = False
+            if getattr(self, 'perf_stats', False):
+                self.set_perf_enabled(True)
+            if getattr(self, 'lock_monitor', 0):
+                self.set_lock_monitor(True, rate=self.lock_monitor)
+            if getattr(self, 'auto_relock', False):
+                self.set_auto_relock(True)
+            self.startup_mode = 'attach' if attached else 'full'
+            self.startup_time = time.perf_counter() - started
+            self.log.info('Worker started in %.2f s (%s)', self.startup_time, self.startup_mode)
+        except Exception:
+            self.log.exception('Pyrpl connection failed')
+            raise
+
+    # ---------- Connection and startup ----------
+    def _connect(self, reloadfpga):
+        """Create the Pyrpl instance and the PID handles; with reloadfpga=False the running bitstream is kept.
+
+        An ip_addr of the form 'sim://...' selects the in-process simulated
+        board (see simulation.py) instead of real hardware.
+        """
+        if str(self.ip_addr).startswith(SIM_SCHEME):
+            from .simulation import SimPyrpl as Pyrpl
+        else:
             from pyrpl import Pyrpl
-            print("[WORKER] Imported Pyrpl successfully.")
-            print(f"[WORKER] Attempting to connect to Red Pitaya at {self.ip_addr}")
-            self.p = Pyrpl(hostname=self.ip_addr)
-            print("[WORKER] Pyrpl instance created successfully.")
-            # Always use pid1 by default, so that it's easier to write analogous code for pid0
-            self.pids = {
-                'in2': self.p.rp.pid0,
-                'in1': self.p.rp.pid1
-            }
-            self.pids['in1'].ival = -0.99
-            self.pids['in2'].ival = -0.99
-            self.pids['in1'].pause_gains = 'pi'
-            self.pids['in2'].pause_gains = 'pi'
-            self.pids['in1'].paused = True
-            self.pids['in2'].paused = True
-            if 'blacs' in self.p.c._keys():
-                blacs_cfg = self.p.c['blacs']
-                self.pids['in1'].input = blacs_cfg['in1_input']
-                self.pids['in2'].input = blacs_cfg['in2_input']
-                self.pids['in1'].output_direct = blacs_cfg['in1_output_direct']
-                self.pids['in2'].output_direct = blacs_cfg['in2_output_direct']
-                self.pids['in1'].differential_mode_enabled = blacs_cfg['in1_differential_mode']
-                self.pids['in2'].differential_mode_enabled = blacs_cfg['in2_differential_mode']
-                self.pids['in1'].setpoint = blacs_cfg['in1_setpoint']
-                self.pids['in2'].setpoint = blacs_cfg['in2_setpoint']
-                self.pids['in1'].pause_gains = blacs_cfg['in1_pause_gains']
-                self.pids['in2'].pause_gains = blacs_cfg['in2_pause_gains']
-                self.pids['in1'].max_voltage = blacs_cfg['in1_max_voltage']
-                self.pids['in2'].max_voltage = blacs_cfg['in2_max_voltage']
-                self.pids['in1'].min_voltage = blacs_cfg['in1_min_voltage']
-                self.pids['in2'].min_voltage = blacs_cfg['in2_min_voltage']
-                self.pids['in1'].ival = blacs_cfg['in1_ival']
-                self.pids['in2'].ival = blacs_cfg['in2_ival']
-                self.pids['in1'].p = blacs_cfg['in1_p']
-                self.pids['in2'].p = blacs_cfg['in2_p']
-                self.pids['in1'].i = blacs_cfg['in1_i']
-                self.pids['in2'].i = blacs_cfg['in2_i']
-                self.pids['in1'].use_setpoint_sequence = blacs_cfg['in1_use_setpoint_sequence']
-                self.pids['in2'].use_setpoint_sequence = blacs_cfg['in2_use_setpoint_sequence']
-                self.pids['in1'].setpoint_index = blacs_cfg['in1_setpoint_index']
-                self.pids['in2'].setpoint_index = blacs_cfg['in2_setpoint_index']
-                in1_digital_setpoint_array = blacs_cfg['in1_digital_setpoint_array']
-                in2_digital_setpoint_array = blacs_cfg['in2_digital_setpoint_array']
-                self.pids['in1'].set_setpoint_array(in1_digital_setpoint_array)
-                self.pids['in2'].set_setpoint_array(in2_digital_setpoint_array)
-                # Initialize current dictionary structure before accessing
-                self.current['in1'] = {}
-                self.current['in2'] = {}
-                self.current['in1']['digital_setpoint_array'] = [self.dig2phy_setpoint_in1(x) for x in in1_digital_setpoint_array]
-                self.current['in2']['digital_setpoint_array'] = [self.dig2phy_setpoint_in2(x) for x in in2_digital_setpoint_array]
-                if blacs_cfg['set_in2_enabled']:
-                    self.setpoint_source = 'digital_setpoint_in2'
-                    self.set_in2_enabled = True
-                    self.set_analog_enabled = False
-                    self.set_in1_enabled = blacs_cfg['set_in1_enabled']
-                if blacs_cfg['set_in1_enabled']:
-                    self.setpoint_source = 'digital_setpoint_in1'
-                    self.set_in1_enabled = True
-                    self.set_analog_enabled = False
-                    self.set_in2_enabled = blacs_cfg['set_in2_enabled']
-                if blacs_cfg['set_analog_enabled']:
-                    self.setpoint_source = 'analog_setpoint'
-                    self.set_analog_enabled = True
-                    self.set_in2_enabled = False
-                    self.set_in1_enabled = False
+        self.log.info('Connecting to Red Pitaya at %s (reloadfpga=%s)', self.ip_addr, reloadfpga)
+        self.p = Pyrpl(hostname=self.ip_addr, reloadfpga=reloadfpga)
+        self.log.debug('Pyrpl instance created')
+        self._bind_pids()
+
+    def _reload_bitstream(self):
+        """Load the bitstream and restart the server on the existing connection (a full start after a failed attach probe)."""
+        self.log.info('Reloading the FPGA bitstream on %s', self.ip_addr)
+        self.p.rp.update_fpga()
+        self.p.rp.start()
+        self._bind_pids()
+
+    def _bind_pids(self):
+        """(Re)create the PID handles and their shadow caches; module objects are rebuilt when the server restarts."""
+        # Always use pid1 by default, so that it's easier to write analogous code for pid0
+        self.pids = {
+            'in2': self.p.rp.pid0,
+            'in1': self.p.rp.pid1
+        }
+        # Shadow copy of the register state, see invalidate_cache(); a new connection starts without one
+        self.shadow = {pid_id: RegisterShadow() for pid_id in self.pids}
+        self._uploaded_setpoints.clear()
+
+    def _board_dna(self):
+        """Device DNA of the Red Pitaya, or None if the bitstream does not expose it."""
+        try:
+            return int(self.p.rp.hk.dna)
+        except Exception:
+            return None
+
+    def _attach_check(self):
+        """Return why the running PIDs cannot be adopted, or None if they can.
+
+        The board must be the one recorded by the last full start, and at least
+        one PID must drive an output: after a power cycle or a bitstream reload
+        every register is back at its reset value (all outputs 'off').
+        """
+        session = self._config_section(SESSION_SECTION)
+        if not session:
+            return 'no previous session recorded'
+        if session.get('hostname') != self.ip_addr:
+            return f"last session was on {session.get('hostname')}"
+        dna = self._board_dna()
+        if dna is not None and session.get('dna') is not None and dna != session['dna']:
+            return 'different board'
+        snapshot = self._snapshot()
+        if all(state.output_direct == 'off' for state in snapshot.values()):
+            return 'PID registers at their reset values'
+        return None
+
+    def _record_session(self):
+        """Remember which board the bitstream was loaded on, for _attach_check()."""
+        self._update_config_file({SESSION_SECTION: {
+            'hostname': self.ip_addr,
+            'dna': self._board_dna(),
+            'started': time.strftime('%Y-%m-%d %H:%M:%S'),
+        }})
+
+    def _attach_running_pids(self):
+        """Adopt the live PID state instead of parking the PIDs and re-applying the config."""
+        # Nothing cached before the attach may be trusted
+        self.invalidate_cache()
+        blacs_cfg = self._config_section('blacs') or {}
+        for pid_id in self.pids:
+            # The setpoint table cannot be read back; assume the saved one is loaded
+            array = blacs_cfg.get(f'{pid_id}_digital_setpoint_array')
+            self.current.setdefault(pid_id, {})['digital_setpoint_array'] = (
+                self.calibration[pid_id].to_physical(np.asarray(array)).tolist() if array else []
+            )
+        snapshot = self._read_current_state()
+        if snapshot is None:
+            raise RuntimeError('Failed to read the running PID state')
+        in1, in2 = snapshot['in1'], snapshot['in2']
+        if in1.differential_mode_enabled:
+            self.setpoint_source = 'analog_setpoint'
+            self.set_analog_enabled = not in1.paused
+            self.set_in1_enabled = False
+            self.set_in2_enabled = False
+        else:
+            self.set_analog_enabled = False
+            self.set_in1_enabled = not in1.paused
+            self.set_in2_enabled = not in2.paused
+            if self.set_in2_enabled and not self.set_in1_enabled:
+                self.setpoint_source = 'digital_setpoint_in2'
             else:
                 self.setpoint_source = 'digital_setpoint_in1'
-                self.pids['in1'].input = 'in1'
-                self.pids['in1'].output_direct = 'out1'
-                self.pids['in2'].input = 'in2'
-                self.pids['in2'].output_direct = 'out2'
+        self.log.info('Attached to running PIDs, setpoint source %s', self.setpoint_source)
+
+    def _full_start(self):
+        """Park both PIDs and apply the saved 'blacs' config (or the defaults)."""
+        # Write the whole config, whatever the cache holds
+        self.invalidate_cache()
+        # Park both PIDs before applying anything else
+        self.apply_params({
+            pid_id: {'ival': -0.99, 'pause_gains': 'pi', 'paused': True}
+            for pid_id in self.pids
+        })
+        if 'blacs' in self.p.c._keys():
+            blacs_cfg = self.p.c['blacs']
+            self.apply_params({
+                pid_id: {name: blacs_cfg[f'{pid_id}_{key}'] for name, key in CONFIG_KEYS.items()}
+                for pid_id in self.pids
+            })
+            in1_digital_setpoint_array = blacs_cfg['in1_digital_setpoint_array']
+            in2_digital_setpoint_array = blacs_cfg['in2_digital_setpoint_array']
+            # Initialize current dictionary structure before accessing
+            self.current.setdefault('in1', {})
+            self.current.setdefault('in2', {})
+            self.current['in1']['digital_setpoint_array'] = self.calibration['in1'].to_physical(np.asarray(in1_digital_setpoint_array)).tolist()
+            self.current['in2']['digital_setpoint_array'] = self.calibration['in2'].to_physical(np.asarray(in2_digital_setpoint_array)).tolist()
+            if blacs_cfg['set_in2_enabled']:
+                self.setpoint_source = 'digital_setpoint_in2'
+                self.set_in2_enabled = True
+                self.set_analog_enabled = False
+                self.set_in1_enabled = blacs_cfg['set_in1_enabled']
+            if blacs_cfg['set_in1_enabled']:
+                self.setpoint_source = 'digital_setpoint_in1'
                 self.set_in1_enabled = True
-                self.set_in2_enabled = False
                 self.set_analog_enabled = False
-        except Exception as e:
-            print(f"[WORKER] Pyrpl connection failed: {e}, please read logs for more details.")
-            import traceback
-            traceback.print_exc()
-            raise
+                self.set_in2_enabled = blacs_cfg['set_in2_enabled']
+            if blacs_cfg['set_analog_enabled']:
+                self.setpoint_source = 'analog_setpoint'
+                self.set_analog_enabled = True
+                self.set_in2_enabled = False
+                self.set_in1_enabled = False
+        else:
+            self.setpoint_source = 'digital_setpoint_in1'
+            self.apply_params({
+                'in1': {'input': 'in1', 'output_direct': 'out1'},
+                'in2': {'input': 'in2', 'output_direct': 'out2'},
+            })
+            self.set_in1_enabled = True
+            self.set_in2_enabled = False
+            self.set_analog_enabled = False
+        self._record_session()
+
+    def get_startup_report(self):
+        """How the worker started: {'mode': 'attach' or 'full', 'seconds': ..., 'reason': ..., 'import_seconds': ...}."""
+        return {
+            'mode': self.startup_mode,
+            'seconds': self.startup_time,
+            'reason': self.startup_reason,
+            'import_seconds': IMPORT_TIME,
+        }
 
     # ---------- Individual Parameter Setting Methods (Windfreak style) ----------
     def _get_pid(self, pid_id):
@@ -128,112 +377,119 @@ class red_pitaya_pyrpl_pid_worker(Worker):
             raise ValueError(f"Invalid PID ID: {pid_id}. Must be 0 or 1.")
         return self.pids[pid_id]
     
+    @_exclusive
     def set_p(self, value):
         """Set P parameter directly"""        
         try:
             if self.setpoint_source == 'digital_setpoint_in2':
                 self._set_param('in2', 'p', value)
-                return float(self._get_pid('in2').p)
+                return float(self._get_param('in2', 'p'))
             else:
                 self._set_param('in1', 'p', value)
-                return float(self._get_pid('in1').p)
+                return float(self._get_param('in1', 'p'))
         except Exception as e:
-            print(f"[DEBUG] set_p error: {e}")
+            self.log.error('set_p error: %s', e)
             raise
 
+    @_exclusive
     def set_i(self, value):
         """Set I parameter directly"""
         try:
             if self.setpoint_source == 'digital_setpoint_in2':
                 self._set_param('in2', 'i', value)
-                return float(self._get_pid('in2').i)
+                return float(self._get_param('in2', 'i'))
             else:
                 self._set_param('in1', 'i', value)
-                return float(self._get_pid('in1').i)
+                return float(self._get_param('in1', 'i'))
         except Exception as e:
-            print(f"[DEBUG] set_i error: {e}")
+            self.log.error('set_i error: %s', e)
             raise
 
+    @_exclusive
     def set_setpoint(self, value):
         """Set setpoint parameter directly"""
         try:
             if self.setpoint_source == 'digital_setpoint_in2':
-                self._set_param('in2', 'setpoint', self.phy2dig_setpoint_in2(value))
-                return self.dig2phy_setpoint_in2(float(self._get_pid('in2').setpoint))
+                self._set_param('in2', 'setpoint', self.calibration['in2'].to_digital(value))
+                return self.calibration['in2'].to_physical(float(self._get_param('in2', 'setpoint')))
             else:
-                self._set_param('in1', 'setpoint', self.phy2dig_setpoint_in1(value))
-                return self.dig2phy_setpoint_in1(float(self._get_pid('in1').setpoint))
+                self._set_param('in1', 'setpoint', self.calibration['in1'].to_digital(value))
+                return self.calibration['in1'].to_physical(float(self._get_param('in1', 'setpoint')))
         except Exception as e:
-            print(f"[DEBUG] set_setpoint error: {e}")
+            self.log.error('set_setpoint error: %s', e)
             raise
 
+    @_exclusive
     def set_output_direct(self, output_value):
         """Set the direct output parameter."""
         try:
             if self.setpoint_source == 'digital_setpoint_in2':
                 self._set_param('in2', 'output_direct', output_value)
-                return self._get_pid('in2').output_direct
+                return self._get_param('in2', 'output_direct')
             else:
                 self._set_param('in1', 'output_direct', output_value)
-                return self._get_pid('in1').output_direct
+                return self._get_param('in1', 'output_direct')
         except Exception as e:
-            print(f"[DEBUG] set_output_direct error: {e}")
+            self.log.error('set_output_direct error: %s', e)
             raise
 
+    @_exclusive
     def set_input(self, value):
         """Set input parameter directly"""
         try:
             if self.setpoint_source == 'digital_setpoint_in2':
                 self._set_param('in2', 'input', value)
-                return self._get_pid('in2').input
+                return self._get_param('in2', 'input')
             else:
                 self._set_param('in1', 'input', value)
-                return self._get_pid('in1').input
+                return self._get_param('in1', 'input')
         except Exception as e:
-            print(f"[DEBUG] set_input error: {e}")
+            self.log.error('set_input error: %s', e)
             raise
 
+    @_exclusive
     def set_min_voltage(self, value):
         """Set min_voltage parameter directly"""
         try:
             if self.setpoint_source == 'digital_setpoint_in2':
                 self._set_param('in2', 'min_voltage', value)
-                return float(self._get_pid('in2').min_voltage)
+                return float(self._get_param('in2', 'min_voltage'))
             else:
                 self._set_param('in1', 'min_voltage', value)
-                return float(self._get_pid('in1').min_voltage)
+                return float(self._get_param('in1', 'min_voltage'))
         except Exception as e:
-            print(f"[DEBUG] set_min_voltage error: {e}")
+            self.log.error('set_min_voltage error: %s', e)
             raise
 
+    @_exclusive
     def set_max_voltage(self, value):
         """Set max_voltage parameter directly"""
         try:
             if self.setpoint_source == 'digital_setpoint_in2':
                 self._set_param('in2', 'max_voltage', value)
-                return float(self._get_pid('in2').max_voltage)
+                return float(self._get_param('in2', 'max_voltage'))
             else:
                 self._set_param('in1', 'max_voltage', value)
-                return float(self._get_pid('in1').max_voltage)
+                return float(self._get_param('in1', 'max_voltage'))
         except Exception as e:
-            print(f"[DEBUG] set_max_voltage error: {e}")
+            self.log.error('set_max_voltage error: %s', e)
             raise
 
+    @_exclusive
     def set_ival(self, value):
         """Set ival parameter directly"""
         try:
             if self.setpoint_source == 'digital_setpoint_in2':
                 self._set_param('in2', 'ival', value)
-                return float(self._get_pid('in2').ival)
+                return float(self._get_param('in2', 'ival'))
             else:
                 self._set_param('in1', 'ival', value)
-                print(f"[DEBUG] set_ival: {value}")
-                return float(self._get_pid('in1').ival)
-                
+                return float(self._get_param('in1', 'ival'))
         except Exception as e:
-            print(f"[DEBUG] set_ival error: {e}")
+            self.log.error('set_ival error: %s', e)
             raise
 
+    @_exclusive
     def enable_pid(self):
         """Enable the PID controller"""
         try:
@@ -241,425 +497,1172 @@ class red_pitaya_pyrpl_pid_worker(Worker):
                 self._set_param('in2', 'paused', False)
                 self.set_in2_enabled = True
                 self.set_analog_enabled = False
-                return not self._get_pid('in2').paused
+                return not self._get_param('in2', 'paused')
             elif self.setpoint_source == 'digital_setpoint_in1':
                 self._set_param('in1', 'paused', False)
                 self.set_in1_enabled = True
                 self.set_analog_enabled = False
-                return not self._get_pid('in1').paused
+                return not self._get_param('in1', 'paused')
             elif self.setpoint_source == 'analog_setpoint':
                 self._set_param('in1', 'paused', False)
                 self.set_analog_enabled = True
                 self.set_in1_enabled = False
                 self.set_in2_enabled = False
-                return not self._get_pid('in1').paused
+                return not self._get_param('in1', 'paused')
         except Exception as e:
-            print(f"[DEBUG] enable_pid error: {e}")
+            self.log.error('enable_pid error: %s', e)
             raise
 
+    @_exclusive
     def disable_pid(self):
         """Disable the PID controller"""
         try:
             if self.setpoint_source == 'digital_setpoint_in2':
                 self._set_param('in2', 'paused', True)
                 self.set_in2_enabled = False
-                return self._get_pid('in2').paused
+                return self._get_param('in2', 'paused')
             elif self.setpoint_source == 'digital_setpoint_in1':
                 self._set_param('in1', 'paused', True)
                 self.set_in1_enabled = False
-                return self._get_pid('in1').paused
+                return self._get_param('in1', 'paused')
             elif self.setpoint_source == 'analog_setpoint':
                 self._set_param('in1', 'paused', True)
                 self.set_analog_enabled = False
-                return self._get_pid('in1').paused
+                return self._get_param('in1', 'paused')
         except Exception as e:
-            print(f"[DEBUG] disable_pid error: {e}")
+            self.log.error('disable_pid error: %s', e)
             raise
 
+    @_exclusive
     def set_pause_gains(self, value):
         """Set pause_gains parameter directly"""
         try:
             if self.setpoint_source == 'digital_setpoint_in2':
                 self._set_param('in2', 'pause_gains', value)
-                return self._get_pid('in2').pause_gains
+                return self._get_param('in2', 'pause_gains')
             else:
                 self._set_param('in1', 'pause_gains', value)
-                return self._get_pid('in1').pause_gains
+                return self._get_param('in1', 'pause_gains')
         except Exception as e:
-            print(f"[WORKER] set_pause_gains error: {e}")
+            self.log.error('set_pause_gains error: %s', e)
             raise
 
+    @_exclusive
     def set_setpoint_source(self, value):
         """Set setpoint source (analog_setpoint or digital_setpoint)"""
-        print(f"[WORKER] Setting setpoint source to: {value}")
+        self.log.info('Setting setpoint source to %s', value)
         self.current['setpoint_source'] = value
         self.setpoint_source = value
         if value == 'analog_setpoint':
             self.set_in1_enabled = False
             self.set_in2_enabled = False
             self.set_analog_enabled = True
-            self.pids['in1'].use_setpoint_sequence = False
-            self.pids['in2'].use_setpoint_sequence = False
             self.setpoint_source = 'analog_setpoint'
-            self.pids['in2'].output_direct = 'off'
-            self.pids['in1'].output_direct = 'out1'
-            self.pids['in1'].input = 'in1'
-            self.pids['in2'].input = 'in2'
-            self.pids['in1'].setpoint = 0 #dummy
-            self.pids['in2'].setpoint = 0 #dummy
-            self.pids['in1'].p = 0
-            self.pids['in1'].i = 0
-            self.pids['in1'].ival = 0
-            self.pids['in2'].p = 0
-            self.pids['in2'].i = 0
-            self.pids['in2'].ival = 0
-            self.pids['in2'].max_voltage = 0.99
-            self.pids['in2'].min_voltage = -0.99
-            self.pids['in1'].pause_gains = "pi"
-            self.pids['in2'].pause_gains = "pi"
-            self.pids['in2'].paused = True
-            self.pids['in1'].paused = True
-            self.pids['in1'].differential_mode_enabled = True
+            self.apply_params({
+                'in1': {
+                    'use_setpoint_sequence': False,
+                    'output_direct': 'out1',
+                    'input': 'in1',
+                    'setpoint': 0,  # dummy
+                    'p': 0,
+                    'i': 0,
+                    'ival': 0,
+                    'pause_gains': 'pi',
+                    'paused': True,
+                    'differential_mode_enabled': True,
+                },
+                'in2': {
+                    'use_setpoint_sequence': False,
+                    'output_direct': 'off',
+                    'input': 'in2',
+                    'setpoint': 0,  # dummy
+                    'p': 0,
+                    'i': 0,
+                    'ival': 0,
+                    'max_voltage': 0.99,
+                    'min_voltage': -0.99,
+                    'pause_gains': 'pi',
+                    'paused': True,
+                },
+            })
             self._read_current_state()
-            print(f"[WORKER] set_setpoint_source: analog_setpoint mode enabled, input is in1, setpoint is in2, output is out1!")
+            self.log.info('analog_setpoint mode enabled: input is in1, setpoint is in2, output is out1')
         elif value == 'digital_setpoint_in1':
             self.set_in1_enabled = True
             self.set_analog_enabled = False
             self.setpoint_source = 'digital_setpoint_in1'
-            self.pids['in1'].input = 'in1'
-            self.pids['in1'].output_direct = 'out1'
-            self.pids['in1'].differential_mode_enabled = False
-            self.pids['in2'].differential_mode_enabled = False
+            self.apply_params({
+                'in1': {'input': 'in1', 'output_direct': 'out1', 'differential_mode_enabled': False},
+                'in2': {'differential_mode_enabled': False},
+            })
             self._read_current_state()
-            print(f"[WORKER] set_setpoint_source: digital_setpoint mode, PID values refreshed: {self.current}")
+            self.log.debug('digital_setpoint_in1 mode, PID values refreshed: %s', self.current)
         elif value == 'digital_setpoint_in2':
             self.set_in2_enabled = True
             self.set_analog_enabled = False
             self.setpoint_source = 'digital_setpoint_in2'
-            self.pids['in2'].input = 'in2'
-            self.pids['in2'].output_direct = 'out2'
-            self.pids['in1'].differential_mode_enabled = False
-            self.pids['in2'].differential_mode_enabled = False
+            self.apply_params({
+                'in1': {'differential_mode_enabled': False},
+                'in2': {'input': 'in2', 'output_direct': 'out2', 'differential_mode_enabled': False},
+            })
             self._read_current_state()
-            print(f"[WORKER] set_setpoint_source: digital_setpoint_in2 mode, PID values refreshed: {self.current}")
+            self.log.debug('digital_setpoint_in2 mode, PID values refreshed: %s', self.current)
         return value
 
+    def _snapshot(self):
+        """Read the complete state of both PID modules, one block read per module."""
+        return {pid_id: PidSnapshot.read(pid, self.shadow[pid_id]) for pid_id, pid in self.pids.items()}
+
     def _read_current_state(self):
-        """Read the current state of both PID modules from hardware."""
+        """Read the current state of both PID modules from hardware.
+
+        Returns the {'in1': PidSnapshot, 'in2': PidSnapshot} it was built from,
+        or None if reading failed.
+        """
         status = {}
         try:
-            for pid_id, pid in self.pids.items():
+            snapshot = self._snapshot()
+            for pid_id, state in snapshot.items():
                 if pid_id == 'in1':
-                    setpoint_phy = self.dig2phy_setpoint_in1(pid.setpoint)
-                    setpoint_in_sequence_phy = self.dig2phy_setpoint_in1(pid.setpoint_in_sequence)
+                    setpoint_phy = self.calibration['in1'].to_physical(state.setpoint)
+                    setpoint_in_sequence_phy = self.calibration['in1'].to_physical(state.setpoint_in_sequence)
                 else:
-                    setpoint_phy = self.dig2phy_setpoint_in2(pid.setpoint)
-                    setpoint_in_sequence_phy = self.dig2phy_setpoint_in2(pid.setpoint_in_sequence)
-                pid_status = {
-                    'input': pid.input,
-                    'output_direct': pid.output_direct,
+                    setpoint_phy = self.calibration['in2'].to_physical(state.setpoint)
+                    setpoint_in_sequence_phy = self.calibration['in2'].to_physical(state.setpoint_in_sequence)
+                pid_status = state.as_dict()
+                del pid_status['timestamp']
+                pid_status.update({
                     'setpoint': setpoint_phy,
-                    'p': pid.p,
-                    'i': pid.i,
-                    'max_voltage': pid.max_voltage+OUT_ZERO,
-                    'min_voltage': pid.min_voltage+OUT_ZERO,
-                    'ival': pid.ival,
-                    'pause_gains': pid.pause_gains,
-                    'paused': pid.paused,
-                    'differential_mode_enabled': pid.differential_mode_enabled,
-                    'use_setpoint_sequence': pid.use_setpoint_sequence,
-                    'setpoint_index': pid.setpoint_index,
+                    'max_voltage': self.calibration['out'].to_physical(state.max_voltage),
+                    'min_voltage': self.calibration['out'].to_physical(state.min_voltage),
                     'setpoint_in_sequence': setpoint_in_sequence_phy,
-                    'sequence_wrap_flag': pid.sequence_wrap_flag,
                     # Preserve existing digital_setpoint_array if it exists
                     'digital_setpoint_array': self.current.get(pid_id, {}).get('digital_setpoint_array', [])
-                }
+                })
                 status[pid_id] = pid_status
-            
-            print(f"[WORKER] Current state for all PIDs read successfully: {status}")
+
+            self.log.debug('Current state of both PIDs: %s', status)
             # Update instead of replace to preserve initialization data
             self.current.update(status)
+            return snapshot
         except Exception as e:
-            print(f"[WORKER] Error reading current state: {e}")
+            self.log.error('Error reading current state: %s', e)
+            return None
 
     def _set_param(self, pid_id, name, value):
-        """Helper to set a parameter for a specific PID module."""
+        """Helper to set a parameter for a specific PID module.
+
+        Inside a batch() block the write is queued and flushed on exit.
+        """
         pid = self._get_pid(pid_id)
-        print(f"[DEBUG] _set_param called for PID{pid_id}: {name} = {value}")
-        try:
-            if name == 'input':
-                pid.input = value
-            elif name == 'output_direct':
-                pid.output_direct = value
-            elif name == 'setpoint':
-                pid.setpoint = float(value)
-            elif name == 'p':
-                pid.p = float(value)
-            elif name == 'i':
-                pid.i = float(value)
-            elif name == 'ival':
-                pid.ival = float(value)
-            elif name == 'max_voltage':
-                pid.max_voltage = float(value)
-                self.current[pid_id]['max_voltage'] = pid.max_voltage + OUT_ZERO
-            elif name == 'min_voltage':
-                pid.min_voltage = float(value)
-                self.current[pid_id]['min_voltage'] = pid.min_voltage + OUT_ZERO
-            elif name == 'pause_gains':
-                pid.pause_gains = value
-            elif name == 'paused':
-                pid.paused = bool(value)
-            elif name == 'differential_mode_enabled':
-                pid.differential_mode_enabled = bool(value)
-            else:
-                raise ValueError(f'Unknown PID parameter: {name}')
-            print(f"[DEBUG] _set_param success for PID{pid_id}: {name} set to {value}")
-        except Exception as e:
-            print(f"[DEBUG] _set_param error for PID{pid_id}: {name} = {value}, error: {e}")
-            raise
-        if name != 'max_voltage' and name != 'min_voltage':
-            self.current[pid_id][name] = value
+        if name not in PARAM_TYPES:
+            raise ValueError(f'Unknown PID parameter: {name}')
+        cast = PARAM_TYPES[name]
+        if cast is not None:
+            value = cast(value)
+        if self._batch is not None:
+            self._batch.setdefault(pid_id, {})[name] = value
+        else:
+            try:
+                write_params(pid, {name: value}, self.shadow[pid_id])
+            except Exception as e:
+                self.log.error('Setting %s.%s = %r failed: %s', pid_id, name, value, e)
+                raise
+            self.log.debug('Set %s.%s = %r', pid_id, name, value)
+        self._mark_config_dirty()
+        if name == 'setpoint_array':
+            return
+        current = self.current.setdefault(pid_id, {})
+        if name in ('max_voltage', 'min_voltage'):
+            current[name] = self.calibration['out'].to_physical(value)
+        else:
+            current[name] = value
+
+    @contextmanager
+    def batch(self):
+        """Collect all _set_param writes made inside the block and flush them
+        as contiguous register block writes on exit. Nested batches are merged
+        into the outermost one; nothing is written if the block raises."""
+        if self._batch is not None:
+            yield
+            return
+        self._batch = {}
+        try:
+            yield
+            pending, self._batch = self._batch, None
+            transactions = 0
+            for pid_id, params in pending.items():
+                transactions += write_params(self._get_pid(pid_id), params, self.shadow[pid_id])
+            self.batch_transactions = transactions
+        finally:
+            self._batch = None
+
+    def _active_pid_id(self):
+        """PID module used by the current setpoint source ('in1' also for analog_setpoint)."""
+        return 'in2' if self.setpoint_source == 'digital_setpoint_in2' else 'in1'
+
+    def _get_param(self, pid_id, name):
+        """Read a PID parameter, served from the shadow cache where safe."""
+        return read_param(self._get_pid(pid_id), name, self.shadow[pid_id])
+
+    @_exclusive
+    def invalidate_cache(self, pid_id=None):
+        """Drop the shadow register cache, e.g. after pyrpl's own GUI changed the PIDs.
+
+        The worker calls this itself wherever the board may have changed
+        underneath the cache: on (re)connecting, attaching, a full start and
+        fresh shots.
+        """
+        for key in ([pid_id] if pid_id is not None else self.shadow):
+            self.shadow[key].invalidate()
+            self._uploaded_setpoints.pop(key, None)
+        return True
+
+    @_exclusive
+    def apply_params(self, params):
+        """Apply {'in1': {name: value, ...}, 'in2': {...}} as one batch.
+
+        Returns the number of hardware transactions used.
+        """
+        with self.batch():
+            for pid_id, values in params.items():
+                for name, value in values.items():
+                    self._set_param(pid_id, name, value)
+        return self.batch_transactions
     
+    @_exclusive
+    def apply_edits(self, edits):
+        """Apply {name: value} edits of the active PID as one batch.
+
+        setpoint is in volts at the input, the other values are as for the
+        individual setters (set_p, set_min_voltage, ...). Returns the values
+        read back in the same units and the transactions used.
+        """
+        pid_id = self._active_pid_id()
+        params = {}
+        for name, value in edits.items():
+            if name not in EDIT_PARAMS:
+                raise ValueError(f'Unknown PID parameter: {name}')
+            params[name] = self.calibration[pid_id].to_digital(value) if name == 'setpoint' else value
+        transactions = self.apply_params({pid_id: params})
+        values = {}
+        for name in params:
+            value = self._get_param(pid_id, name)
+            if name == 'setpoint':
+                value = self.calibration[pid_id].to_physical(float(value))
+            values[name] = value if isinstance(value, str) else float(value)
+        return {'values': values, 'transactions': transactions}
+
+    @_exclusive
     def reset_pid(self):
         try:
             if self.setpoint_source == 'digital_setpoint_in2':
                 self._set_param('in2', 'p', 0.0)
                 self._set_param('in2', 'i', 0.0)
                 self._set_param('in2', 'ival', 0.0)
-                self._set_param('in2', 'setpoint', self.phy2dig_setpoint_in2(0.0))
+                self._set_param('in2', 'setpoint', self.calibration['in2'].to_digital(0.0))
                 self.set_setpoint_array(np.zeros(16))
-                return f"PID reset: p={self.pids['in2'].p}, i={self.pids['in2'].i}, ival={self.pids['in2'].ival}, setpoint={self.pids['in2'].setpoint}"
+                return f"PID reset: p={self._get_param('in2', 'p')}, i={self._get_param('in2', 'i')}, ival={self._get_param('in2', 'ival')}, setpoint={self._get_param('in2', 'setpoint')}"
             else:
                 self._set_param('in1', 'i', 0.0)
                 self._set_param('in1', 'p', 0.0)
                 self._set_param('in1', 'ival', 0.0)
-                self._set_param('in1', 'setpoint', self.phy2dig_setpoint_in1(0.0))
+                self._set_param('in1', 'setpoint', self.calibration['in1'].to_digital(0.0))
                 self.set_setpoint_array(np.zeros(16))
-                return f"PID reset: p={self.pids['in1'].p}, i={self.pids['in1'].i}, ival={self.pids['in1'].ival}, setpoint={self.pids['in1'].setpoint}"
+                return f"PID reset: p={self._get_param('in1', 'p')}, i={self._get_param('in1', 'i')}, ival={self._get_param('in1', 'ival')}, setpoint={self._get_param('in1', 'setpoint')}"
         except Exception as e:
-            print(f"[WORKER] reset_pid error: {e}")
+            self.log.error('reset_pid error: %s', e)
             return f"Reset failed: {e}"
 
     # ---------- Methods callable from the Tab ----------
-    def write_to_config(self):
+    def _update_config_file(self, sections):
+        """Replace top-level sections of the pyrpl config file on disk.
+
+        The file is re-parsed only if something else wrote it since our last
+        write, and is replaced atomically, so a crash never leaves it half
+        written. This is the only write: pyrpl's tree is updated without
+        triggering its own (non-atomic) save.
+        """
         import yaml
-        import shutil
         path = self.p.c._filename
-        with open(path, 'r', encoding='utf-8') as f:
-            config = yaml.safe_load(f)
-        config['blacs'] = {
+        with self._config_lock:
+            mtime = os.stat(path).st_mtime_ns if os.path.exists(path) else None
+            if self._config_doc is None or mtime != self._config_mtime:
+                if mtime is None:
+                    self._config_doc = {}
+                else:
+                    with open(path, 'r', encoding='utf-8') as f:
+                        self._config_doc = yaml.safe_load(f) or {}
+            self._config_doc.update(sections)
+            directory, name = os.path.split(os.path.abspath(path))
+            fd, tmp = tempfile.mkstemp(prefix=f'.{name}.', suffix='.tmp', dir=directory)
+            try:
+                with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                    yaml.dump(self._config_doc, f, allow_unicode=True)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp, path)
+            except BaseException:
+                if os.path.exists(tmp):
+                    os.unlink(tmp)
+                # Re-read next time, the cached document may hold sections that were never saved
+                self._config_doc = None
+                raise
+            self._config_mtime = os.stat(path).st_mtime_ns
+        # Keep pyrpl's in-memory tree in sync, or its next autosave drops these sections. Assigning
+        # through the tree would make it save the whole file again, in place; write its dict instead
+        data = getattr(self.p.c, '_data', None)
+        if data is None:
+            self.log.warning('Cannot update the in-memory pyrpl config, sections %s are only on disk', list(sections))
+        else:
+            data.update(sections)
+        return path
+
+    def _config_state(self):
+        """The 'blacs' config section built from the shadow and self.current.
+
+        Only parameters neither cache holds are read from the hardware, in one
+        block read per PID. The setpoint table is saved in register units.
+        """
+        blacs_cfg = {
             'set_analog_enabled': bool(self.set_analog_enabled),
             'set_in1_enabled': bool(self.set_in1_enabled),
             'set_in2_enabled': bool(self.set_in2_enabled),
-            'in1_p': float(self.pids['in1'].p),
-            'in2_p': float(self.pids['in2'].p),
-            'in1_i': float(self.pids['in1'].i),
-            'in2_i': float(self.pids['in2'].i),
-            'in1_ival': float(self.pids['in1'].ival),
-            'in2_ival': float(self.pids['in2'].ival),
-            'in1_differential_mode': bool(self.pids['in1'].differential_mode_enabled),
-            'in2_differential_mode': bool(self.pids['in2'].differential_mode_enabled),
-            'in1_input': str(self.pids['in1'].input),
-            'in2_input': str(self.pids['in2'].input),
-            'in1_output_direct': str(self.pids['in1'].output_direct),
-            'in2_output_direct': str(self.pids['in2'].output_direct),
-            'in1_max_voltage': float(self.pids['in1'].max_voltage),
-            'in2_max_voltage': float(self.pids['in2'].max_voltage),
-            'in1_min_voltage': float(self.pids['in1'].min_voltage),
-            'in2_min_voltage': float(self.pids['in2'].min_voltage),
-            'in1_pause_gains': str(self.pids['in1'].pause_gains),
-            'in2_pause_gains': str(self.pids['in2'].pause_gains),
-            'in1_setpoint': float(self.pids['in1'].setpoint),
-            'in2_setpoint': float(self.pids['in2'].setpoint),
-            'in1_use_setpoint_sequence': bool(self.pids['in1'].use_setpoint_sequence),
-            'in2_use_setpoint_sequence': bool(self.pids['in2'].use_setpoint_sequence),
-            'in1_setpoint_index': int(self.pids['in1'].setpoint_index),
-            'in2_setpoint_index': int(self.pids['in2'].setpoint_index),
-            'in1_digital_setpoint_array': self.current.get('in1', {}).get('digital_setpoint_array', []),
-            'in2_digital_setpoint_array': self.current.get('in2', {}).get('digital_setpoint_array', [])
         }
-        print(config)
-        with open(path, 'w', encoding='utf-8') as f:
-            yaml.dump(config, f, allow_unicode=True)
-            
+        for pid_id in self.pids:
+            shadow = self.shadow[pid_id]
+            current = self.current.get(pid_id, {})
+            values = {}
+            for name in CONFIG_KEYS:
+                if name == 'setpoint_array':
+                    continue
+                if name in shadow.VOLATILE:
+                    # Last value written or read; the FPGA may have moved on since
+                    if name in current:
+                        values[name] = current[name]
+                elif name in shadow.values:
+                    values[name] = shadow.values[name]
+            missing = [name for name in CONFIG_KEYS if name != 'setpoint_array' and name not in values]
+            if missing:
+                values.update(read_params(self._get_pid(pid_id), missing, shadow))
+            for name, key in CONFIG_KEYS.items():
+                if name == 'setpoint_array':
+                    array = current.get('digital_setpoint_array') or []
+                    value = self.calibration[pid_id].to_digital(
+                        np.asarray(array[:SEQUENCE_LENGTH], dtype=float)).tolist() if len(array) else []
+                else:
+                    value = (PARAM_TYPES[name] or str)(values[name])
+                blacs_cfg[f'{pid_id}_{key}'] = value
+        return blacs_cfg
+
+    def _save_blacs_config(self, blacs_cfg):
+        """Write the 'blacs' section unless it equals what was saved last; returns the path or None."""
+        if blacs_cfg == self._saved_blacs_cfg:
+            return None
+        path = self._update_config_file({'blacs': blacs_cfg})
+        self._saved_blacs_cfg = blacs_cfg
+        return path
+
+    @_exclusive
+    def write_to_config(self):
+        """Save the current PID settings to the pyrpl config; returns the path, or None if unchanged."""
+        self._cancel_autosave()
+        path = self._save_blacs_config(self._config_state())
+        if path:
+            self.log.info('Config written to %s', path)
+        else:
+            self.log.info('Config unchanged, not written')
+        return path
+
+    # ---------- Background config autosave ----------
+    def set_config_autosave(self, delay=CONFIG_AUTOSAVE_DELAY):
+        """Save the config `delay` seconds after a parameter change (0 or None disables)."""
+        self._autosave_delay = float(delay or 0)
+        if not self._autosave_delay:
+            self._cancel_autosave()
+        return self._autosave_delay
 
+    def _mark_config_dirty(self):
+        # The first change arms the timer; later ones ride along with it
+        if not self._autosave_delay or self._autosave_timer is not None:
+            return
+        self._autosave_timer = threading.Timer(self._autosave_delay, self._autosave)
+        self._autosave_timer.daemon = True
+        self._autosave_timer.start()
+
+    def _cancel_autosave(self):
+        timer, self._autosave_timer = self._autosave_timer, None
+        if timer is not None:
+            timer.cancel()
+
+    def _autosave(self):
+        try:
+            with self._hw_lock:
+                self._autosave_timer = None
+                self._save_blacs_config(self._config_state())
+        except Exception as e:
+            self.log.error('Config autosave failed: %s', e)
+
+    @_exclusive
     def check_hardware_status(self):
         """Check detailed hardware status for debugging"""
-        self._read_current_state()
-        import time
-        current_time = time.strftime("%H:%M:%S")
-        print(f"[WORKER] {current_time}: Checking hardware status...")
+        snapshot = self._read_current_state()
+        if snapshot is None:
+            return {'error': 'Failed to read PID state'}
         
         # Initialize status dictionary first
         status = {}
         
         if self.setpoint_source == 'digital_setpoint_in2':
-            pid = self._get_pid('in2')
-            status['digital_setpoint_array'] = self.current['in2']['digital_setpoint_array']
-            status['setpoint_in_sequence'] = self.dig2phy_setpoint_in2(float(pid.setpoint_in_sequence))
-            print(pid.setpoint_in_sequence)
-        elif self.setpoint_source == 'digital_setpoint_in1':
-            pid = self._get_pid('in1')
-            status['digital_setpoint_array'] = self.current['in1']['digital_setpoint_array']
-            status['setpoint_in_sequence'] = self.dig2phy_setpoint_in1(float(pid.setpoint_in_sequence))
-            print(pid.setpoint_in_sequence)
-        elif self.setpoint_source == 'analog_setpoint':
-            pid = self._get_pid('in1')
+            pid_id = 'in2'
+        else:
+            pid_id = 'in1'
+        state = snapshot[pid_id]
+        current = self.current[pid_id]
+        if self.setpoint_source != 'analog_setpoint':
+            status['digital_setpoint_array'] = current['digital_setpoint_array']
+            status['setpoint_in_sequence'] = current['setpoint_in_sequence']
         try:
             status['setpoint_source'] = self.setpoint_source
-            # Current parameter values - check which attributes exist
-            status['p'] = float(pid.p)
-            status['i'] = float(pid.i)
-            if self.setpoint_source == 'digital_setpoint_in2':
-                status['setpoint'] = self.dig2phy_setpoint_in2(pid.setpoint)
-            else:
-                status['setpoint'] = self.dig2phy_setpoint_in1(pid.setpoint)
-            status['ival'] = float(pid.ival)
+            # Current parameter values
+            status['p'] = state.p
+            status['i'] = state.i
+            status['setpoint'] = current['setpoint']
+            status['ival'] = state.ival
             
             # Control settings
-            status['input'] = str(pid.input)
-            status['output_direct'] = str(pid.output_direct)
-            status['pause_gains'] = str(pid.pause_gains)  # Keep as string, don't convert to int
-            
-            # Check paused status - use the actual paused attribute if available
-            status['paused'] = bool(pid.paused)
+            status['input'] = state.input
+            status['output_direct'] = state.output_direct
+            status['pause_gains'] = state.pause_gains  # Keep as string, don't convert to int
+            status['paused'] = state.paused
             
             # Voltage limits
-            status['min_voltage'] = float(pid.min_voltage)+OUT_ZERO
-            status['max_voltage'] = float(pid.max_voltage)+OUT_ZERO
-
-            status['differential_mode_enabled'] = bool(pid.differential_mode_enabled)
+            status['min_voltage'] = current['min_voltage']
+            status['max_voltage'] = current['max_voltage']
 
-            status['setpoint_source'] = self.setpoint_source
+            status['differential_mode_enabled'] = state.differential_mode_enabled
 
-            status['use_setpoint_sequence'] = bool(pid.use_setpoint_sequence)
-            status['setpoint_index'] = int(pid.setpoint_index)
-            status['sequence_wrap_flag'] = bool(pid.sequence_wrap_flag)
+            status['use_setpoint_sequence'] = state.use_setpoint_sequence
+            status['setpoint_index'] = state.setpoint_index
+            status['sequence_wrap_flag'] = state.sequence_wrap_flag
+            status['output_calibration'] = self.calibration['out'].as_dict()
 
-            print(f"[WORKER] Hardware status check completed")
-            print(status)
+            self.log.debug('Hardware status: %s', status)
             return status
-            
+
         except Exception as e:
-            print(f"[WORKER] Hardware status check failed: {e}")
+            self.log.error('Hardware status check failed: %s', e)
             return {'error': str(e)}
 
+    @_exclusive
+    def refresh_view(self):
+        """Everything the tab displays, as one view model.
+
+        Holds the check_hardware_status() fields plus the combo options for
+        the active PID. 'version' goes up whenever the content differs from
+        the previous view, so the tab can skip unchanged refreshes. Fields
+        the FPGA updates on its own (RegisterShadow.VOLATILE, e.g. ival) move
+        on nearly every poll and are left out of that comparison.
+        """
+        view = self.check_hardware_status()
+        if 'error' in view:
+            return view
+        pid_id = self._active_pid_id()
+        view['input_options'] = [pid_id]
+        view['output_options'] = ['out2' if pid_id == 'in2' else 'out1', 'off']
+        static = {name: value for name, value in view.items() if name not in RegisterShadow.VOLATILE}
+        if static != self._view:
+            self._view = static
+            self._view_version += 1
+        return dict(view, version=self._view_version)
+
+    def _sample(self):
+        """Take one (time, error, ival, input, setpoint_in_sequence, setpoint_index) sample of the active PID.
+
+        error is input reading minus setpoint register in pyrpl's digital
+        units, the PID's own error signal (not volts, see calibration.py).
+        Static parameters come from the shadow cache; the volatile ones are
+        read with a single block read. Callers must hold the hardware lock.
+        """
+        scope = self.p.rp.scope
+        now = time.time()
+        if self.setpoint_source == 'analog_setpoint':
+            val_in = scope.voltage_in1
+            val_sp = scope.voltage_in2
+            ival = self._get_param('in1', 'ival')
+            return (now, val_in - val_sp, ival, val_in, float('nan'), float('nan'))
+        pid_id = self._active_pid_id()
+        val_in = getattr(scope, f'voltage_{pid_id}')
+        volatile = read_params(self._get_pid(pid_id), ['ival', 'setpoint_index', 'setpoint_in_sequence'])
+        if self._get_param(pid_id, 'use_setpoint_sequence'):
+            setpoint = volatile['setpoint_in_sequence']
+        else:
+            setpoint = self._get_param(pid_id, 'setpoint')
+        return (now, val_in - setpoint, volatile['ival'], val_in, volatile['setpoint_in_sequence'],
+                volatile['setpoint_index'])
+
+    def _health_inputs(self):
+        """(paused, min_voltage, max_voltage) of the active PID from the shadow, for the lock monitor."""
+        pid_id = self._active_pid_id()
+        return (self._get_param(pid_id, 'paused'), self._get_param(pid_id, 'min_voltage'),
+                self._get_param(pid_id, 'max_voltage'))
+
+    @_exclusive
     def get_error_point(self):
         """Return a single (time, error, ival) point for a specific PID."""
-        import time
         import traceback
-        if self.setpoint_source == 'digital_setpoint_in2':
-            pid = self._get_pid('in2')
-        else:
-            pid = self._get_pid('in1')
         try:
-            now = time.time()
-            if self.setpoint_source == 'digital_setpoint_in1':
-                val_in = self.p.rp.scope.voltage_in1
-                if pid.use_setpoint_sequence:
-                    error = val_in - pid.setpoint_in_sequence
-                else:
-                    error = val_in - pid.setpoint
-            elif self.setpoint_source == 'digital_setpoint_in2':
-                val_in = self.p.rp.scope.voltage_in2
-                if pid.use_setpoint_sequence:
-                    error = val_in - pid.setpoint_in_sequence
-                else:
-                    error = val_in - pid.setpoint
-            else:  # analog_setpoint
-                val_in = self.p.rp.scope.voltage_in1
-                val_sp = self.p.rp.scope.voltage_in2
-                error = val_in - val_sp
-            print(pid.ival)
-            print(f"[DEBUG] get_error_point: time={now}, error={error}, ival={pid.ival}")
-
-            return {'time': now, 'error': error, 'ival': pid.ival}
+            now, error, ival = self._sample()[:3]
+            self.log.debug('get_error_point: time=%s, error=%s, ival=%s', now, error, ival)
+            return {'time': now, 'error': error, 'ival': ival}
         except Exception as e:
             error_msg = f"Error in get_error_point: {str(e)}\n{traceback.format_exc()}"
-            print(f"[ERROR] {error_msg}")
+            self.log.error('%s', error_msg)
             return {'ERROR': error_msg}
+
+    # ---------- Scope trace capture ----------
+    def _acquire_scope(self, input1, input2, decimation, action=None, trigger_source='immediately'):
+        """Acquire one full scope trace of input1/input2; returns (times, ch1, ch2).
+
+        `action`, if given, is called right after the scope is armed (used to
+        apply a stimulus inside the acquisition window). Callers must hold the
+        hardware lock. Uses pyrpl's low-level scope acquisition calls so that
+        no Qt event loop is needed in the worker process.
+        """
+        scope = self.p.rp.scope
+        if decimation not in scope.decimations:
+            raise ValueError(f"Invalid decimation {decimation}, must be one of {list(scope.decimations)}")
+        scope.input1 = input1
+        scope.input2 = input2
+        scope.decimation = decimation
+        scope.average = True  # average within each decimation bin instead of aliasing
+        scope.trigger_source = trigger_source
+        scope._start_acquisition()
+        if action is not None:
+            action()
+        deadline = time.time() + scope.duration + SCOPE_TIMEOUT
+        while not scope._data_ready():
+            if time.time() > deadline:
+                raise TimeoutError(f"Scope acquisition timed out (trigger_source={trigger_source})")
+            time.sleep(0.001)
+        ch1, ch2 = np.asarray(scope._get_curve())
+        return np.asarray(scope.times), ch1, ch2
+
+    @staticmethod
+    def _summarize(values, points):
+        """Block-average `values` down to `points` samples; also return the per-block min/max envelope."""
+        block = max(1, len(values) // points)
+        n = (len(values) // block) * block
+        blocks = values[:n].reshape(-1, block)
+        return blocks.mean(axis=1), blocks.min(axis=1), blocks.max(axis=1)
+
+    @_exclusive
+    def capture_error_trace(self, signal=None, decimation=64, points=SCOPE_POINTS):
+        """Capture a full scope trace of the active PID's error.
+
+        Channel 1 records the PID input; channel 2 records `signal` ('in1',
+        'in2' or 'pid_out'; default 'in2' in analog mode, where it is the
+        setpoint, otherwise 'pid_out'). The error vector is computed against
+        the analog setpoint trace, the current sequence setpoint or the static
+        setpoint. Returns block-averaged arrays of `points` samples plus the
+        min, max, mean and RMS of the full-resolution error.
+        """
+        pid_id = self._active_pid_id()
+        pid = self._get_pid(pid_id)
+        analog = self.setpoint_source == 'analog_setpoint'
+        if signal is None:
+            signal = 'in2' if analog else 'pid_out'
+        scope_signal = pid.name if signal == 'pid_out' else signal
+        if analog:
+            setpoint = None
+        elif self._get_param(pid_id, 'use_setpoint_sequence'):
+            setpoint = read_params(pid, ['setpoint_in_sequence'])['setpoint_in_sequence']
+        else:
+            setpoint = self._get_param(pid_id, 'setpoint')
+
+        times, ch1, ch2 = self._acquire_scope(pid_id if not analog else 'in1', scope_signal, decimation)
+        if analog:
+            if signal != 'in2':
+                raise ValueError("In analog_setpoint mode the error needs in2 on channel 2")
+            error = ch1 - ch2
+        else:
+            error = ch1 - setpoint
+
+        error_mean, error_low, error_high = self._summarize(error, points)
+        signal_mean, signal_low, signal_high = self._summarize(ch2, points)
+        return {
+            'time': self._summarize(times, points)[0],
+            'error': error_mean,
+            'error_envelope': np.vstack((error_low, error_high)),
+            'signal': signal_mean,
+            'signal_envelope': np.vstack((signal_low, signal_high)),
+            'signal_name': signal,
+            'error_min': float(error.min()),
+            'error_max': float(error.max()),
+            'error_mean': float(error.mean()),
+            'error_rms': float(np.sqrt(np.mean(error ** 2))),
+            'setpoint': setpoint,
+            'decimation': decimation,
+            'sampling_time': float(times[1] - times[0]) if len(times) > 1 else 0.0,
+            'n_samples': len(error),
+        }
+
+    # ---------- Automated calibration ----------
+    def _average_inputs(self, decimation, traces):
+        """Average both inputs over `traces` full scope traces.
+
+        Returns {'in1': (mean, std), 'in2': (mean, std)} in digital units.
+        Callers must hold the hardware lock.
+        """
+        data = np.array([self._acquire_scope('in1', 'in2', decimation)[1:] for _ in range(traces)])
+        mean = data.mean(axis=(0, 2))
+        std = data.std(axis=(0, 2))
+        return {'in1': (float(mean[0]), float(std[0])), 'in2': (float(mean[1]), float(std[1]))}
+
+    @staticmethod
+    def _fit_line(x, y):
+        """Least-squares fit y = slope * x + offset; returns (slope, offset, residuals)."""
+        x = np.asarray(x, dtype=float)
+        y = np.asarray(y, dtype=float)
+        design = np.column_stack((x, np.ones_like(x)))
+        (slope, offset), *_ = np.linalg.lstsq(design, y, rcond=None)
+        return float(slope), float(offset), y - design @ (slope, offset)
+
+    def _calibration_path(self):
+        """The device's calibration file, shared with the labscript device (see calibration.calibration_path())."""
+        return calibration_path(getattr(self, 'device_name', 'red_pitaya_pyrpl_pid'),
+                                getattr(self, 'calibration_file', None))
+
+    def _load_calibration(self):
+        """Load the calibration file; the file is the only source, so that compiled shots match it.
+
+        A missing file is created from the 'blacs_calibration' pyrpl config
+        section older versions saved, if there is one; otherwise the built-in
+        defaults are used (and the compiler uses them too).
+        """
+        path = self._calibration_path()
+        if not os.path.exists(path):
+            legacy = self._config_section(CALIBRATION_SECTION)
+            if legacy:
+                save_calibrations(calibrations_from_dict(legacy), path)
+                self.log.info('Moved the calibration from the pyrpl config to %s', path)
+        self.log.info('Using the calibration in %s', path if os.path.exists(path) else 'the built-in defaults')
+        return load_calibrations(path, getattr(self, 'input_range', None))
+
+    def _save_calibration(self):
+        """Persist self.calibration to the device's calibration file; returns its path."""
+        path = self._calibration_path()
+        save_calibrations(self.calibration, path)
+        self.log.info('Calibration saved to %s', path)
+        return path
+
+    @_exclusive
+    def measure_calibration_point(self, reference, channel='both',
+                                  decimation=CALIBRATION_DECIMATION, traces=CALIBRATION_TRACES):
+        """Record the reading of `channel` ('in1', 'in2' or 'both') with `reference` volts applied.
+
+        The reading is the mean over `traces` full scope traces; the points
+        collected are fitted by fit_input_calibration().
+        """
+        channels = ('in1', 'in2') if channel == 'both' else (channel,)
+        readings = self._average_inputs(decimation, traces)
+        result = {}
+        for ch in channels:
+            mean, std = readings[ch]
+            self._calibration_points[ch].append((float(reference), mean))
+            result[ch] = {'digital': mean, 'noise': std, 'points': len(self._calibration_points[ch])}
+        self.log.info('Calibration point at %s V: %s', reference, result)
+        return result
+
+    def clear_calibration_points(self, channel='both'):
+        """Discard the points recorded by measure_calibration_point()."""
+        for ch in (('in1', 'in2') if channel == 'both' else (channel,)):
+            self._calibration_points[ch] = []
+        return True
+
+    @_exclusive
+    def fit_input_calibration(self, channel='both', save=True):
+        """Fit digital = slope * volts + offset to the recorded points of each channel.
+
+        The fitted line replaces the channel's calibration (in its current
+        input range), the static setpoints and setpoint arrays are rewritten
+        so that they keep their physical value, and with `save` the result is
+        persisted. Returns slope, offset and the residuals in volts per channel.
+        """
+        channels = ('in1', 'in2') if channel == 'both' else (channel,)
+        old = dict(self.calibration)
+        new = dict(self.calibration)
+        results = {}
+        for ch in channels:
+            points = np.asarray(self._calibration_points[ch], dtype=float).reshape(-1, 2)
+            if len(points) < 2:
+                raise ValueError(f"{ch}: need at least two reference points, have {len(points)}")
+            slope, offset, residuals = self._fit_line(points[:, 0], points[:, 1])
+            new[ch] = ChannelCalibration([(0.0, offset), (0.5, offset + 0.5 * slope)], old[ch].input_range)
+            residuals_v = residuals / slope
+            results[ch] = {
+                'slope': slope,
+                'offset': offset,
+                'residuals': residuals_v.tolist(),
+                'rms_residual': float(np.sqrt(np.mean(residuals_v ** 2))),
+                'max_residual': float(np.abs(residuals_v).max()),
+            }
+        with self.batch():
+            for ch in channels:
+                physical = old[ch].to_physical(self._get_param(ch, 'setpoint'))
+                self._set_param(ch, 'setpoint', new[ch].to_digital(physical))
+                array = self.current.get(ch, {}).get('digital_setpoint_array')
+                if array:
+                    self._set_param(ch, 'setpoint_array', new[ch].to_digital(np.asarray(array)))
+        self.calibration = new
+        if save:
+            results['saved_to'] = self._save_calibration()
+        self._read_current_state()
+        self.log.info('Input calibration fitted: %s', results)
+        return results
+
+    @_exclusive
+    def calibrate_output(self, output='out1', input_channel=None, levels=LOOPBACK_LEVELS,
+                         decimation=CALIBRATION_DECIMATION, traces=CALIBRATION_TRACES, settle=0.05, save=True):
+        """DAC-to-ADC loopback calibration of the output offset and gain.
+
+        Needs `output` cabled to `input_channel` (default: the input with the same
+        number). A paused PID holds the output at each digital level in
+        `levels` through its integrator, the input is read back in volts
+        through its own calibration, and volts = slope * digital + zero is
+        fitted to the readings inside the input range. Every PID parameter
+        touched is restored afterwards.
+        """
+        if output not in ('out1', 'out2'):
+            raise ValueError(f"Invalid output {output}, must be 'out1' or 'out2'")
+        input_channel = input_channel or output.replace('out', 'in')
+        drive_id = output.replace('out', 'in')  # pid1 ('in1') drives out1, pid0 ('in2') out2
+        levels = np.asarray(levels, dtype=float)
+        touched = ('output_direct', 'p', 'pause_gains', 'paused', 'max_voltage', 'min_voltage', 'ival')
+        snapshot = self._snapshot()
+        # Nothing else may add to the output while it is measured
+        others = [pid_id for pid_id, state in snapshot.items()
+                  if pid_id != drive_id and state.output_direct == output]
+        saved = {pid_id: {name: getattr(snapshot[pid_id], name) for name in touched}
+                 for pid_id in [drive_id] + others}
+        readings = []
+        try:
+            self.apply_params({
+                drive_id: {'output_direct': output, 'p': 0.0, 'pause_gains': 'pi', 'paused': True,
+                           'max_voltage': 0.99, 'min_voltage': -0.99},
+                **{pid_id: {'output_direct': 'off'} for pid_id in others},
+            })
+            for level in levels:
+                self._set_param(drive_id, 'ival', level)
+                time.sleep(settle)
+                readings.append(self._average_inputs(decimation, traces)[input_channel][0])
+        finally:
+            self.apply_params(saved)
+        readings = np.asarray(readings)
+        usable = np.abs(readings) < INPUT_SATURATION
+        if usable.sum() < 2:
+            raise ValueError(f"Only {usable.sum()} loopback levels inside the {input_channel} range; is {output} cabled to {input_channel}?")
+        volts = self.calibration[input_channel].to_physical(readings[usable])
+        slope, zero, residuals = self._fit_line(levels[usable], volts)
+        self.calibration['out'] = OutputCalibration(zero, slope)
+        results = {
+            'zero': zero,
+            'slope': slope,
+            'levels': levels[usable].tolist(),
+            'residuals': residuals.tolist(),
+            'rms_residual': float(np.sqrt(np.mean(residuals ** 2))),
+            'max_residual': float(np.abs(residuals).max()),
+            'saturated': int((~usable).sum()),
+        }
+        if save:
+            results['saved_to'] = self._save_calibration()
+        self._read_current_state()
+        self.log.info('Output calibration fitted: %s', results)
+        return results
+
+    # ---------- Step-response autotuning ----------
+    @_exclusive
+    def autotune(self, step=AUTOTUNE_STEP, bandwidth=None, phase_margin=None, decimation=None, settle=None):
+        """Measure the active PID's plant with an open-loop output step and propose P and I.
+
+        The PID is paused with its integrator holding the output, and its ival
+        is stepped by `step` right after the scope is armed. Channel 1 records
+        the PID input, channel 2 the PID output to time the step. An FOPDT
+        model (gain, time constant, delay) is fitted to the response; starting
+        at `decimation` (default: the shortest trace) the trace is lengthened
+        until the fitted response settles inside it. Every PID parameter
+        touched is restored afterwards, nothing is applied: see
+        apply_autotune(). Gains are proposed for `bandwidth` (Hz) or
+        `phase_margin` (degrees, default autotune.PHASE_MARGIN) within the
+        P and extended I ranges of the bitstream.
+        """
+        if self.in_shot:
+            raise RuntimeError('Cannot autotune while a buffered shot is running')
+        pid_id = self._active_pid_id()
+        pid = self._get_pid(pid_id)
+        scope = self.p.rp.scope
+        step = float(step)
+        if self._get_param(pid_id, 'output_direct') == 'off':
+            raise ValueError(f"{pid.name} output is off; route it to the output driving {pid_id} first")
+        touched = ('p', 'pause_gains', 'paused', 'ival')
+        saved = {name: self._get_param(pid_id, name) for name in touched}
+        low = max(self._get_param(pid_id, 'min_voltage'), -1.0)
+        high = min(self._get_param(pid_id, 'max_voltage'), 1.0)
+        if abs(step) >= high - low:
+            raise ValueError(f"Step {step} does not fit between the output limits {low} and {high}")
+        # Start from the current output, moved inside the limits far enough for the step
+        base = min(max(saved['ival'], low - min(step, 0.0)), high - max(step, 0.0))
+        decimations = sorted(d for d in scope.decimations if decimation is None or d >= decimation)
+        if not decimations:
+            raise ValueError(f"Invalid decimation {decimation}, must be at most {max(scope.decimations)}")
+        try:
+            self.apply_params({pid_id: {'p': 0.0, 'pause_gains': 'pi', 'paused': True}})
+            for dec in decimations:
+                self._set_param(pid_id, 'ival', base)
+                scope.decimation = dec
+                time.sleep(scope.duration if settle is None else settle)
+                times, response, output = self._acquire_scope(
+                    pid_id, pid.name, dec, action=lambda: self._set_param(pid_id, 'ival', base + step))
+                moved = np.abs(output - output[0]) > abs(step) / 2
+                start = times[np.argmax(moved)] if moved.any() else times[0]
+                model = autotune.fit_fopdt(times - start, response, step)
+                # A trace too short to see the response at all fits noise, which may look settled
+                amplitude = abs(model['gain'] * step)
+                responded = amplitude >= max(AUTOTUNE_MIN_RESPONSE, AUTOTUNE_MIN_SNR * model['rms_residual'])
+                settled = model['delay'] + 5 * model['tau'] <= AUTOTUNE_SETTLED * (times[-1] - start)
+                if responded and settled:
+                    break
+        finally:
+            self.apply_params({pid_id: saved})
+        if not responded:
+            raise ValueError(f"No response on {pid_id} to a {step} output step; is {pid.name}'s output driving it?")
+        if not settled:
+            self.log.warning('Autotune: response of %s not settled within the longest trace', pid_id)
+        ku, pu = autotune.ultimate_gain(model)
+        result = {
+            'pid': pid_id,
+            'gain': model['gain'],
+            'tau': model['tau'],
+            'delay': model['delay'],
+            'rms_residual': model['rms_residual'],
+            'settled': bool(settled),
+            'decimation': dec,
+            'ultimate_gain': ku,
+            'ultimate_period': pu,
+            'proposal': autotune.propose_pi(model, bandwidth, phase_margin),
+            'current': {'p': float(saved['p']), 'i': float(self._get_param(pid_id, 'i'))},
+            'time': model['time'],
+            'response': model['response'],
+            'fit': model['fit'],
+        }
+        self._autotune = result
+        self.log.info('Autotune %s: K=%.4g, tau=%.4g s, delay=%.4g s, Ku=%.4g, proposal %s', pid_id,
+                      model['gain'], model['tau'], model['delay'], ku, result['proposal'])
+        return result
+
+    def apply_autotune(self, p=None, i=None):
+        """Write P and I of the last autotune() proposal (or the given values) as one batch.
+
+        The gains go to the PID the tuning was measured on, which must still
+        be the active one. Returns what apply_edits() returns.
+        """
+        if p is None or i is None:
+            if self._autotune is None:
+                raise RuntimeError('No autotune result to apply, run autotune() first')
+            proposal = self._autotune['proposal']
+            p = proposal['p'] if p is None else p
+            i = proposal['i'] if i is None else i
+        if self._autotune is not None and self._autotune['pid'] != self._active_pid_id():
+            raise RuntimeError(f"Autotune measured {self._autotune['pid']}, but {self._active_pid_id()} is active now")
+        result = self.apply_edits({'p': p, 'i': i})
+        self.log.info('Autotune gains applied: %s', result['values'])
+        return result
+
+    # ---------- Latency instrumentation ----------
+    # Not timed themselves, so that polling the stats doesn't show up in them
+    _PERF_EXCLUDED = frozenset(['init', 'set_perf_enabled', 'get_perf_stats', 'reset_perf_stats', 'export_perf_stats'])
+
+    def set_perf_enabled(self, enabled=True):
+        """Start or stop timing public worker methods and pyrpl register reads/writes.
+
+        The wrappers are installed on first use and stay in place; while
+        disabled they only add a flag check per call.
+        """
+        if enabled:
+            names = [name for name, attr in vars(type(self)).items()
+                     if callable(attr) and not name.startswith('_') and name not in self._PERF_EXCLUDED]
+            instrument_methods(self, self.perf, names)
+            instrument_client(self.p.rp.client, self.perf)
+        self.perf.enabled = bool(enabled)
+        return self.perf.enabled
+
+    def get_perf_stats(self):
+        """Return {'enabled': bool, 'stats': {key: {count, bytes, total, mean, p50, p95, p99, max, window}}}.
+
+        Keys are 'method.<name>' for worker calls and 'hw.read'/'hw.write' for
+        register accesses; durations are in seconds over the last perf.WINDOW calls.
+        """
+        return {'enabled': self.perf.enabled, 'stats': self.perf.stats()}
+
+    def reset_perf_stats(self):
+        self.perf.reset()
+        return True
+
+    def export_perf_stats(self, path):
+        """Write the current stats and histograms to a JSON file; returns the path."""
+        return self.perf.export(path)
+
+    # ---------- Logging ----------
+    def set_log_level(self, level):
+        """Set the level of the device logger ('DEBUG', 'INFO', ... or a number); returns its name."""
+        self.log.setLevel(parse_level(level))
+        return logging.getLevelName(self.log.level)
+
+    def get_recent_log(self, last=None, level='DEBUG'):
+        """Return the most recent log events, oldest first, as [{'time', 'level', 'message'}].
+
+        The events are kept in memory (event_log.RECENT_CAPACITY of them) for
+        post-mortem analysis; only records at or above the logger's level
+        are kept.
+        """
+        return {
+            'level': logging.getLevelName(self.log.level),
+            'total': self._recent_log.total,
+            'events': self._recent_log.recent(last, level),
+        }
+
+    def clear_recent_log(self):
+        self._recent_log.clear()
+        return True
+
+    # ---------- Background telemetry sampler ----------
+    def start_sampler(self, rate=SAMPLER_RATE, client='plot'):
+        """Start (or retune) the background sampler thread at `rate` samples per second.
+
+        The rolling plot and the lock monitor share the thread; it runs at the
+        highest rate any client asked for until the last one stops it.
+        """
+        new_client = client not in self._sampler_clients
+        self._sampler_clients[client] = float(rate)
+        self._sampler_rate = max(self._sampler_clients.values())
+        if self._sampler_thread is not None and self._sampler_thread.is_alive():
+            if new_client:
+                # A new client only sees samples from now on
+                with self._samples_lock:
+                    self._samples_cursor = self._samples.total
+            return self._sampler_rate
+        with self._samples_lock:
+            self._samples.clear()
+            self._samples_cursor = 0
+        self._sampler_error = None
+        self._sampler_stop.clear()
+        self._sampler_thread = threading.Thread(target=self._sampler_loop, name='rp_pid_sampler', daemon=True)
+        self._sampler_thread.start()
+        self.log.info('Sampler started at %s Hz', self._sampler_rate)
+        return self._sampler_rate
+
+    def stop_sampler(self, client='plot'):
+        """Release the sampler for `client` (all clients if None); the thread stops when none is left."""
+        if client is None:
+            self._sampler_clients.clear()
+        else:
+            self._sampler_clients.pop(client, None)
+        if self._sampler_clients:
+            self._sampler_rate = max(self._sampler_clients.values())
+            return True
+        self._sampler_stop.set()
+        if self._sampler_thread is not None:
+            self._sampler_thread.join(timeout=2.0)
+            self._sampler_thread = None
+        return True
+
+    def _sampler_loop(self):
+        next_t = time.perf_counter()
+        while not self._sampler_stop.is_set():
+            try:
+                health = None
+                with self._hw_lock:
+                    sample = self._sample()
+                    if self.lock_health.enabled:
+                        health = self._health_inputs()
+                with self._samples_lock:
+                    self._samples.append(sample)
+                if health is not None:
+                    self.lock_health.update(sample, *health)
+            except Exception as e:
+                self._sampler_error = str(e)
+            next_t += 1.0 / self._sampler_rate
+            delay = next_t - time.perf_counter()
+            if delay < 0:
+                # Fell behind (slow link or long command): don't try to catch up
+                next_t = time.perf_counter()
+                delay = 0
+            self._sampler_stop.wait(delay)
+
+    def get_error_batch(self, since=None):
+        """Return all samples collected since cursor `since` (default: since the previous call).
+
+        Returns a dict of NumPy arrays keyed by SAMPLE_FIELDS plus 'cursor'
+        (pass it back as `since`), 'dropped' (samples overwritten before they
+        were fetched) and 'sampler_error' (last exception in the thread, or None).
+        """
+        with self._samples_lock:
+            cursor = self._samples_cursor if since is None else int(since)
+            rows = self._samples.since(cursor).copy()
+            total = self._samples.total
+            self._samples_cursor = total
+        batch = dict(zip(SAMPLE_FIELDS, rows))
+        batch['cursor'] = total
+        batch['dropped'] = max(0, total - cursor - rows.shape[1])
+        batch['sampler_error'] = self._sampler_error
+        return batch
+
+    # ---------- Lock-health monitor ----------
+    def set_lock_monitor(self, enabled=True, rate=None, **settings):
+        """Switch the lock-health monitor on or off; returns get_lock_health().
+
+        The monitor evaluates every sampler sample of the active PID, so it
+        starts the sampler at `rate` Hz (default LOCK_MONITOR_RATE) and reacts
+        within one sample period. settings override lock_health.DEFAULTS, e.g.
+        rms_limit=0.02 or window=0.5.
+        """
+        self.lock_health.configure(**settings)
+        if enabled:
+            self.lock_health.reset()
+            self.lock_health.enabled = True
+            self.start_sampler(rate or self._sampler_clients.get('lock_monitor', LOCK_MONITOR_RATE),
+                               client='lock_monitor')
+        else:
+            self.lock_health.enabled = False
+            self.stop_sampler(client='lock_monitor')
+        return self.get_lock_health()
+
+    def get_lock_health(self):
+        """Current lock state of the active PID without touching the hardware.
+
+        {'enabled', 'state' ('idle', 'locked', 'warning' or 'lost'), 'reasons',
+        'since', 'rms', 'time', 'error', 'ival', 'good_ival', 'setpoint_index',
+        'steps' (seen, expected) during a shot with a setpoint program, 'counts',
+        'last_event', 'settings', 'rate', 'sampler_error', 'relock'
+        (get_relock_status())}
+        """
+        status = self.lock_health.status()
+        status['rate'] = self._sampler_clients.get('lock_monitor')
+        status['sampler_error'] = self._sampler_error
+        status['relock'] = self.relock.status()
+        return status
+
+    def get_lock_events(self, last=None):
+        """Recent health events [{'time', 'kind', 'detail'}], kind being 'lost', 'recovered', 'jump' or 'stuck_index'."""
+        return self.lock_health.recent_events(last)
+
+    def clear_lock_events(self):
+        self.lock_health.clear_events()
+        return True
+
+    def set_auto_relock(self, enabled=True, **settings):
+        """Arm or disarm the automatic relock; returns get_relock_status().
+
+        On a lock loss reported by the monitor (switched on here if needed)
+        the active PID is paused, ival preloaded with its last value while
+        locked and the PID re-enabled; the attempt succeeds once the monitor
+        reports 'locked' for settle_time. Failed attempts are retried with
+        exponential back-off up to max_attempts, then the PID stays paused.
+        Never acts during a buffered shot. settings override relock.DEFAULTS.
+        """
+        self.relock.configure(**settings)
+        if enabled:
+            if not self.lock_health.enabled:
+                self.set_lock_monitor(True)
+            self.relock.start()
+        else:
+            self.relock.stop()
+        return self.get_relock_status()
+
+    def get_relock_status(self):
+        """{'state', 'attempt', 'counts', 'last_downtime' (s), 'good_ival', 'last_event', 'settings'}."""
+        return self.relock.status()
+
+    def get_relock_events(self, last=None):
+        """Recent relock events [{'time', 'kind', 'detail'}], kind being 'relocked', 'failed', 'gave_up', 'skipped' or 'error'."""
+        return self.relock.recent_events(last)
+
+    def _on_lock_lost(self, event):
+        # Runs in the sampler thread
+        self.log.warning('Lock lost on %s: %s', self._active_pid_id(), event['detail'])
     
+    @_exclusive
     def pause_pid(self):
         try:
-            self.pids['in1'].paused = True
-            self.pids['in2'].paused = True
-            print("[DEBUG] PID controllers paused")
-            return {'in1': self.pids['in1'].paused, 'in2': self.pids['in2'].paused}
+            self.apply_params({'in1': {'paused': True}, 'in2': {'paused': True}})
+            self.log.info('PID controllers paused')
+            return {'in1': self._get_param('in1', 'paused'), 'in2': self._get_param('in2', 'paused')}
         except Exception as e:
-            print(f"[ERROR] Failed to pause PID controllers: {e}")
+            self.log.error('Failed to pause PID controllers: %s', e)
             return {"error": f"Failed to pause PID controllers: {e}"}
 
+    @_exclusive
     def output_to_zero(self):
         try:
-            self.pids['in1'].pause_gains = 'pi'
-            self.pids['in2'].pause_gains = 'pi'
-            self.pids['in1'].paused = True
-            self.pids['in2'].paused = True
-            self.pids['in1'].p = 0.0
-            self.pids['in2'].p = 0.0
-            self.pids['in1'].ival = -0.99
-            self.pids['in2'].ival = -0.99
-            print("[DEBUG] PID controllers output set to zero")
+            self.apply_params({
+                pid_id: {'pause_gains': 'pi', 'paused': True, 'p': 0.0, 'ival': -0.99}
+                for pid_id in ('in1', 'in2')
+            })
+            self.log.info('PID controllers output set to zero')
             return True
         except Exception as e:
-            print(f"[ERROR] Failed to set PID controllers output to zero: {e}")
-
-    # because of the calibration issue, we need to manually calibrate the digital setpoints
-    def phy2dig_setpoint_in1(self, physical_value):
-        k1 = (HALF_IN1 - ZERO_IN1)/0.5
-        b1 = ZERO_IN1
-        return k1 * physical_value + b1
-
-    def dig2phy_setpoint_in1(self, digital_value):
-        k1 = (0.5 - 0.0) / (HALF_IN1 - ZERO_IN1)
-        b1 = 0.0 - k1 * ZERO_IN1
-        return k1 * digital_value + b1
+            self.log.error('Failed to set PID controllers output to zero: %s', e)
 
-    def phy2dig_setpoint_in2(self, physical_value):
-        k2 = (HALF_IN2 - ZERO_IN2)/0.5
-        b2 = ZERO_IN2
-        return k2 * physical_value + b2
+    def _calibration_stamp(self, channel):
+        """Identifies the calibration used to convert a channel's setpoints."""
+        return self.calibration[channel].stamp
 
-    def dig2phy_setpoint_in2(self, digital_value):
-        k2 = (0.5 - 0.0) / (HALF_IN2 - ZERO_IN2)
-        b2 = 0.0 - k2 * ZERO_IN2
-        return k2 * digital_value + b2
+    def _config_section(self, key):
+        """Return a top-level section of the pyrpl config as plain python data, or None."""
+        if key not in self.p.c._keys():
+            return None
+        return _plain(self.p.c[key])
 
         # ---------- Digital Setpoint Sequence Methods ----------
+    @_exclusive
     def set_use_setpoint_sequence(self, enable):
         """Enable/disable setpoint sequence mode"""
         try:
             if self.setpoint_source == 'digital_setpoint_in2':
-                self.pids['in2'].use_setpoint_sequence = bool(enable)
-                return self.pids['in2'].use_setpoint_sequence
+                self._set_param('in2', 'use_setpoint_sequence', enable)
+                return self._get_param('in2', 'use_setpoint_sequence')
             elif self.setpoint_source == 'digital_setpoint_in1':
-                self.pids['in1'].use_setpoint_sequence = bool(enable)
-                return self.pids['in1'].use_setpoint_sequence
+                self._set_param('in1', 'use_setpoint_sequence', enable)
+                return self._get_param('in1', 'use_setpoint_sequence')
         except Exception as e:
-            print(f"[WORKER] set_use_setpoint_sequence error: {e}")
+            self.log.error('set_use_setpoint_sequence error: %s', e)
             raise
 
+    @_exclusive
     def set_setpoint_array(self, array):
         """Set setpoint array for sequence mode"""
         try:
             # Pad array to 16 elements with zeros if shorter
             if len(array) < 16:
                 array = list(array) + [0.0] * (16 - len(array))
-                print(f"[WORKER] Array padded to 16 elements with zeros")
+                self.log.debug('Array padded to 16 elements with zeros')
             
+            # The hardware no longer holds what the last shot uploaded
+            self._uploaded_setpoints.pop(self._active_pid_id(), None)
             if self.setpoint_source == 'digital_setpoint_in2':
-                digital_array = [self.phy2dig_setpoint_in2(val) for val in array]
+                digital_array = self.calibration['in2'].to_digital(np.asarray(array))
                 self.current['in2']['digital_setpoint_array'] = array
-                self.pids['in2'].set_setpoint_array(digital_array)
+                self._set_param('in2', 'setpoint_array', digital_array)
             elif self.setpoint_source == 'digital_setpoint_in1':
-                digital_array = [self.phy2dig_setpoint_in1(val) for val in array]
+                digital_array = self.calibration['in1'].to_digital(np.asarray(array))
                 self.current['in1']['digital_setpoint_array'] = array
-                self.pids['in1'].set_setpoint_array(digital_array)
+                self._set_param('in1', 'setpoint_array', digital_array)
             return f"Setpoint array set: {array} -> {digital_array}"
         except Exception as e:
-            print(f"[WORKER] set_setpoint_array error: {e}")
+            self.log.error('set_setpoint_array error: %s', e)
             raise
 
+    @_exclusive
     def reset_sequence_index(self):
         """Reset sequence index to 0"""
         try:
@@ -669,9 +1672,10 @@ class red_pitaya_pyrpl_pid_worker(Worker):
                 self.pids['in1'].reset_sequence_index()
             return "Sequence index reset to 0"
         except Exception as e:
-            print(f"[WORKER] reset_sequence_index error: {e}")
+            self.log.error('reset_sequence_index error: %s', e)
             raise
 
+    @_exclusive
     def manually_change_setpoint(self):
         """Manually trigger setpoint change in sequence"""
         try:
@@ -681,117 +1685,279 @@ class red_pitaya_pyrpl_pid_worker(Worker):
                 self.pids['in1'].manually_change_setpoint()
             return "Setpoint manually changed"
         except Exception as e:
-            print(f"[WORKER] manually_change_setpoint error: {e}")
+            self.log.error('manually_change_setpoint error: %s', e)
             raise
 
 
 
+    @_exclusive
     def set_setpoint_index(self, index):
         """Set setpoint index (0-15)"""
         try:
             if self.setpoint_source == 'digital_setpoint_in2':
-                self.pids['in2'].setpoint_index = int(index) & 0xF
-                return self.pids['in2'].setpoint_index
+                self._set_param('in2', 'setpoint_index', int(index) & 0xF)
+                return self._get_param('in2', 'setpoint_index')
             elif self.setpoint_source == 'digital_setpoint_in1':
-                self.pids['in1'].setpoint_index = int(index) & 0xF
-                return self.pids['in1'].setpoint_index
+                self._set_param('in1', 'setpoint_index', int(index) & 0xF)
+                return self._get_param('in1', 'setpoint_index')
         except Exception as e:
-            print(f"[WORKER] set_setpoint_index error: {e}")
+            self.log.error('set_setpoint_index error: %s', e)
             raise
 
     # ---------- BLACS required methods ----------
     def program_manual(self, values):
         return {}
 
+    def _stop_streamers(self):
+        """Stop the shot's setpoint streamers and keep their final status in stream_status."""
+        if not self._streamers:
+            return self.stream_status
+        for streamer in self._streamers.values():
+            streamer.stop()
+        self.stream_status = {channel: streamer.status() for channel, streamer in self._streamers.items()}
+        self._streamers = {}
+        for channel, status in self.stream_status.items():
+            if status['underruns']:
+                self.log.warning('%s setpoint stream had %d underrun(s), stale setpoints were played '
+                                 '(reached entry %d of %d)', channel, status['underruns'],
+                                 status['position'], status['length'])
+        return self.stream_status
+
+    def get_stream_status(self):
+        """{channel: status} of the running setpoint streams, or of the last shot's."""
+        if self._streamers:
+            return {channel: streamer.status() for channel, streamer in self._streamers.items()}
+        return self.stream_status
+
+    def _shot_params(self, channel, attrs):
+        """Per-shot PID parameters from a channel group's attributes, in register units."""
+        params = {}
+        for name, value in attrs.items():
+            if name not in SHOT_PARAMS:
+                continue
+            value = SHOT_PARAMS[name](value)
+            if name == 'setpoint':
+                value = self.calibration[channel].to_digital(value)
+            elif name in ('min_voltage', 'max_voltage'):
+                value = self.calibration['out'].to_digital(value)
+            params[name] = value
+        return params
+
+    def _hardware_values(self, pid_id, names):
+        """Current values of names, from the shadow where it holds them and one block read otherwise."""
+        shadow = self.shadow[pid_id]
+        values = {name: shadow.values[name] for name in names
+                  if name in shadow.values and name not in shadow.VOLATILE}
+        missing = [name for name in names if name not in values]
+        if missing:
+            values.update(read_params(self._get_pid(pid_id), missing, shadow))
+        return values
+
+    def _apply_shot_params(self, shot):
+        """Apply the shot's PID parameters, remembering the manual values they replace."""
+        params = {}
+        for channel in ('in1', 'in2'):
+            if channel in shot:
+                values = self._shot_params(channel, shot[channel]['attrs'])
+                if values:
+                    params[channel] = values
+        if not params:
+            return 0
+        for channel, values in params.items():
+            saved = self._manual_params.setdefault(channel, {})
+            missing = [name for name in values if name not in saved]
+            if missing:
+                saved.update(self._hardware_values(channel, missing))
+        # The shadow skips registers that already hold the shot's value
+        transactions = self.apply_params(params)
+        self.log.info('Applied shot PID parameters %s (%d transactions)', params, transactions)
+        return transactions
+
+    def _restore_manual_params(self):
+        """Put back the manual values the last shot overrode; only changed registers are written."""
+        if not self._manual_params:
+            return 0
+        params, self._manual_params = self._manual_params, {}
+        transactions = self.apply_params(params)
+        self.log.info('Restored manual PID parameters (%d transactions)', transactions)
+        return transactions
+
+    @_exclusive
     def transition_to_manual(self):
+        self._stop_streamers()
+        missing = self.lock_health.end_sequence()
+        if missing:
+            self.log.warning('%d setpoint sequence step(s) of the shot never arrived', missing)
+        self.in_shot = False
+        # A loss during the shot was left alone; relock now (after this call releases the lock)
+        self.relock.poke()
         try:
-            sp1 = self.dig2phy_setpoint_in1(self.pids['in1'].setpoint)
-            sp2 = self.dig2phy_setpoint_in2(self.pids['in2'].setpoint)
+            self._restore_manual_params()
+        except Exception as e:
+            self.log.error('Restoring manual PID parameters failed: %s', e)
+        try:
+            sp1 = self.calibration['in1'].to_physical(self._get_param('in1', 'setpoint'))
+            sp2 = self.calibration['in2'].to_physical(self._get_param('in2', 'setpoint'))
             return {'in1': float(sp1), 'in2': float(sp2)}
         except Exception as e:
-            print(f"[WORKER] transition_to_manual error: {e}")
+            self.log.error('transition_to_manual error: %s', e)
             return {'in1': 0.0}
 
+    def _shot_setpoints(self, channel, data, attrs):
+        """(physical, digital) setpoints of a shot file array.
+
+        Compiled shots carry the register counts computed with the calibration
+        named in attrs['calibration']; they are used as they are when that is
+        the live calibration, otherwise the volts are converted here.
+        """
+        if data.dtype.names is None:
+            # Shot files from before the structured record: volts only
+            physical = np.asarray(data, dtype=float)
+            return physical, self.calibration[channel].to_digital(physical)
+        physical = np.asarray(data['physical'], dtype=float)
+        if attrs.get('calibration') == self._calibration_stamp(channel):
+            return physical, from_counts(data['digital'])
+        self.log.info('%s shot was compiled with another calibration, converting setpoints', channel)
+        return physical, self.calibration[channel].to_digital(physical)
+
+    @_exclusive
     def transition_to_buffered(self, device_name, h5_file, initial_values, fresh):
         """Read simplified parameters from HDF5 and configure hardware"""
-        print(f"[WORKER] transition_to_buffered called: device={device_name}, fresh={fresh}")
-        print("0")
-        
+        self.log.debug('transition_to_buffered called: device=%s, fresh=%s', device_name, fresh)
+        self.in_shot = True
         try:
             import h5py
             
+            self._stop_streamers()
+            self.stream_status = {}
+            if fresh:
+                # The board may have been changed outside the worker: upload and apply everything again
+                for channel in ('in1', 'in2'):
+                    self.shadow[channel].invalidate()
+                    self._uploaded_setpoints.pop(channel, None)
             with h5py.File(h5_file, 'r') as hdf5_file:
-                device_group = hdf5_file[f'/devices/{device_name}']
-                print("1")
-                print(device_group)
-                
-                # Process each channel's parameters
-                for channel in ['in1', 'in2']:
-                    if channel in device_group:
-                        channel_group = device_group[channel]
-                        pid = self.pids[channel]
-                        
-                        if 'digital_setpoint_array' in channel_group:
-                            array = list(channel_group['digital_setpoint_array'][:])
-                            # Use worker's method to handle calibration
-                            if channel == 'in1':
-                                digital_array = [self.phy2dig_setpoint_in1(val) for val in array]
-                                self.current['in1']['digital_setpoint_array'] = array
-                                pid.set_setpoint_array(digital_array)
-                                pid.reset_sequence_index()
-                            else:  # in2
-                                digital_array = [self.phy2dig_setpoint_in2(val) for val in array]
-                                self.current['in2']['digital_setpoint_array'] = array  
-                                pid.set_setpoint_array(digital_array)
-                                pid.reset_sequence_index()
-                            print(f"[WORKER] Set {channel}.digital_setpoint_array = {array}")
-            
-            print(f"[WORKER] transition_to_buffered completed successfully")
+                shot = read_device_group(hdf5_file[f'/devices/{device_name}'])
+            self._apply_shot_params(shot)
+
+            for channel in ['in1', 'in2']:
+                if 'digital_setpoint_array' not in shot.get(channel, {}):
+                    continue
+                pid = self.pids[channel]
+                data, attrs = shot[channel]['digital_setpoint_array']
+                physical, digital = self._shot_setpoints(channel, data, attrs)
+                array = physical.tolist()
+                if len(array) > SEQUENCE_LENGTH:
+                    self.current[channel]['digital_setpoint_array'] = array
+                    streamer = SetpointStreamer(pid, digital, self._hw_lock, self.shadow[channel])
+                    streamer.load()
+                    self._streamers[channel] = streamer
+                    # The table will hold later pages, not the array the hash describes
+                    self._uploaded_setpoints.pop(channel, None)
+                    self.log.info('Streaming %d setpoints on %s', len(array), channel)
+                    continue
+                # Older shot files carry no precomputed hash
+                digest = attrs.get('hash')
+                if digest is None:
+                    digest = array_hash(physical)
+                upload_key = (str(digest), self._calibration_stamp(channel))
+                if self._uploaded_setpoints.get(channel) == upload_key:
+                    pid.reset_sequence_index()
+                    self.log.debug('%s.digital_setpoint_array unchanged, only index reset', channel)
+                    continue
+                self.current[channel]['digital_setpoint_array'] = array
+                self._set_param(channel, 'setpoint_array', digital)
+                pid.reset_sequence_index()
+                self._uploaded_setpoints[channel] = upload_key
+                self.log.debug('Set %s.digital_setpoint_array = %s', channel, array)
+
+            # Let the lock monitor check that the steps of a setpoint program arrive
+            channel = self._active_pid_id()
+            if 'digital_setpoint_array' in shot.get(channel, {}):
+                step_times = shot[channel]['digital_setpoint_array'][1].get('step_times')
+                if step_times is not None:
+                    self.lock_health.expect_sequence(step_times)
+            # The streams wait for the hardware lock, so they start polling once this call returns
+            for streamer in self._streamers.values():
+                streamer.start()
+            self.log.debug('transition_to_buffered completed')
             return {}
             
         except Exception as e:
-            print(f"[WORKER] transition_to_buffered failed: {e}")
-            import traceback
-            traceback.print_exc()
+            self.log.exception('transition_to_buffered failed: %s', e)
             return {}
 
+    @_exclusive
     def abort_buffered(self):
         """Abort buffered mode - pause PIDs safely"""
+        self._stop_streamers()
+        self.lock_health.end_sequence(report=False)
+        self.in_shot = False
         try:
-            for channel in ['in1', 'in2']:
-                pid = self.pids[channel]
-                pid.pause_gains = 'pi'  # Pause both P and I
-                pid.paused = True
-                pid.ival = -0.99        # Reset integrator
-            print("[WORKER] Buffered mode aborted - PIDs paused")
+            self._restore_manual_params()
+            # Pause both P and I and reset the integrator; unchanged registers are skipped
+            self.apply_params({
+                channel: {'pause_gains': 'pi', 'paused': True, 'ival': -0.99}
+                for channel in ['in1', 'in2']
+            })
+            self.log.info('Buffered mode aborted - PIDs paused')
             return True
         except Exception as e:
-            print(f"[WORKER] Error in abort_buffered: {e}")
+            self.log.error('Error in abort_buffered: %s', e)
             return False
 
+    @_exclusive
     def abort_transition_to_buffered(self):
         """Abort transition to buffered mode"""
+        self._stop_streamers()
+        self.lock_health.end_sequence(report=False)
+        self.in_shot = False
         try:
-            for channel in ['in1', 'in2']:
-                pid = self.pids[channel]
-                pid.pause_gains = 'pi'  # Pause both P and I
-                pid.paused = True
-                pid.ival = -0.99        # Reset integrator
-            print("[WORKER] Transition to buffered aborted - PIDs paused")
+            self._restore_manual_params()
+            # Pause both P and I and reset the integrator; unchanged registers are skipped
+            self.apply_params({
+                channel: {'pause_gains': 'pi', 'paused': True, 'ival': -0.99}
+                for channel in ['in1', 'in2']
+            })
+            self.log.info('Transition to buffered aborted - PIDs paused')
             return True
         except Exception as e:
-            print(f"[WORKER] Error in abort_transition_to_buffered: {e}")
+            self.log.error('Error in abort_transition_to_buffered: %s', e)
             return False
 
     def shutdown(self):
         """Shutdown worker - ensure safe state"""
+        # Stop the relock and the sampler first; apply_params takes the hardware lock itself
+        self.relock.stop()
+        self.lock_health.enabled = False
+        self.stop_sampler(client=None)
+        self._stop_streamers()
+        if self._autosave_timer is not None:
+            # Save the pending lock settings now; a parked state below is not saved
+            self._cancel_autosave()
+            self._autosave()
+        self._autosave_delay = 0
         try:
-            for channel in ['in1', 'in2']:
-                pid = self.pids[channel]
-                pid.pause_gains = 'pi'  # Pause both P and I
-                pid.paused = True
-                pid.ival = -0.99        # Reset integrator
-            print("[WORKER] Worker shutdown - all PIDs safely paused")
+            self._restore_manual_params()
+            if not self._park_on_shutdown():
+                # The next start attaches to the running lock, see _attach_check()
+                self.log.info('Worker shutdown - PIDs left running')
+                return
+            # Pause both P and I and reset the integrator; unchanged registers are skipped
+            self.apply_params({
+                channel: {'pause_gains': 'pi', 'paused': True, 'ival': -0.99}
+                for channel in ['in1', 'in2']
+            })
+            self.log.info('Worker shutdown - all PIDs safely paused')
         except Exception as e:
-            print(f"[WORKER] Error during shutdown: {e}")
-            pass
\ No newline at end of file
+            self.log.error('Error during shutdown: %s', e)
+            pass
+
+    def _park_on_shutdown(self):
+        """park_on_shutdown if set, otherwise park only when fast attach is off (nothing would adopt the lock)."""
+        park = getattr(self, 'park_on_shutdown', None)
+        if park is None:
+            return not getattr(self, 'fast_attach', True)
+        return bool(park)
+
+
+IMPORT_TIME = time.perf_counter() - _import_started
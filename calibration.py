@@ -0,0 +1,237 @@
+#####################################################################
+#                                                                   #
+# Red Pitaya PID (pyrpl) calibration model                          #
+#                                                                   #
+# Because of the ADC/DAC reference mismatch (see README,            #
+# "Calibration issue"), pyrpl's digital values are not volts. Each  #
+# input channel is described by a table of (physical, digital)      #
+# points, the output by its physical value at digital zero.         #
+#                                                                   #
+#####################################################################
+
+import json
+import os
+
+import numpy as np
+
+# calibrate the output range
+OUT_MAX = 2.031
+OUT_MIN = 0.007
+OUT_ZERO = (OUT_MAX + OUT_MIN) / 2
+
+# Digital readings at 0 V and 0.5 V on each input, see ManualCalibration.ipynb
+ZERO_IN1 = -0.011962890625
+HALF_IN1 = 0.42919921875
+
+ZERO_IN2 = -0.0052490234375
+HALF_IN2 = 0.43505859375
+
+# Full scale of each input range in volts; the ADC normalizes it to +-1 (README, "Input Modes")
+RANGE_SCALE = {'LV': 1.0, 'HV': 20.0}
+
+# Top-level key of the calibration section older versions kept in the pyrpl
+# config file; it is only read once, to create a missing calibration file
+CONFIG_SECTION = 'blacs_calibration'
+
+# Directory of the per-device calibration files used when no calibration_file is given
+CALIBRATION_DIR = os.path.join(os.path.expanduser('~'), '.red_pitaya_pyrpl_pid')
+
+
+class ChannelCalibration:
+    """Physical <-> digital conversion for one input channel.
+
+    The channel is described by (physical, digital) points measured in
+    `table_range`; conversion is linear between points and extrapolates the
+    end segments. If the channel is operated in another `input_range`, the
+    digital side is rescaled by the ratio of the nominal full scales, which
+    is only approximate - re-measure in the new range for best accuracy.
+
+    Coefficients are computed once; to_digital/to_physical accept scalars
+    or arrays and convert in one vectorized operation.
+    """
+
+    def __init__(self, points, input_range='LV', table_range=None):
+        if input_range not in RANGE_SCALE:
+            raise ValueError(f"Invalid input range {input_range}, must be one of {list(RANGE_SCALE)}")
+        table_range = input_range if table_range is None else table_range
+        points = np.array(sorted((float(p), float(d)) for p, d in points))
+        if len(points) < 2:
+            raise ValueError('A calibration table needs at least two points')
+        self.points = points
+        self.input_range = input_range
+        self.table_range = table_range
+        scale = RANGE_SCALE[table_range] / RANGE_SCALE[input_range]
+        self._phy = points[:, 0]
+        self._dig = points[:, 1] * scale
+        if np.any(np.diff(self._phy) <= 0) or np.any(np.diff(self._dig) <= 0):
+            raise ValueError('Calibration points must be strictly increasing in both physical and digital value')
+        self._slope = np.diff(self._dig) / np.diff(self._phy)
+        self._inv_slope = 1.0 / self._slope
+
+    @classmethod
+    def linear(cls, zero, half, input_range='LV'):
+        """Two-point calibration from the digital readings at 0 V and 0.5 V."""
+        return cls([(0.0, zero), (0.5, half)], input_range)
+
+    @classmethod
+    def nominal(cls, input_range='LV'):
+        """Uncalibrated conversion: digital = volts / full scale."""
+        return cls([(0.0, 0.0), (RANGE_SCALE[input_range], 1.0)], input_range)
+
+    @classmethod
+    def from_dict(cls, data):
+        input_range = data.get('input_range', 'LV')
+        if 'points' in data:
+            return cls(data['points'], input_range, data.get('table_range'))
+        if 'zero' in data and 'half' in data:
+            return cls([(0.0, data['zero']), (0.5, data['half'])], input_range, data.get('table_range'))
+        return cls.nominal(input_range)
+
+    def as_dict(self):
+        return {
+            'points': self.points.tolist(),
+            'input_range': self.input_range,
+            'table_range': self.table_range,
+        }
+
+    def with_range(self, input_range):
+        """The same table operated in `input_range` (see the class docstring)."""
+        return ChannelCalibration(self.points, input_range, self.table_range)
+
+    @property
+    def stamp(self):
+        """Short string identifying this calibration, e.g. to tag converted data."""
+        return json.dumps(self.as_dict(), sort_keys=True)
+
+    @staticmethod
+    def _evaluate(x, xp, yp, slope):
+        x = np.asarray(x, dtype=float)
+        if len(xp) == 2:
+            y = yp[0] + slope[0] * (x - xp[0])
+        else:
+            idx = np.clip(np.searchsorted(xp, x, side='right') - 1, 0, len(xp) - 2)
+            y = yp[idx] + slope[idx] * (x - xp[idx])
+        return float(y) if y.ndim == 0 else y
+
+    def to_digital(self, physical):
+        """Convert volts at the input to pyrpl's digital setpoint units."""
+        return self._evaluate(physical, self._phy, self._dig, self._slope)
+
+    def to_physical(self, digital):
+        """Convert pyrpl's digital units back to volts at the input."""
+        return self._evaluate(digital, self._dig, self._phy, self._inv_slope)
+
+
+class OutputCalibration:
+    """Digital <-> physical conversion of the outputs (offset from the removed resistors)."""
+
+    def __init__(self, zero=OUT_ZERO, slope=1.0):
+        self.zero = float(zero)
+        self.slope = float(slope)
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data.get('zero', OUT_ZERO), data.get('slope', 1.0))
+
+    def as_dict(self):
+        return {'zero': self.zero, 'slope': self.slope}
+
+    @property
+    def minimum(self):
+        return self.to_physical(-1.0)
+
+    @property
+    def maximum(self):
+        return self.to_physical(1.0)
+
+    def to_physical(self, digital):
+        y = self.zero + self.slope * np.asarray(digital, dtype=float)
+        return float(y) if y.ndim == 0 else y
+
+    def to_digital(self, physical):
+        y = (np.asarray(physical, dtype=float) - self.zero) / self.slope
+        return float(y) if y.ndim == 0 else y
+
+
+def default_calibrations():
+    """The built-in calibration ({'in1', 'in2', 'out'}) from ManualCalibration.ipynb."""
+    return {
+        'in1': ChannelCalibration.linear(ZERO_IN1, HALF_IN1),
+        'in2': ChannelCalibration.linear(ZERO_IN2, HALF_IN2),
+        'out': OutputCalibration(),
+    }
+
+
+def calibrations_from_dict(data):
+    """Build {'in1', 'in2', 'out'} from a config section; missing entries keep the defaults."""
+    calibrations = default_calibrations()
+    for channel in ('in1', 'in2'):
+        if channel in data:
+            calibrations[channel] = ChannelCalibration.from_dict(data[channel])
+    if 'out' in data:
+        calibrations['out'] = OutputCalibration.from_dict(data['out'])
+    return calibrations
+
+
+def calibrations_as_dict(calibrations):
+    return {key: cal.as_dict() for key, cal in calibrations.items()}
+
+
+def calibration_path(device_name, calibration_file=None):
+    """The calibration file of a device: calibration_file, or <CALIBRATION_DIR>/<device_name>.yml.
+
+    The worker saves measured calibrations there and the labscript device
+    converts setpoints with it, so both always use the same calibration.
+    """
+    if calibration_file:
+        return calibration_file
+    return os.path.join(CALIBRATION_DIR, f'{device_name}.yml')
+
+
+def save_calibrations(calibrations, path):
+    """Write {'in1', 'in2', 'out'} to a per-device .json or .yml/.yaml file (see load_calibrations)."""
+    data = calibrations_as_dict(calibrations)
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        if path.endswith('.json'):
+            json.dump(data, f, indent=2)
+        else:
+            import yaml
+            yaml.safe_dump(data, f)
+
+
+def apply_input_ranges(calibrations, input_range=None):
+    """Set the range the inputs are jumpered to: None (as calibrated), 'LV'/'HV' for both, or {'in1': ..., 'in2': ...}."""
+    if input_range is None:
+        return calibrations
+    if isinstance(input_range, str):
+        input_range = {'in1': input_range, 'in2': input_range}
+    unknown = set(input_range) - {'in1', 'in2'}
+    if unknown:
+        raise ValueError(f"Unknown input channels {sorted(unknown)} in input_range, expected in1/in2")
+    calibrations = dict(calibrations)
+    for channel, value in input_range.items():
+        if value is not None:
+            calibrations[channel] = calibrations[channel].with_range(value)
+    return calibrations
+
+
+def load_calibrations(path=None, input_range=None):
+    """Load the calibration from a per-device file, or the defaults if there is none.
+
+    path may be a .json or .yml/.yaml file holding the section directly, see
+    calibration_path(). The file is the single source of the calibration:
+    nothing else (pyrpl config, connection table) overrides it, and a file
+    that does not exist means the built-in defaults. input_range, if given,
+    is the range the inputs are operated in, see apply_input_ranges().
+    """
+    if path is not None and os.path.exists(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            if path.endswith('.json'):
+                data = json.load(f)
+            else:
+                import yaml
+                data = yaml.safe_load(f)
+        return apply_input_ranges(calibrations_from_dict(data or {}), input_range)
+    return apply_input_ranges(default_calibrations(), input_range)
@@ -0,0 +1,88 @@
+#####################################################################
+#                                                                   #
+# Red Pitaya PID (pyrpl) device logging                             #
+#                                                                   #
+# One logging.Logger per device below BLACS's logger, so records    #
+# end up in BLACS.log, plus an in-memory handler keeping the most   #
+# recent events for the tab's post-mortem log view.                 #
+#                                                                   #
+#####################################################################
+
+import collections
+import logging
+import time
+
+LOGGER_PREFIX = 'BLACS.red_pitaya_pyrpl_pid'
+# Records kept by RecentEvents
+RECENT_CAPACITY = 2000
+DEFAULT_LEVEL = logging.INFO
+LEVELS = ('DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL')
+
+
+class RecentEvents(logging.Handler):
+    """Keeps the last `capacity` records as (time, level number, level name, message) tuples.
+
+    The message is formatted once, when the record is emitted; records
+    below the logger's level never reach the handler, so they cost nothing.
+    """
+
+    def __init__(self, capacity=RECENT_CAPACITY):
+        super().__init__(logging.NOTSET)
+        self.events = collections.deque(maxlen=int(capacity))
+        self.total = 0  # records emitted since creation or clear()
+
+    def emit(self, record):
+        try:
+            message = record.getMessage()
+            if record.exc_info:
+                message += '\n' + logging.Formatter().formatException(record.exc_info)
+        except Exception:
+            self.handleError(record)
+            return
+        self.events.append((record.created, record.levelno, record.levelname, message))
+        self.total += 1
+
+    def clear(self):
+        self.events.clear()
+        self.total = 0
+
+    def recent(self, last=None, level=logging.NOTSET):
+        """The most recent events at or above `level`, oldest first, as plain dicts."""
+        level = parse_level(level)
+        events = [event for event in list(self.events) if event[1] >= level]
+        if last is not None:
+            events = events[-int(last):] if last else []
+        return [{'time': created, 'level': name, 'message': message}
+                for created, _, name, message in events]
+
+
+def parse_level(level):
+    """Level number from a number or a name such as 'debug'."""
+    if isinstance(level, str):
+        name = level.upper()
+        if name not in LEVELS:
+            raise ValueError(f"Unknown log level {level!r}, expected one of {', '.join(LEVELS)}")
+        return getattr(logging, name)
+    return int(level)
+
+
+def device_logger(device_name, level=DEFAULT_LEVEL, capacity=RECENT_CAPACITY):
+    """Return (logger, RecentEvents handler) of a device, creating the handler once per process."""
+    logger = logging.getLogger(f'{LOGGER_PREFIX}.{device_name}')
+    logger.setLevel(parse_level(level))
+    for handler in logger.handlers:
+        if isinstance(handler, RecentEvents):
+            return logger, handler
+    handler = RecentEvents(capacity)
+    logger.addHandler(handler)
+    return logger, handler
+
+
+def format_events(events):
+    """Render recent() output as log lines."""
+    lines = []
+    for event in events:
+        stamp = time.strftime('%H:%M:%S', time.localtime(event['time']))
+        millis = int((event['time'] % 1) * 1000)
+        lines.append(f"{stamp}.{millis:03d} {event['level']:<8} {event['message']}")
+    return '\n'.join(lines)
@@ -3,11 +3,14 @@
 # Red Pitaya PID (pyrpl) labscript device                           #
 #                                                                   #
 #####################################################################
-print("Loading Red Pitaya PID labscript device...")
-
-from labscript import Device
+import numpy as np
+from labscript import Device, LabscriptError
 from labscript.labscript import set_passed_properties
 
+from .calibration import apply_input_ranges, calibration_path, default_calibrations, load_calibrations
+from .shot_data import (SEQUENCE_LENGTH, SETPOINT_DTYPE, SETPOINT_MAX, SETPOINT_MIN, SETPOINT_RECORD_DTYPE,
+                        SHOT_PARAMS, array_hash, setpoint_record, to_counts)
+
 
 class red_pitaya_pyrpl_pid(Device):
     """Labscript device for configuring Red Pitaya PID via pyrpl.
@@ -17,16 +20,61 @@ class red_pitaya_pyrpl_pid(Device):
 
     description = 'Red Pitaya PID (pyrpl) - user variant'
     allowed_children = []
+    # Width of the sequence step pulses (the Red Pitaya detects edges within ~36 ns)
+    trigger_duration = 1e-6
 
     @set_passed_properties(
-        {'connection_table_properties': ['ip_addr'],}
+        {'connection_table_properties': ['ip_addr', 'calibration_file', 'fast_attach', 'perf_stats',
+                                         'config_autosave', 'log_level', 'lock_monitor', 'auto_relock',
+                                         'park_on_shutdown', 'input_range'],}
     )
-    def __init__(self, name, ip_addr, parent_device=None, **kwargs):
+    def __init__(self, name, ip_addr, parent_device=None, calibration_file=None, fast_attach=True,
+                 perf_stats=False, in1_trigger=None, in2_trigger=None, stream_setpoints=False,
+                 config_autosave=0, log_level='INFO', lock_monitor=0, auto_relock=False,
+                 park_on_shutdown=None, input_range=None, **kwargs):
+        """ip_addr: hostname of the Red Pitaya, or 'sim://[board][?latency=...]' for the
+        simulated board in simulation.py.
+        calibration_file: .yml/.json file with the per-device calibration (see
+        calibration.py); default ~/.red_pitaya_pyrpl_pid/<name>.yml. The BLACS tab
+        saves measured calibrations there and setpoints are compiled with it.
+        fast_attach: on BLACS start, keep the loaded bitstream and adopt the running
+        PID state when possible instead of reloading the FPGA and parking the PIDs.
+        perf_stats: record worker call and register access latencies from the start
+        (can also be switched on in the tab's Diagnostics panel).
+        in1_trigger, in2_trigger: DigitalOuts wired to the sequence stepping inputs
+        (DIO4_P for in1, DIO3_P for in2), driven by setpoint() and ramp().
+        stream_setpoints: allow sequences longer than the 16 hardware slots; the
+        worker then refills the table page by page while the shot runs.
+        config_autosave: if non-zero, the worker saves the PID settings to the pyrpl
+        config this many seconds after they change, in the background.
+        log_level: level of the worker's device logger ('DEBUG', 'INFO', ...); at
+        DEBUG every register write and status poll is logged.
+        lock_monitor: if non-zero, the worker starts the lock-health monitor at
+        this sample rate (Hz); it can also be switched on in the tab.
+        auto_relock: arm the worker's automatic relock (pause, preload ival,
+        re-enable with back-off) at start; implies the lock monitor.
+        park_on_shutdown: pause both PIDs and reset their integrators when BLACS
+        closes. Default: only without fast_attach, so that a restart keeps the lock.
+        input_range: 'LV' or 'HV' jumper setting of both inputs, or {'in1': ..., 'in2': ...};
+        a calibration measured in the other range is rescaled (approximately, see
+        calibration.ChannelCalibration). Default: the range the calibration was measured in."""
         Device.__init__(self, name, parent_device, connection=None, **kwargs)
         self.BLACS_connection = ip_addr
+        self.calibration_file = calibration_file
+        try:
+            apply_input_ranges(default_calibrations(), input_range)
+        except ValueError as e:
+            raise LabscriptError(f'{self.name}: {e}')
+        self.input_range = input_range
 
         # Start empty; channels/keys are created lazily by the setters
         self.pid_params = {}  # or: defaultdict(dict)
+        self.step_triggers = {'in1': in1_trigger, 'in2': in2_trigger}
+        self.stream_setpoints = stream_setpoints
+        # Timeline programs: channel -> [(t, volts, register counts)], one entry per sequence slot
+        self.setpoint_programs = {}
+        # Loaded on first use from the device's calibration file, see _calibration()
+        self._calibrations = None
 
     def set_setpoint_array(self, channel='in1', array=None, key='digital_setpoint_array'):
         """
@@ -35,35 +83,156 @@ class red_pitaya_pyrpl_pid(Device):
         """
         if array is None:
             array = [0.0] * 16
-        if len(array) > 16:
-            print('Warning: Setpoint array has more than 16 elements. Only the first 16 will be used.')
-            array = list(array[:16])
+        if len(array) > 16 and not self.stream_setpoints:
+            raise LabscriptError(f'{self.name}: {channel} setpoint array has {len(array)} elements, the '
+                                 'hardware holds 16. Pass stream_setpoints=True to stream longer sequences.')
         if len(array) < 16:
             array = list(array) + [0.0] * (16 - len(array))
 
+        if key == 'digital_setpoint_array' and channel in self.setpoint_programs:
+            raise LabscriptError(f'{self.name}: {channel} already has a setpoint program from '
+                                 'setpoint()/ramp(), it cannot also take a static array.')
         ch = self.pid_params.setdefault(channel, {})
         ch[key] = list(array)
 
+    def set_pid_params(self, channel='in1', **params):
+        """Set PID parameters of a channel for this shot, e.g. set_pid_params('in1', p=0.2, i=1e4).
+
+        Accepts the keys of shot_data.SHOT_PARAMS, in the units of the tab
+        (setpoint in V at the input, min/max_voltage in V at the output). The
+        worker writes only the registers that differ from the hardware and
+        restores the manual values at the end of the shot.
+        """
+        if channel not in ('in1', 'in2'):
+            raise LabscriptError(f'{self.name}: unknown channel {channel!r}, expected in1 or in2.')
+        ch = self.pid_params.setdefault(channel, {})
+        for name, value in params.items():
+            if name not in SHOT_PARAMS:
+                raise LabscriptError(f'{self.name}: {name!r} is not a per-shot PID parameter, '
+                                     f'expected one of {sorted(SHOT_PARAMS)}.')
+            cast = SHOT_PARAMS[name]
+            if cast is not str and isinstance(value, str):
+                raise LabscriptError(f'{self.name}: {channel}.{name} must be a number, got {value!r}.')
+            ch[name] = cast(value)
+
+    def setpoint(self, t, value, channel='in1'):
+        """Program the digital setpoint of a channel to `value` (V) from time t.
+
+        The first value of a channel goes into slot 0 and is active from the
+        start of the shot. Each later change takes the next sequence slot and
+        emits a step pulse at t on the channel's trigger DigitalOut. Values are
+        converted with the channel calibration to 14-bit register counts, which
+        must be inside the register range; a value with the same counts as the
+        previous one takes no slot. Calls must be in time order per channel.
+        """
+        if channel not in self.step_triggers:
+            raise LabscriptError(f'{self.name}: unknown channel {channel!r}, expected in1 or in2.')
+        if 'digital_setpoint_array' in self.pid_params.get(channel, {}):
+            raise LabscriptError(f'{self.name}: {channel} already has a static setpoint array, '
+                                 'it cannot also take setpoint()/ramp() instructions.')
+        value = float(value)
+        digital = self._calibration(channel).to_digital(value)
+        if not SETPOINT_MIN <= digital <= SETPOINT_MAX:
+            raise LabscriptError(f'{self.name}: setpoint {value} V for {channel} at t={t} is {digital:.6f} '
+                                 f'in register units, outside [{SETPOINT_MIN}, {SETPOINT_MAX}] with the '
+                                 'calibration in use.')
+        counts = int(to_counts(digital))
+
+        program = self.setpoint_programs.setdefault(channel, [])
+        if not program:
+            program.append((t, value, counts))
+            return
+        last_t, _, last_counts = program[-1]
+        if t < last_t:
+            raise LabscriptError(f'{self.name}: setpoint for {channel} at t={t} is earlier than the '
+                                 f'previous one at t={last_t}; instructions must be in time order.')
+        if counts == last_counts:
+            return
+        if len(program) >= SEQUENCE_LENGTH and not self.stream_setpoints:
+            raise LabscriptError(f'{self.name}: the setpoint program for {channel} needs more than '
+                                 f'{SEQUENCE_LENGTH} sequence slots (at t={t}). Reduce the number of '
+                                 'distinct consecutive values, e.g. fewer ramp samples, or pass '
+                                 'stream_setpoints=True.')
+        trigger = self.step_triggers[channel]
+        if trigger is None:
+            raise LabscriptError(f'{self.name}: the setpoint of {channel} changes at t={t} but no '
+                                 f'{channel}_trigger DigitalOut was given to step the sequence.')
+        if len(program) > 1 and t - last_t < 2 * self.trigger_duration:
+            raise LabscriptError(f'{self.name}: setpoint steps for {channel} at t={last_t} and t={t} '
+                                 f'are closer than two trigger pulses ({2 * self.trigger_duration} s).')
+        trigger.go_high(t)
+        trigger.go_low(t + self.trigger_duration)
+        program.append((t, value, counts))
+
+    def ramp(self, t, duration, initial, final, samples, channel='in1'):
+        """Linear setpoint ramp from `initial` to `final` (V) as `samples` steps.
+
+        Each sample is a setpoint() call, so samples that round to the same
+        register value share a slot. Returns the duration, like labscript ramps.
+        """
+        samples = int(samples)
+        if samples < 2:
+            raise LabscriptError(f'{self.name}: a ramp needs at least 2 samples, got {samples}.')
+        for k in range(samples):
+            fraction = k / (samples - 1)
+            self.setpoint(t + fraction * duration, initial + fraction * (final - initial), channel)
+        return duration
+
+
+    def _calibration(self, channel):
+        """Calibration of a channel from the file the worker calibrates into (see calibration.calibration_path())."""
+        if self._calibrations is None:
+            self._calibrations = load_calibrations(calibration_path(self.name, self.calibration_file),
+                                                   self.input_range)
+        return self._calibrations[channel]
 
     def generate_code(self, hdf5_file):
         """Write PID parameters to HDF5 file"""
         Device.generate_code(self, hdf5_file)
         grp = hdf5_file.require_group(f'/devices/{self.name}/')
 
+        for channel, program in self.setpoint_programs.items():
+            values = [value for _, value, _ in program]
+            # Unused slots repeat the last value so a spurious trigger changes nothing
+            values += [values[-1]] * max(0, SEQUENCE_LENGTH - len(values))
+            self.pid_params.setdefault(channel, {})['digital_setpoint_array'] = values
+
         for channel, params in self.pid_params.items():
             channel_grp = grp.require_group(channel)
             for key, value in params.items():
-                if isinstance(value, str):
-                    ds = channel_grp.require_dataset(key, (), dtype='S64')  # a bit more room than S32
-                    ds[()] = value.encode('utf-8')
-                elif isinstance(value, (list, tuple)):
-                    import numpy as np
+                if isinstance(value, (list, tuple)):
                     arr = np.array(value, dtype=float)
-                    ds = channel_grp.require_dataset(key, arr.shape, dtype='f')
-                    ds[...] = arr
+                    if key == 'digital_setpoint_array':
+                        ds = self._write_setpoint_record(channel_grp, key, arr, self._calibration(channel))
+                    else:
+                        ds = channel_grp.require_dataset(key, arr.shape, dtype=SETPOINT_DTYPE)
+                        ds[...] = arr
+                    # Lets the worker skip re-uploading an unchanged array without reading it
+                    ds.attrs['hash'] = array_hash(arr)
+                    if key == 'digital_setpoint_array' and channel in self.setpoint_programs:
+                        ds.attrs['step_times'] = [t for t, _, _ in self.setpoint_programs[channel]]
+                # Scalars are attributes of the channel group, read along with it
+                elif isinstance(value, str):
+                    channel_grp.attrs[key] = value
                 elif isinstance(value, bool):
-                    ds = channel_grp.require_dataset(key, (), dtype='?')
-                    ds[()] = bool(value)
+                    channel_grp.attrs[key] = bool(value)
                 else:
-                    ds = channel_grp.require_dataset(key, (), dtype='f')
-                    ds[()] = float(value)
+                    channel_grp.attrs[key] = float(value)
+
+    def _write_setpoint_record(self, channel_grp, key, physical, calibration):
+        """Store volts and the calibrated 14-bit register counts side by side.
+
+        The calibration stamp lets the worker upload the counts as they are
+        when its live calibration is the same one.
+        """
+        digital = calibration.to_digital(physical)
+        outside = (digital < SETPOINT_MIN) | (digital > SETPOINT_MAX)
+        if np.any(outside):
+            raise LabscriptError(f'{self.name}: {channel_grp.name} setpoints {physical[outside].tolist()} V '
+                                 f'are outside the register range with the calibration in use.')
+        record = setpoint_record(physical, digital)
+        ds = channel_grp.require_dataset(key, record.shape, dtype=SETPOINT_RECORD_DTYPE)
+        ds[...] = record
+        ds.attrs['calibration'] = calibration.stamp
+        ds.attrs['calibration_file'] = calibration_path(self.name, self.calibration_file)
+        return ds
@@ -0,0 +1,261 @@
+#####################################################################
+#                                                                   #
+# Red Pitaya PID (pyrpl) lock-health monitor                        #
+#                                                                   #
+# Fed one sample at a time by the worker's sampler thread, it keeps #
+# a sliding-window RMS of the error and flags an integrator pinned  #
+# at the output limits, sudden error jumps and a setpoint sequence  #
+# that stops stepping. Entering the 'lost' state raises an event    #
+# to the registered listeners from the sampler thread itself.       #
+#                                                                   #
+#####################################################################
+
+import collections
+import math
+import threading
+import time
+
+import numpy as np
+
+from .shot_data import SEQUENCE_LENGTH
+
+# Default settings. The error is the PID's own error signal as the sampler
+# computes it: the normalized input reading minus the setpoint register, both
+# in pyrpl's digital units. These are volts at the input only for an identity
+# calibration; with the built-in one (calibration.py), 0.05 is ~57 mV at in1.
+# ival and the output limits are register values in [-1, 1).
+DEFAULTS = {
+    'window': 0.1,          # s, sliding window of the RMS error
+    'rms_limit': 0.05,      # RMS error above which the lock counts as lost
+    'jump_limit': 0.2,      # error change between two samples flagged as a jump
+    'rail_margin': 0.02,    # ival this close to min_voltage/max_voltage is at a rail
+    'rail_time': 0.01,      # s at a rail before the integrator counts as pinned
+    'stuck_margin': 1.0,    # s allowed on top of the longest programmed step interval
+}
+# Health events kept for get_lock_events()
+EVENT_CAPACITY = 256
+# Reasons that make the lock 'lost' rather than 'warning'
+LOST_REASONS = frozenset(['rms', 'saturated'])
+
+
+class LockHealthMonitor:
+    """Lock state of the active PID derived from the sampler's samples.
+
+    state is 'idle' (disabled or PID paused), 'locked', 'warning' (error
+    jump or stuck sequence) or 'lost' (RMS error over the limit or integrator
+    pinned at an output limit). Listeners are called with the event dict
+    whenever the state changes to 'lost'.
+    """
+
+    def __init__(self, **settings):
+        self.settings = dict(DEFAULTS)
+        self.configure(**settings)
+        self.enabled = False
+        self.listeners = []
+        self.events = collections.deque(maxlen=EVENT_CAPACITY)
+        self.counts = {'lost': 0, 'jump': 0, 'stuck_index': 0}
+        self._lock = threading.Lock()
+        self._sequence = None
+        # ival of the latest sample taken while locked, kept across reset()
+        self.good_ival = None
+        self.reset()
+
+    def configure(self, **settings):
+        unknown = set(settings) - set(DEFAULTS)
+        if unknown:
+            raise ValueError(f"Unknown lock monitor settings {sorted(unknown)}, expected {sorted(DEFAULTS)}")
+        for name, value in settings.items():
+            if value is not None:
+                self.settings[name] = float(value)
+        return dict(self.settings)
+
+    def reset(self):
+        """Forget the window and the current state; counts and events are kept."""
+        self.state = 'idle'
+        self.reasons = []
+        self.state_since = time.time()
+        self.last_sample = None
+        self._window = collections.deque()
+        self._sum_sq = 0.0
+        self._rail_since = None
+        self._last_error = None
+        self._last_jump = -math.inf
+
+    # ---------- Sequence stepping ----------
+    def expect_sequence(self, step_times, now=None):
+        """Watch setpoint_index for the steps of a shot's setpoint program.
+
+        step_times are the program's times (the first one is slot 0 and needs
+        no trigger). The sequence counts as stuck when no step arrived for
+        the longest programmed interval plus stuck_margin.
+        """
+        step_times = np.asarray(step_times, dtype=float)
+        if len(step_times) < 2:
+            self._sequence = None
+            return
+        gaps = np.diff(np.concatenate(([0.0], step_times[1:])))
+        with self._lock:
+            self._sequence = {
+                'expected': len(step_times) - 1,
+                'seen': 0,
+                'index': None,
+                'timeout': float(gaps.max()) + self.settings['stuck_margin'],
+                'last_step': time.time() if now is None else now,
+                'stuck': False,
+            }
+
+    def end_sequence(self, report=True):
+        """Stop watching the sequence; returns the number of steps that never arrived.
+
+        With report=True missing steps are recorded as a 'stuck_index' event
+        (unless one was already raised while the shot ran).
+        """
+        with self._lock:
+            sequence, self._sequence = self._sequence, None
+        if sequence is None or sequence['index'] is None or not report:
+            return 0
+        missing = max(0, sequence['expected'] - sequence['seen'])
+        if missing and not sequence['stuck']:
+            with self._lock:
+                self._event('stuck_index', f"shot ended with {missing} of {sequence['expected']} sequence steps missing")
+        return missing
+
+    def _check_sequence(self, t, index):
+        sequence = self._sequence
+        if sequence is None or math.isnan(index):
+            return False
+        index = int(index)
+        if sequence['index'] is None:
+            sequence['index'] = index
+        elif index != sequence['index']:
+            sequence['seen'] += (index - sequence['index']) % SEQUENCE_LENGTH
+            sequence['index'] = index
+            sequence['last_step'] = t
+            sequence['stuck'] = False
+        if sequence['seen'] >= sequence['expected']:
+            return False
+        if t - sequence['last_step'] > sequence['timeout']:
+            if not sequence['stuck']:
+                sequence['stuck'] = True
+                self._event('stuck_index', f"setpoint_index stuck at {index} for {t - sequence['last_step']:.2f} s "
+                                           f"({sequence['seen']} of {sequence['expected']} steps)")
+            return True
+        return False
+
+    # ---------- Samples ----------
+    def update(self, sample, paused, low, high):
+        """Evaluate one sampler sample (time, error, ival, input, setpoint_in_sequence, setpoint_index).
+
+        paused, low and high describe the active PID: whether it is paused and
+        its min_voltage/max_voltage register values. Returns the new state.
+        """
+        t, error, ival = sample[:3]
+        index = sample[5]
+        lost_event = None
+        with self._lock:
+            self.last_sample = sample
+            reasons = []
+            if self._check_sequence(t, index):
+                reasons.append('stuck_index')
+            if paused or math.isnan(error):
+                if self.state != 'idle':
+                    self._set_state('idle', reasons, t)
+                self._window.clear()
+                self._sum_sq = 0.0
+                self._rail_since = None
+                self._last_error = None
+                return self.state
+
+            settings = self.settings
+            self._window.append((t, error * error))
+            self._sum_sq += error * error
+            while self._window and self._window[0][0] < t - settings['window']:
+                self._sum_sq -= self._window.popleft()[1]
+            if self.rms > settings['rms_limit']:
+                reasons.append('rms')
+
+            low, high = max(low, -1.0), min(high, 1.0)
+            if ival <= low + settings['rail_margin'] or ival >= high - settings['rail_margin']:
+                if self._rail_since is None:
+                    self._rail_since = t
+                if t - self._rail_since >= settings['rail_time']:
+                    reasons.append('saturated')
+            else:
+                self._rail_since = None
+
+            if self._last_error is not None and abs(error - self._last_error) > settings['jump_limit']:
+                self._last_jump = t
+                self._event('jump', f"error jumped from {self._last_error:.4g} to {error:.4g}", t)
+            self._last_error = error
+            if t - self._last_jump < settings['window']:
+                reasons.append('jump')
+
+            if LOST_REASONS.intersection(reasons):
+                state = 'lost'
+            elif reasons:
+                state = 'warning'
+            else:
+                state = 'locked'
+                self.good_ival = ival
+            if state != self.state:
+                if state == 'lost':
+                    lost_event = self._event('lost', ', '.join(reasons), t)
+                elif self.state == 'lost':
+                    self._event('recovered', state, t)
+                self._set_state(state, reasons, t)
+            self.reasons = reasons
+        if lost_event is not None:
+            for listener in list(self.listeners):
+                listener(lost_event)
+        return self.state
+
+    @property
+    def rms(self):
+        if not self._window:
+            return 0.0
+        return math.sqrt(max(self._sum_sq, 0.0) / len(self._window))
+
+    def _set_state(self, state, reasons, t):
+        self.state = state
+        self.reasons = reasons
+        self.state_since = t
+
+    def _event(self, kind, detail, t=None):
+        event = {'time': time.time() if t is None else t, 'kind': kind, 'detail': detail}
+        self.events.append(event)
+        if kind in self.counts:
+            self.counts[kind] += 1
+        return event
+
+    # ---------- Queries ----------
+    def status(self):
+        """Snapshot of the current health as plain values (cheap, no hardware access)."""
+        with self._lock:
+            sample = self.last_sample
+            sequence = self._sequence
+            return {
+                'enabled': self.enabled,
+                'state': self.state if self.enabled else 'idle',
+                'reasons': list(self.reasons),
+                'since': self.state_since,
+                'rms': self.rms,
+                'time': sample[0] if sample else None,
+                'error': sample[1] if sample else None,
+                'ival': sample[2] if sample else None,
+                'good_ival': self.good_ival,
+                'setpoint_index': sample[5] if sample else None,
+                'steps': (sequence['seen'], sequence['expected']) if sequence else None,
+                'counts': dict(self.counts),
+                'last_event': self.events[-1] if self.events else None,
+                'settings': dict(self.settings),
+            }
+
+    def recent_events(self, last=None):
+        with self._lock:
+            events = list(self.events)
+        return events[-int(last):] if last else events
+
+    def clear_events(self):
+        with self._lock:
+            self.events.clear()
+            self.counts = dict.fromkeys(self.counts, 0)
@@ -0,0 +1,131 @@
+#####################################################################
+#                                                                   #
+# Red Pitaya PID (pyrpl) latency instrumentation                    #
+#                                                                   #
+# Opt-in timing of the worker's public methods and of every         #
+# hardware access (pyrpl client reads/writes), kept as rolling      #
+# windows from which percentiles and histograms are computed.       #
+#                                                                   #
+#####################################################################
+
+import functools
+import json
+import threading
+import time
+
+import numpy as np
+
+from .ring_buffer import RingBuffer
+
+# Durations kept per key for the rolling percentiles
+WINDOW = 4096
+# Histogram bin edges in seconds: 1 us to 10 s, 5 bins per decade
+HIST_EDGES = np.logspace(-6, 1, 36)
+
+
+class LatencyStats:
+    """Rolling window of durations (seconds) for one timed key."""
+
+    def __init__(self, window=WINDOW):
+        self._samples = RingBuffer(window)
+        self.count = 0
+        self.total = 0.0
+        self.bytes = 0
+
+    def add(self, seconds, nbytes=0):
+        self._samples.append(seconds)
+        self.count += 1
+        self.total += seconds
+        self.bytes += nbytes
+
+    def summary(self):
+        """count/bytes since creation; mean, p50, p95, p99 and max over the rolling window."""
+        data = self._samples.column(0)
+        result = {'count': self.count, 'bytes': self.bytes, 'total': self.total}
+        if len(data):
+            p50, p95, p99 = np.percentile(data, (50, 95, 99))
+            result.update(mean=float(data.mean()), p50=float(p50), p95=float(p95), p99=float(p99),
+                          max=float(data.max()), window=len(data))
+        return result
+
+    def histogram(self, edges=HIST_EDGES):
+        counts, _ = np.histogram(self._samples.column(0), bins=edges)
+        return counts
+
+
+class PerfRecorder:
+    """Thread-safe collection of LatencyStats keyed by 'method.<name>', 'hw.read', 'hw.write'."""
+
+    def __init__(self, window=WINDOW):
+        self.window = window
+        self._stats = {}
+        self._lock = threading.Lock()
+        self.enabled = True
+
+    def record(self, key, seconds, nbytes=0):
+        with self._lock:
+            stats = self._stats.get(key)
+            if stats is None:
+                stats = self._stats[key] = LatencyStats(self.window)
+            stats.add(seconds, nbytes)
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+
+    def stats(self):
+        """{key: summary} for every key recorded so far."""
+        with self._lock:
+            return {key: stats.summary() for key, stats in sorted(self._stats.items())}
+
+    def histograms(self, edges=HIST_EDGES):
+        with self._lock:
+            return {key: stats.histogram(edges).tolist() for key, stats in sorted(self._stats.items())}
+
+    def export(self, path):
+        """Write the summaries and histograms to a JSON file."""
+        data = {
+            'exported': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'unit': 's',
+            'hist_edges': HIST_EDGES.tolist(),
+            'stats': self.stats(),
+            'histograms': self.histograms(),
+        }
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=2)
+        return path
+
+
+def _timed(recorder, key, func, nbytes=None):
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not recorder.enabled:
+            return func(*args, **kwargs)
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            recorder.record(key, time.perf_counter() - start, nbytes(*args) if nbytes else 0)
+    wrapper._perf_wrapped = func
+    return wrapper
+
+
+def instrument_methods(obj, recorder, names, prefix='method.'):
+    """Replace obj.<name> for each name by a timed wrapper (on the instance, the class is untouched)."""
+    for name in names:
+        func = getattr(obj, name)
+        if not hasattr(func, '_perf_wrapped'):
+            setattr(obj, name, _timed(recorder, prefix + name, func))
+
+
+def instrument_client(client, recorder):
+    """Time every register read and write going through a pyrpl client.
+
+    pyrpl modules share the RedPitaya's client object, so wrapping its
+    reads/writes on the instance covers every hardware access. Bytes moved
+    are counted as 4 per 32-bit word.
+    """
+    if not hasattr(client.reads, '_perf_wrapped'):
+        client.reads = _timed(recorder, 'hw.read', client.reads, lambda addr, n: 4 * int(n))
+    if not hasattr(client.writes, '_perf_wrapped'):
+        client.writes = _timed(recorder, 'hw.write', client.writes, lambda addr, values: 4 * len(values))
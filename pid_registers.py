@@ -0,0 +1,302 @@
+#####################################################################
+#                                                                   #
+# Red Pitaya PID (pyrpl) register access helpers                    #
+#                                                                   #
+# pyrpl exposes every FPGA register as a descriptor on the module   #
+# class (FloatRegister, BoolRegister, SelectRegister, ...). Setting #
+# an attribute costs one TCP round trip; these helpers encode the   #
+# values locally and push them as contiguous block writes instead.  #
+#                                                                   #
+#####################################################################
+
+import time
+from dataclasses import dataclass, asdict, fields
+
+# Parameters that are applied through a module method rather than an attribute
+METHOD_PARAMS = {
+    'setpoint_array': 'set_setpoint_array',
+}
+
+
+def register_descriptor(module, name):
+    """Return the pyrpl register descriptor behind module.<name>, or None.
+
+    Only plain address-mapped registers qualify; properties with custom
+    getters/setters (e.g. ival) fall back to normal attribute access.
+    """
+    attr = getattr(type(module), name, None)
+    if attr is None:
+        return None
+    if not all(hasattr(attr, a) for a in ('address', 'to_python', 'from_python')):
+        return None
+    return attr
+
+
+def decode_register(module, reg, word):
+    """Convert a raw 32-bit register word to the python value pyrpl would return."""
+    bitmask = getattr(reg, 'bitmask', None)
+    if bitmask is not None:
+        word = word & bitmask
+    return reg.to_python(module, word)
+
+
+def encode_register(module, reg, value, word=None):
+    """Merge value into the raw register word at reg.address and return the new word.
+
+    word is the current content of the register and is only needed for
+    registers that share their address with others (bit fields).
+    """
+    if hasattr(reg, 'validate_and_normalize'):
+        value = reg.validate_and_normalize(module, value)
+    bit = getattr(reg, 'bit', None)
+    if bit is not None:
+        # BoolRegister: pyrpl does its own read-modify-write in from_python
+        if word is None:
+            raise ValueError(f'Register 0x{reg.address:x} needs its current word to set bit {bit}')
+        if getattr(reg, 'invert', False):
+            value = not value
+        return (word | (1 << bit)) if value else (word & ~(1 << bit))
+    raw = int(reg.from_python(module, value))
+    bitmask = getattr(reg, 'bitmask', None)
+    if bitmask is None:
+        return raw
+    if word is None:
+        raise ValueError(f'Register 0x{reg.address:x} needs its current word to apply bitmask')
+    return (word & ~bitmask) | (raw & bitmask)
+
+
+def needs_word(reg):
+    """True if encoding reg requires the current register content."""
+    return getattr(reg, 'bit', None) is not None or getattr(reg, 'bitmask', None) is not None
+
+
+def contiguous_runs(words):
+    """Group {address: word} into [(start_address, [word, ...]), ...] of adjacent 32-bit registers."""
+    runs = []
+    for addr in sorted(words):
+        if runs and addr == runs[-1][0] + 4 * len(runs[-1][1]):
+            runs[-1][1].append(words[addr])
+        else:
+            runs.append((addr, [words[addr]]))
+    return runs
+
+
+class RegisterShadow:
+    """Last known register contents of one PID module.
+
+    values caches the python value of each parameter (as pyrpl would read it
+    back), words the raw 32-bit words by address. Volatile parameters, which
+    the FPGA updates on its own, are never served from the cache, and the
+    words at their addresses are never cached: a bit field sharing such a
+    word must be merged into a fresh read. Writes matching the cache are
+    skipped, so the owner must invalidate() it whenever the hardware may
+    have changed behind its back.
+    """
+
+    VOLATILE = frozenset(['ival', 'setpoint_index', 'setpoint_in_sequence', 'sequence_wrap_flag'])
+
+    def __init__(self):
+        self.values = {}
+        self.words = {}
+        self._volatile_addresses = None
+
+    def volatile_addresses(self, module):
+        """Addresses of the register words holding a volatile parameter of module."""
+        if self._volatile_addresses is None:
+            regs = (register_descriptor(module, name) for name in self.VOLATILE)
+            self._volatile_addresses = frozenset(reg.address for reg in regs if reg is not None)
+        return self._volatile_addresses
+
+    def store_words(self, module, words):
+        """Cache raw words by address, except those sharing an address with a volatile parameter."""
+        volatile = self.volatile_addresses(module)
+        self.words.update((addr, word) for addr, word in words.items() if addr not in volatile)
+
+    def get(self, name, default=None):
+        if name in self.VOLATILE:
+            return default
+        return self.values.get(name, default)
+
+    def is_current(self, name, value):
+        """True if writing value to name would not change the hardware."""
+        if name in self.VOLATILE or name not in self.values:
+            return False
+        try:
+            return bool(self.values[name] == value)
+        except ValueError:
+            # array-like comparison
+            return list(self.values[name]) == list(value)
+
+    def update(self, name, value):
+        if name not in self.VOLATILE:
+            self.values[name] = value
+
+    def invalidate(self, names=None):
+        """Forget cached values (all of them if names is None)."""
+        if names is None:
+            self.values.clear()
+            self.words.clear()
+        else:
+            for name in names:
+                self.values.pop(name, None)
+
+
+def read_param(module, name, shadow=None):
+    """Read module.<name>, served from shadow when it holds a non-volatile value."""
+    if shadow is not None and name not in shadow.VOLATILE and name in shadow.values:
+        return shadow.values[name]
+    value = getattr(module, name)
+    if shadow is not None:
+        shadow.update(name, value)
+    return value
+
+
+def read_params(module, names, shadow=None, max_span=1024):
+    """Read several parameters of a pyrpl module with as few transactions as possible.
+
+    All register-backed parameters are fetched with block reads covering
+    their address span (split where it would exceed max_span words) and
+    decoded locally; other parameters are read one by one. The shadow, if
+    given, is refreshed with the values read.
+    """
+    regs = {}
+    for name in names:
+        reg = register_descriptor(module, name)
+        if reg is not None:
+            regs[name] = reg
+
+    words = {}
+    spans = []
+    for addr in sorted(set(reg.address for reg in regs.values())):
+        if spans and (addr - spans[-1][0]) // 4 < max_span:
+            spans[-1][1] = addr
+        else:
+            spans.append([addr, addr])
+    for start, end in spans:
+        raw = module._reads(start, (end - start) // 4 + 1)
+        for k, word in enumerate(raw):
+            words[start + 4 * k] = int(word)
+
+    values = {}
+    for name in names:
+        if name in regs:
+            values[name] = decode_register(module, regs[name], words[regs[name].address])
+        else:
+            values[name] = getattr(module, name)
+    if shadow is not None:
+        shadow.store_words(module, {reg.address: words[reg.address] for reg in regs.values()})
+        for name, value in values.items():
+            shadow.update(name, value)
+    return values
+
+
+@dataclass
+class PidSnapshot:
+    """Decoded state of one PID module, in pyrpl (digital) units."""
+    input: str
+    output_direct: str
+    setpoint: float
+    p: float
+    i: float
+    max_voltage: float
+    min_voltage: float
+    ival: float
+    pause_gains: str
+    paused: bool
+    differential_mode_enabled: bool
+    use_setpoint_sequence: bool
+    setpoint_index: int
+    setpoint_in_sequence: float
+    sequence_wrap_flag: bool
+    timestamp: float = 0.0
+
+    @classmethod
+    def names(cls):
+        return [f.name for f in fields(cls) if f.name != 'timestamp']
+
+    @classmethod
+    def read(cls, module, shadow=None):
+        """Read the whole PID register block in one transaction and decode it."""
+        values = read_params(module, cls.names(), shadow)
+        return cls(
+            input=str(values['input']),
+            output_direct=str(values['output_direct']),
+            setpoint=float(values['setpoint']),
+            p=float(values['p']),
+            i=float(values['i']),
+            max_voltage=float(values['max_voltage']),
+            min_voltage=float(values['min_voltage']),
+            ival=float(values['ival']),
+            pause_gains=str(values['pause_gains']),
+            paused=bool(values['paused']),
+            differential_mode_enabled=bool(values['differential_mode_enabled']),
+            use_setpoint_sequence=bool(values['use_setpoint_sequence']),
+            setpoint_index=int(values['setpoint_index']),
+            setpoint_in_sequence=float(values['setpoint_in_sequence']),
+            sequence_wrap_flag=bool(values['sequence_wrap_flag']),
+            timestamp=time.time(),
+        )
+
+    def as_dict(self):
+        return asdict(self)
+
+
+def write_params(module, params, shadow=None):
+    """Write {name: value} to a pyrpl module with as few transactions as possible.
+
+    Register-backed parameters are encoded locally and flushed as contiguous
+    block writes; everything else is applied one by one in the given order
+    after the block writes. With a shadow, writes that would not change the
+    cached hardware state are skipped and the cache is updated afterwards.
+    Returns the number of hardware transactions used.
+    """
+    words = {}
+    # Words with volatile bits are always read fresh, see RegisterShadow
+    known = shadow.words if shadow is not None else {}
+    fallback = []
+    pending = []
+    for name, value in params.items():
+        reg = register_descriptor(module, name)
+        if reg is None:
+            fallback.append((name, value))
+        else:
+            pending.append((name, reg, value))
+
+    transactions = 0
+    # Bit fields need the current word of their register; fetch each once
+    for _, reg, _ in pending:
+        if needs_word(reg) and reg.address not in words:
+            if reg.address in known:
+                words[reg.address] = known[reg.address]
+            else:
+                words[reg.address] = int(module._reads(reg.address, 1)[0])
+                transactions += 1
+    dirty = set()
+    written = []
+    for name, reg, value in pending:
+        word = encode_register(module, reg, value, words.get(reg.address))
+        value = decode_register(module, reg, word)
+        words[reg.address] = word
+        if shadow is None or not shadow.is_current(name, value):
+            dirty.add(reg.address)
+            written.append((name, value))
+
+    for start, run in contiguous_runs({addr: words[addr] for addr in dirty}):
+        module._writes(start, run)
+        transactions += 1
+
+    for name, value in fallback:
+        if shadow is not None and shadow.is_current(name, value):
+            continue
+        if name in METHOD_PARAMS:
+            getattr(module, METHOD_PARAMS[name])(value)
+        else:
+            setattr(module, name, value)
+        written.append((name, value))
+        transactions += 1
+
+    if shadow is not None:
+        shadow.store_words(module, words)
+        for name, value in written:
+            shadow.update(name, value)
+    return transactions
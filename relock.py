@@ -0,0 +1,210 @@
+#####################################################################
+#                                                                   #
+# Red Pitaya PID (pyrpl) automatic relock                           #
+#                                                                   #
+# Woken by the lock-health monitor's 'lost' event, a thread runs    #
+# the manual recovery (pause, preload ival, re-enable) on the       #
+# active PID and waits for the monitor to report the lock back.     #
+# Failed attempts are retried with exponential back-off. Nothing is #
+# written while a buffered shot runs.                               #
+#                                                                   #
+#####################################################################
+
+import collections
+import threading
+import time
+
+# Default settings, times in seconds
+DEFAULTS = {
+    'settle_time': 0.02,    # the monitor must report 'locked' this long for an attempt to succeed
+    'verify_timeout': 0.5,  # an attempt fails if the lock is not back within this time
+    'max_attempts': 5,      # attempts per lock loss before giving up and pausing the PID
+    'backoff': 0.05,        # wait before the second attempt, doubled for each further one
+    'backoff_max': 5.0,
+}
+# Relock events kept for get_relock_events()
+EVENT_CAPACITY = 256
+# Verification poll interval
+VERIFY_POLL = 0.001
+
+
+class AutoRelock:
+    """Relock state machine for the active PID of a worker.
+
+    state is 'disabled', 'armed' (waiting for a lock loss), 'relocking'
+    (attempt running), 'backoff' (waiting before the next attempt) or
+    'failed' (gave up; the PID was paused, re-enable to arm again).
+
+    Uses the worker's hardware lock, apply_params(), _get_param(),
+    _active_pid_id(), in_shot flag and lock_health monitor. The monitor
+    must be enabled for lock losses to be detected at all.
+    """
+
+    def __init__(self, worker, **settings):
+        self.worker = worker
+        self.monitor = worker.lock_health
+        self.settings = dict(DEFAULTS)
+        self.configure(**settings)
+        self.state = 'disabled'
+        self.attempt = 0
+        self.counts = {'triggered': 0, 'attempts': 0, 'relocked': 0, 'failed': 0, 'gave_up': 0,
+                       'skipped_in_shot': 0}
+        self.last_downtime = None
+        self.events = collections.deque(maxlen=EVENT_CAPACITY)
+        self._lost_at = None
+        self._trigger = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self.monitor.listeners.append(self._on_lost)
+
+    def configure(self, **settings):
+        unknown = set(settings) - set(DEFAULTS)
+        if unknown:
+            raise ValueError(f"Unknown relock settings {sorted(unknown)}, expected {sorted(DEFAULTS)}")
+        for name, value in settings.items():
+            if value is not None:
+                self.settings[name] = int(value) if name == 'max_attempts' else float(value)
+        return dict(self.settings)
+
+    # ---------- Control ----------
+    def start(self):
+        """Arm the state machine (also after it gave up)."""
+        self.state = 'armed'
+        self.attempt = 0
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._loop, name='rp_pid_relock', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self.state = 'disabled'
+        self._stop.set()
+        self._trigger.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2.0)
+            self._thread = None
+
+    @property
+    def enabled(self):
+        return self.state != 'disabled'
+
+    def _on_lost(self, event):
+        # Called from the sampler thread: only note the loss, the relock thread acts on it
+        if self.state != 'armed':
+            return
+        self._lost_at = event['time']
+        self._trigger.set()
+
+    def poke(self):
+        """Start a relock if the monitor still reports the lock lost, e.g. once a shot is over."""
+        if self.state == 'armed' and self.monitor.enabled and self.monitor.state == 'lost':
+            self._lost_at = time.time()
+            self._trigger.set()
+
+    # ---------- Thread ----------
+    def _loop(self):
+        while not self._stop.is_set():
+            if not self._trigger.wait(0.1):
+                continue
+            self._trigger.clear()
+            if self.state != 'armed' or self._stop.is_set():
+                continue
+            try:
+                self._relock()
+            except Exception as e:
+                self._event('error', str(e))
+                self.worker.log.exception('Auto relock failed')
+                if self.state != 'disabled':
+                    self.state = 'armed'
+
+    def _relock(self):
+        self.counts['triggered'] += 1
+        lost_at = self._lost_at or time.time()
+        for attempt in range(1, int(self.settings['max_attempts']) + 1):
+            self.attempt = attempt
+            if attempt > 1:
+                self.state = 'backoff'
+                delay = min(self.settings['backoff'] * 2 ** (attempt - 2), self.settings['backoff_max'])
+                if self._stop.wait(delay):
+                    return
+            if self.state == 'disabled':
+                return
+            self.state = 'relocking'
+            result = self._attempt()
+            if result == 'in_shot':
+                self.counts['skipped_in_shot'] += 1
+                self._event('skipped', 'a buffered shot is running')
+                self.state = 'armed'
+                return
+            self.counts['attempts'] += 1
+            if result == 'locked':
+                self.counts['relocked'] += 1
+                self.last_downtime = time.time() - lost_at
+                self._event('relocked', f'attempt {attempt}, down {self.last_downtime * 1e3:.1f} ms')
+                self.worker.log.info('Relocked %s on attempt %d after %.1f ms', self.worker._active_pid_id(),
+                                     attempt, self.last_downtime * 1e3)
+                self.state = 'armed'
+                self.attempt = 0
+                return
+            self.counts['failed'] += 1
+            self._event('failed', f'attempt {attempt}: {result}')
+        self._give_up()
+
+    def _attempt(self):
+        """One pause / preload / re-enable cycle; returns 'locked', 'in_shot' or why it failed."""
+        worker = self.worker
+        good_ival = self.monitor.good_ival
+        with worker._hw_lock:
+            # Checked under the lock: transition_to_buffered sets it while holding the lock
+            if worker.in_shot:
+                return 'in_shot'
+            pid_id = worker._active_pid_id()
+            pause_gains = worker._get_param(pid_id, 'pause_gains')
+            worker.apply_params({pid_id: {'pause_gains': 'pi', 'paused': True}})
+            if good_ival is not None:
+                worker.apply_params({pid_id: {'ival': good_ival}})
+            # The window still holds the unlocked samples
+            self.monitor.reset()
+            worker.apply_params({pid_id: {'pause_gains': pause_gains, 'paused': False}})
+
+        deadline = time.time() + self.settings['verify_timeout']
+        while time.time() < deadline:
+            if self._stop.is_set() or self.state == 'disabled':
+                return 'stopped'
+            if worker.in_shot:
+                return 'in_shot'
+            status = self.monitor.status()
+            if (status['state'] == 'locked' and status['time'] is not None
+                    and status['time'] - status['since'] >= self.settings['settle_time']):
+                return 'locked'
+            time.sleep(VERIFY_POLL)
+        return f"not locked after {self.settings['verify_timeout']} s ({self.monitor.state})"
+
+    def _give_up(self):
+        self.counts['gave_up'] += 1
+        self.state = 'failed'
+        worker = self.worker
+        with worker._hw_lock:
+            if not worker.in_shot:
+                worker.apply_params({worker._active_pid_id(): {'pause_gains': 'pi', 'paused': True}})
+        self._event('gave_up', f"{self.settings['max_attempts']:.0f} attempts failed, PID paused")
+        worker.log.error('Auto relock gave up after %d attempts, %s paused', self.attempt, worker._active_pid_id())
+
+    def _event(self, kind, detail):
+        self.events.append({'time': time.time(), 'kind': kind, 'detail': detail})
+
+    # ---------- Queries ----------
+    def status(self):
+        return {
+            'state': self.state,
+            'attempt': self.attempt,
+            'counts': dict(self.counts),
+            'last_downtime': self.last_downtime,
+            'good_ival': self.monitor.good_ival,
+            'last_event': self.events[-1] if self.events else None,
+            'settings': dict(self.settings),
+        }
+
+    def recent_events(self, last=None):
+        events = list(self.events)
+        return events[-int(last):] if last else events
@@ -0,0 +1,82 @@
+#####################################################################
+#                                                                   #
+# Fixed-capacity NumPy ring buffer                                  #
+#                                                                   #
+#####################################################################
+
+import numpy as np
+
+
+class RingBuffer:
+    """Fixed-capacity buffer of rows of `width` floats with O(1) append.
+
+    Every row is stored twice, `capacity` columns apart, so the most recent
+    rows always form one contiguous slice of the backing array: view() and
+    column() never copy, and each column is C-contiguous.
+    """
+
+    def __init__(self, capacity, width=1, dtype=float):
+        if capacity < 1:
+            raise ValueError('RingBuffer capacity must be at least 1')
+        self.capacity = int(capacity)
+        self.width = int(width)
+        self._data = np.zeros((self.width, 2 * self.capacity), dtype=dtype)
+        self._head = 0  # slot the next row goes to
+        self._len = 0
+        self.total = 0  # rows appended since creation or clear()
+
+    def __len__(self):
+        return self._len
+
+    def clear(self):
+        self._head = 0
+        self._len = 0
+        self.total = 0
+
+    def append(self, row):
+        """Append one row (a scalar if width == 1)."""
+        self._data[:, self._head] = row
+        self._data[:, self._head + self.capacity] = row
+        self._head = (self._head + 1) % self.capacity
+        self._len = min(self._len + 1, self.capacity)
+        self.total += 1
+
+    def extend(self, rows):
+        """Append an array of shape (n, width) (or (n,) if width == 1)."""
+        rows = np.asarray(rows, dtype=self._data.dtype).reshape(-1, self.width)
+        n = len(rows)
+        self.total += n
+        if n > self.capacity:
+            rows = rows[-self.capacity:]
+            n = self.capacity
+        if n == 0:
+            return
+        idx = (self._head + np.arange(n)) % self.capacity
+        self._data[:, idx] = rows.T
+        self._data[:, idx + self.capacity] = rows.T
+        self._head = (self._head + n) % self.capacity
+        self._len = min(self._len + n, self.capacity)
+
+    def view(self, last=None):
+        """Return the most recent rows (all, or the last `last`) as a (width, n) view."""
+        n = self._len if last is None else min(int(last), self._len)
+        end = self._head + self.capacity
+        return self._data[:, end - n:end]
+
+    def column(self, j, last=None):
+        """Return column j of view() as a contiguous 1D view."""
+        return self.view(last)[j]
+
+    def since(self, total):
+        """Return the rows appended after the buffer had seen `total` rows.
+
+        Rows that have already been overwritten are silently dropped.
+        """
+        return self.view(max(0, self.total - int(total)))
+
+    def resized(self, capacity):
+        """Return a new buffer with the given capacity holding the most recent rows."""
+        new = RingBuffer(capacity, self.width, self._data.dtype)
+        new.extend(self.view().T)
+        new.total = self.total
+        return new
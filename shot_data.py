@@ -0,0 +1,80 @@
+#####################################################################
+#                                                                   #
+# Red Pitaya PID (pyrpl) shot file helpers                          #
+#                                                                   #
+# Shared by the labscript device (writing) and the BLACS worker     #
+# (reading), so both sides agree on the stored format.              #
+#                                                                   #
+#####################################################################
+
+import hashlib
+
+import numpy as np
+
+# dtype used for setpoint arrays in the shot file
+SETPOINT_DTYPE = '<f4'
+# Per-channel setpoint record: volts at the input and the 14-bit register value in counts
+SETPOINT_RECORD_DTYPE = np.dtype([('physical', SETPOINT_DTYPE), ('digital', '<i2')])
+
+
+def array_hash(array):
+    """Content hash of a setpoint array as stored in the shot file."""
+    data = np.ascontiguousarray(array, dtype=SETPOINT_DTYPE)
+    return hashlib.sha1(data.tobytes()).hexdigest()
+
+# PID parameters a shot can set per channel, with their types. Units are those of
+# the tab: setpoint in volts at the input, min/max_voltage in volts at the output,
+# p and i as pyrpl gains, ival in pyrpl units (+-1)
+SHOT_PARAMS = {
+    'p': float,
+    'i': float,
+    'ival': float,
+    'setpoint': float,
+    'min_voltage': float,
+    'max_voltage': float,
+    'pause_gains': str,
+    'paused': bool,
+    'input': str,
+    'output_direct': str,
+    'differential_mode_enabled': bool,
+    'use_setpoint_sequence': bool,
+}
+
+# Entries in the FPGA setpoint sequence (stepped by DIO3_P/DIO4_P rising edges)
+SEQUENCE_LENGTH = 16
+# Setpoint resolution: 14-bit register over the +-1 digital range
+SETPOINT_STEP = 2 ** -13
+SETPOINT_MIN = -1.0
+SETPOINT_MAX = 1.0 - SETPOINT_STEP
+
+
+def to_counts(digital):
+    """Quantize pyrpl digital setpoints (+-1) to 14-bit register counts."""
+    digital = np.asarray(digital, dtype=float)
+    return np.round(np.clip(digital, SETPOINT_MIN, SETPOINT_MAX) / SETPOINT_STEP).astype('<i2')
+
+
+def from_counts(counts):
+    """Register counts back to pyrpl digital setpoints."""
+    return np.asarray(counts, dtype=float) * SETPOINT_STEP
+
+
+def setpoint_record(physical, digital):
+    """Structured array of (physical, digital counts) rows as stored in the shot file."""
+    record = np.empty(len(physical), dtype=SETPOINT_RECORD_DTYPE)
+    record['physical'] = physical
+    record['digital'] = to_counts(digital)
+    return record
+
+
+def read_device_group(group):
+    """Read a device group in one pass: {channel: {'attrs': {...}, name: (data, attrs), ...}}."""
+    result = {}
+    for channel, channel_group in group.items():
+        if not hasattr(channel_group, 'items'):
+            continue
+        entry = {'attrs': dict(channel_group.attrs)}
+        for name, dataset in channel_group.items():
+            entry[name] = (dataset[()], dict(dataset.attrs))
+        result[channel] = entry
+    return result
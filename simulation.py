@@ -0,0 +1,712 @@
+#####################################################################
+#                                                                   #
+# Red Pitaya PID (pyrpl) simulated hardware                         #
+#                                                                   #
+# In-process stand-in for Pyrpl(hostname=...), selected with       #
+# ip_addr='sim://[board][?key=value&...]'. It models the registers  #
+# of the modified PID modules, the scope, and a first-order plant   #
+# closing each loop (out1 -> in1, out2 -> in2). Every register      #
+# access goes through a client with configurable latency, so the    #
+# worker runs unchanged on a laptop or in CI.                       #
+#                                                                   #
+#####################################################################
+
+import math
+import os
+import tempfile
+import threading
+import time
+from urllib.parse import parse_qsl, urlsplit
+
+import numpy as np
+
+SIM_SCHEME = 'sim://'
+
+# Query parameters of a sim:// address and their defaults
+DEFAULTS = {
+    'latency': 0.0,         # seconds per register access (read or write)
+    'bandwidth': 0.0,       # link throughput in bytes per second, 0: unlimited
+    'noise': 0.0,           # rms noise on the inputs, digital units
+    'gain': 1.0,            # plant gain from outN to inN
+    'offset': 0.0,          # plant output with the DAC at digital zero
+    'tau': 1e-4,            # plant time constant, seconds
+    'delay': 0.0,           # plant dead time, seconds (scope traces only)
+    'scope_wait': 1.0,      # 1: a scope trace takes its real duration, 0: ready at once
+    'dna': 0x5A5A5A5A5A5A5A,
+    'config': '',           # YAML config file; default: a temporary file per board
+}
+
+# Address map (module bases as in pyrpl; register offsets are this model's)
+HK_BASE = 0x40000000
+SCOPE_BASE = 0x40100000
+PID_BASES = {'pid0': 0x40300000, 'pid1': 0x40310000}
+IVAL = 0x100
+SETPOINT_ARRAY = 0x140      # 16 words
+MANUAL_STEP = 0x180
+SEQUENCE_LENGTH = 16
+
+CLOCK = 125e6
+SCOPE_POINTS = 2 ** 14
+SCOPE_DATA = (0x10000, 0x20000)     # channel 1/2 data buffers
+SCOPE_SIM_POINTS = 1024             # plant steps per trace, interpolated to SCOPE_POINTS
+MAX_DT = 1e-4                       # largest plant step when following wall time
+MAX_STEPS = 100                     # plant steps per advance()
+I_MAX = 2.5e6                       # integrator gain limit of the modified bitstream
+
+DSP_INPUTS = {'in1': 0, 'in2': 1, 'out1': 2, 'out2': 3, 'pid0': 4, 'pid1': 5, 'off': 15}
+OUTPUT_DIRECT = {'off': 0, 'out1': 1, 'out2': 2, 'both': 3}
+PAUSE_GAINS = {'off': 0, 'i': 1, 'p': 2, 'pi': 3, 'd': 4, 'id': 5, 'pd': 6, 'pid': 7}
+TRIGGER_SOURCES = {'off': 0, 'immediately': 1, 'ch1_positive_edge': 2, 'ch1_negative_edge': 3,
+                   'ch2_positive_edge': 4, 'ch2_negative_edge': 5, 'ext_positive_edge': 6,
+                   'ext_negative_edge': 7}
+DECIMATIONS = {d: d for d in (1, 8, 64, 1024, 8192, 65536)}
+
+
+def parse_address(address):
+    """Split 'sim://board?latency=0.001' into ('board', {parameter: value})."""
+    parts = urlsplit(address)
+    params = dict(DEFAULTS)
+    for key, value in parse_qsl(parts.query):
+        if key not in DEFAULTS:
+            raise ValueError(f"Unknown simulation parameter {key}, must be one of {list(DEFAULTS)}")
+        params[key] = type(DEFAULTS[key])(int(value, 0) if key == 'dna' else value)
+    return parts.netloc or 'default', params
+
+
+# ---------- Register descriptors (same interface as pyrpl's) ----------
+class SimRegister:
+    """Signed fixed point register: value = raw / norm over `bits` bits (like pyrpl's FloatRegister)."""
+
+    bitmask = None
+
+    def __init__(self, address, bits=14, norm=2 ** 13, min=None, max=None):
+        self.address = address
+        self.bits = bits
+        self.norm = norm
+        self.min = -2 ** (bits - 1) / norm if min is None else min
+        self.max = (2 ** (bits - 1) - 1) / norm if max is None else max
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, obj, objtype=None):
+        if obj is None:
+            return self
+        word = int(obj._reads(self.address, 1)[0])
+        if self.bitmask is not None:
+            word &= self.bitmask
+        return self.to_python(obj, word)
+
+    def __set__(self, obj, value):
+        word = self.from_python(obj, self.validate_and_normalize(obj, value))
+        if self.bitmask is not None:
+            word = (int(obj._reads(self.address, 1)[0]) & ~self.bitmask) | (word & self.bitmask)
+        obj._writes(self.address, [word])
+
+    def to_python(self, obj, word):
+        raw = word & ((1 << self.bits) - 1)
+        if raw >= 1 << (self.bits - 1):
+            raw -= 1 << self.bits
+        return raw / self.norm
+
+    def from_python(self, obj, value):
+        return int(round(value * self.norm)) & ((1 << self.bits) - 1)
+
+    def validate_and_normalize(self, obj, value):
+        value = min(max(float(value), self.min), self.max)
+        return self.to_python(obj, self.from_python(obj, value))
+
+
+class SimIntRegister(SimRegister):
+    """Unsigned integer register."""
+
+    def __init__(self, address, bits):
+        super().__init__(address, bits, 1, 0, 2 ** bits - 1)
+
+    def to_python(self, obj, word):
+        return int(word & ((1 << self.bits) - 1))
+
+    def from_python(self, obj, value):
+        return int(value) & ((1 << self.bits) - 1)
+
+    def validate_and_normalize(self, obj, value):
+        return int(min(max(int(value), self.min), self.max))
+
+
+class SimSelectRegister(SimRegister):
+    """Register holding one of a set of named options."""
+
+    def __init__(self, address, options, bitmask=None):
+        self.address = address
+        self.options = options
+        self.bitmask = bitmask
+        self._names = {value: key for key, value in options.items()}
+
+    def to_python(self, obj, word):
+        return self._names.get(word, word)
+
+    def from_python(self, obj, value):
+        return self.options[value]
+
+    def validate_and_normalize(self, obj, value):
+        if value not in self.options:
+            raise ValueError(f"Invalid option {value} for {self.name}, must be one of {list(self.options)}")
+        return value
+
+
+class SimBoolRegister(SimRegister):
+    """Single bit of a register word."""
+
+    def __init__(self, address, bit, invert=False):
+        self.address = address
+        self.bit = bit
+        self.invert = invert
+
+    def __set__(self, obj, value):
+        word = int(obj._reads(self.address, 1)[0])
+        if bool(value) != self.invert:
+            word |= 1 << self.bit
+        else:
+            word &= ~(1 << self.bit)
+        obj._writes(self.address, [word])
+
+    def to_python(self, obj, word):
+        return bool((word >> self.bit) & 1) != self.invert
+
+    def from_python(self, obj, value):
+        return (1 << self.bit) if bool(value) != self.invert else 0
+
+    def validate_and_normalize(self, obj, value):
+        return bool(value)
+
+
+# Registers that are not plain attributes of a module
+IVAL_REGISTER = SimRegister(IVAL, bits=16, min=-1.0, max=1.0 - 2 ** -13)
+SETPOINT_REGISTER = SimRegister(0x104)
+VOLTAGE_REGISTER = SimRegister(0x0)
+
+
+# ---------- Bus ----------
+class SimClient:
+    """Register bus with the interface of pyrpl's client (reads/writes).
+
+    Every access sleeps for `latency` plus the transfer time at `bandwidth`
+    and is counted, so benchmarks see realistic round-trip costs.
+    """
+
+    def __init__(self, latency=0.0, bandwidth=0.0):
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self._modules = []
+        self._lock = threading.RLock()
+        self.reset_counters()
+
+    def reset_counters(self):
+        self.read_count = 0
+        self.write_count = 0
+        self.bytes_read = 0
+        self.bytes_written = 0
+
+    def attach(self, module):
+        self._modules.append(module)
+        self._modules.sort(key=lambda m: m._addr_base, reverse=True)
+
+    def _route(self, addr):
+        for module in self._modules:
+            if addr >= module._addr_base:
+                return module, addr - module._addr_base
+        raise ValueError(f"No simulated module at address 0x{addr:x}")
+
+    def _wait(self, nbytes):
+        delay = self.latency + (nbytes / self.bandwidth if self.bandwidth else 0.0)
+        if delay > 0:
+            time.sleep(delay)
+
+    def reads(self, addr, n):
+        self._wait(4 * n)
+        with self._lock:
+            self.read_count += 1
+            self.bytes_read += 4 * n
+            module, offset = self._route(addr)
+            return np.asarray(module._bus_read(offset, n), dtype=np.uint32)
+
+    def writes(self, addr, values):
+        self._wait(4 * len(values))
+        with self._lock:
+            self.write_count += 1
+            self.bytes_written += 4 * len(values)
+            module, offset = self._route(addr)
+            for k, word in enumerate(values):
+                module._write_word(offset + 4 * k, int(word) & 0xFFFFFFFF)
+
+
+class SimModule:
+    """Base of the simulated hardware modules: a word memory behind the bus."""
+
+    def __init__(self, board, name, addr_base):
+        self._board = board
+        self._client = board.client
+        self.name = name
+        self._addr_base = addr_base
+        self._mem = {}
+        self._client.attach(self)
+
+    def _reads(self, addr, n):
+        return self._client.reads(self._addr_base + addr, n)
+
+    def _writes(self, addr, values):
+        self._client.writes(self._addr_base + addr, values)
+
+    def _bus_read(self, offset, n):
+        return [self._read_word(offset + 4 * k) for k in range(n)]
+
+    def _read_word(self, offset):
+        return self._mem.get(offset, 0)
+
+    def _write_word(self, offset, word):
+        self._mem[offset] = word
+
+    def _value(self, name):
+        """Decoded register value without a bus access (for the plant model)."""
+        reg = getattr(type(self), name)
+        word = self._read_word(reg.address)
+        if reg.bitmask is not None:
+            word &= reg.bitmask
+        return reg.to_python(self, word)
+
+    def _reset(self):
+        self._mem.clear()
+
+
+class SimHk(SimModule):
+    @property
+    def dna(self):
+        low, high = self._reads(0x4, 2)
+        return int(low) | (int(high) << 32)
+
+    def _read_word(self, offset):
+        if offset == 0x4:
+            return self._board.params['dna'] & 0xFFFFFFFF
+        if offset == 0x8:
+            return (self._board.params['dna'] >> 32) & 0xFFFFFFFF
+        return super()._read_word(offset)
+
+
+class SimPid(SimModule):
+    """PID module of the modified bitstream, including the 16-entry setpoint sequence."""
+
+    input = SimSelectRegister(0x0, DSP_INPUTS)
+    output_direct = SimSelectRegister(0x4, OUTPUT_DIRECT, bitmask=0b11)
+    setpoint = SimRegister(0x104)
+    p = SimRegister(0x108, bits=24, norm=2 ** 12)
+    i = SimRegister(0x10C, bits=25, norm=2 ** 24 / I_MAX)
+    max_voltage = SimRegister(0x124)
+    min_voltage = SimRegister(0x128)
+    pause_gains = SimSelectRegister(0x12C, PAUSE_GAINS, bitmask=0b111)
+    paused = SimBoolRegister(0x12C, 3)
+    differential_mode_enabled = SimBoolRegister(0x12C, 4)
+    use_setpoint_sequence = SimBoolRegister(0x130, 0)
+    setpoint_index = SimIntRegister(0x134, bits=4)
+    setpoint_in_sequence = SimRegister(0x138)
+    sequence_wrap_flag = SimBoolRegister(0x13C, 0)
+
+    PARAMS = ('input', 'output_direct', 'setpoint', 'p', 'i', 'max_voltage', 'min_voltage',
+              'pause_gains', 'paused', 'differential_mode_enabled', 'use_setpoint_sequence')
+
+    @property
+    def ival(self):
+        return IVAL_REGISTER.to_python(self, int(self._reads(IVAL, 1)[0]))
+
+    @ival.setter
+    def ival(self, value):
+        value = IVAL_REGISTER.validate_and_normalize(self, value)
+        self._writes(IVAL, [IVAL_REGISTER.from_python(self, value)])
+
+    def set_setpoint_array(self, array):
+        """Load the setpoint sequence (up to 16 values, zero padded) in one block write."""
+        values = list(array)[:SEQUENCE_LENGTH]
+        values += [0.0] * (SEQUENCE_LENGTH - len(values))
+        self._writes(SETPOINT_ARRAY, [
+            SETPOINT_REGISTER.from_python(self, SETPOINT_REGISTER.validate_and_normalize(self, v))
+            for v in values
+        ])
+
+    def reset_sequence_index(self):
+        self._writes(0x134, [0])
+
+    def manually_change_setpoint(self):
+        self._writes(MANUAL_STEP, [1])
+
+    # bus side
+    def _read_word(self, offset):
+        if offset == IVAL:
+            self._board.advance()
+            return IVAL_REGISTER.from_python(self, self._board.state['ival'][self.name])
+        if offset == 0x138:
+            return self._read_word(SETPOINT_ARRAY + 4 * self._value('setpoint_index'))
+        return super()._read_word(offset)
+
+    def _write_word(self, offset, word):
+        if offset == IVAL:
+            self._board.advance()
+            self._board.state['ival'][self.name] = IVAL_REGISTER.to_python(self, word)
+            scope = self._board.scope
+            if scope._snapshot is not None and scope._trace is None:
+                # Written while the scope is armed: a step at t = 0 of the trace, like register changes
+                scope._snapshot['ival'][self.name] = self._board.state['ival'][self.name]
+        elif offset == MANUAL_STEP:
+            self.step_sequence()
+        elif offset == 0x134:
+            # writing the index also clears the wrap flag
+            self._mem[0x134] = word & 0xF
+            self._mem[0x13C] = 0
+        elif offset in (0x138, 0x13C):
+            pass  # read-only
+        else:
+            self._board.advance()
+            super()._write_word(offset, word)
+
+    def step_sequence(self):
+        """Advance the setpoint index as a trigger edge would; wrapping to 0 sets the wrap flag."""
+        index = (self._value('setpoint_index') + 1) % SEQUENCE_LENGTH
+        self._mem[0x134] = index
+        if index == 0:
+            self._mem[0x13C] = 1
+
+    def _reset(self):
+        super()._reset()
+        self._mem[0x124] = SimPid.max_voltage.from_python(self, SimPid.max_voltage.max)
+        self._mem[0x128] = SimPid.min_voltage.from_python(self, SimPid.min_voltage.min)
+
+    def _params(self):
+        values = {name: self._value(name) for name in self.PARAMS}
+        if values['use_setpoint_sequence']:
+            values['setpoint'] = self._value('setpoint_in_sequence')
+        return values
+
+
+class SimScope(SimModule):
+    """Scope with the low-level acquisition calls the worker uses."""
+
+    input1 = SimSelectRegister(0x200, DSP_INPUTS)
+    input2 = SimSelectRegister(0x204, DSP_INPUTS)
+    trigger_source = SimSelectRegister(0x4, TRIGGER_SOURCES)
+    decimation = SimSelectRegister(0x14, DECIMATIONS)
+    average = SimBoolRegister(0x28, 0)
+    voltage_in1 = SimRegister(0x154)
+    voltage_in2 = SimRegister(0x158)
+
+    decimations = list(DECIMATIONS)
+    data_length = SCOPE_POINTS
+
+    def __init__(self, board, name, addr_base):
+        super().__init__(board, name, addr_base)
+        self._armed_at = None
+        self._snapshot = None
+        self._trace = None
+
+    @property
+    def sampling_time(self):
+        return self._value('decimation') / CLOCK
+
+    @property
+    def duration(self):
+        return self.sampling_time * SCOPE_POINTS
+
+    @property
+    def times(self):
+        return np.arange(SCOPE_POINTS) * self.sampling_time
+
+    def _start_acquisition(self):
+        self._writes(0x0, [1])
+
+    def _data_ready(self):
+        self._reads(0x0, 1)
+        if self._armed_at is None:
+            return False
+        return not self._board.params['scope_wait'] or time.perf_counter() - self._armed_at >= self.duration
+
+    def _get_curve(self):
+        return np.array([self._decode(self._reads(base, SCOPE_POINTS)) for base in SCOPE_DATA])
+
+    @staticmethod
+    def _decode(words):
+        raw = np.asarray(words, dtype=np.int64) & 0x3FFF
+        raw[raw >= 0x2000] -= 0x4000
+        return raw / 2 ** 13
+
+    # bus side
+    def _bus_read(self, offset, n):
+        for ch, base in enumerate(SCOPE_DATA):
+            if base <= offset < base + 4 * SCOPE_POINTS:
+                if self._trace is None:
+                    start_state = self._snapshot or self._board.copy_state()
+                    self._trace = self._board.scope_trace(
+                        self._value('input1'), self._value('input2'), self.duration, start_state)
+                start = (offset - base) // 4
+                data = np.round(self._trace[ch][start:start + n] * 2 ** 13).astype(np.int64)
+                return np.clip(data, -2 ** 13, 2 ** 13 - 1) & 0x3FFF
+        return super()._bus_read(offset, n)
+
+    def _read_word(self, offset):
+        if offset in (0x154, 0x158):
+            value = self._board.voltage('in1' if offset == 0x154 else 'in2')
+            return VOLTAGE_REGISTER.from_python(self, VOLTAGE_REGISTER.validate_and_normalize(self, value))
+        if offset == 0x0:
+            return 0 if self._armed_at is None else 1
+        return super()._read_word(offset)
+
+    def _write_word(self, offset, word):
+        if offset == 0x0 and word & 1:
+            self._board.advance()
+            self._armed_at = time.perf_counter()
+            self._snapshot = self._board.copy_state()
+            self._trace = None
+        else:
+            super()._write_word(offset, word)
+
+
+# ---------- Plant model ----------
+class SimBoard:
+    """One simulated Red Pitaya: registers, plant state and config (plays the role of pyrpl's Pyrpl.rp)."""
+
+    def __init__(self, name, params):
+        self.name = name
+        self.params = params
+        self.client = SimClient(params['latency'], params['bandwidth'])
+        self.hk = SimHk(self, 'hk', HK_BASE)
+        self.scope = SimScope(self, 'scope', SCOPE_BASE)
+        self.pid0 = SimPid(self, 'pid0', PID_BASES['pid0'])
+        self.pid1 = SimPid(self, 'pid1', PID_BASES['pid1'])
+        self.pids = {'pid0': self.pid0, 'pid1': self.pid1}
+        self._rng = np.random.default_rng()
+        self._lock = threading.RLock()
+        self.reload()
+
+    def configure(self, params):
+        self.params = params
+        self.client.latency = params['latency']
+        self.client.bandwidth = params['bandwidth']
+
+    def reload(self):
+        """Model a bitstream reload: every register and the plant back to reset."""
+        with self._lock:
+            for module in (self.hk, self.scope, self.pid0, self.pid1):
+                module._reset()
+            self.state = {
+                'y': {'in1': self.params['offset'], 'in2': self.params['offset']},
+                'ival': {name: 0.0 for name in self.pids},
+                'p_hold': {name: 0.0 for name in self.pids},
+                'out': {name: 0.0 for name in self.pids},
+            }
+            self._t = time.perf_counter()
+
+    def end_all(self):
+        pass
+
+    def update_fpga(self):
+        """As pyrpl's RedPitaya.update_fpga(): load the bitstream, resetting every register."""
+        self.reload()
+
+    def start(self):
+        pass
+
+    def copy_state(self):
+        return {key: dict(value) for key, value in self.state.items()}
+
+    def trigger(self, pid_name):
+        """External sequence trigger edge on a PID (as from a labscript DigitalOut)."""
+        with self._lock:
+            self.pids[pid_name].step_sequence()
+
+    def voltage(self, channel):
+        self.advance()
+        noise = self.params['noise']
+        return self.state['y'][channel] + (self._rng.normal(0, noise) if noise else 0.0)
+
+    def advance(self):
+        """Run the plant up to the current wall time."""
+        with self._lock:
+            now = time.perf_counter()
+            elapsed = now - self._t
+            if elapsed <= 0:
+                return
+            self._t = now
+            steps = min(MAX_STEPS, max(1, int(math.ceil(elapsed / MAX_DT))))
+            regs = {name: pid._params() for name, pid in self.pids.items()}
+            for _ in range(steps):
+                self._step(self.state, elapsed / steps, regs)
+
+    def _signal(self, state, name):
+        if name in ('in1', 'in2'):
+            return state['y'][name]
+        if name in self.pids:
+            return state['out'][name]
+        if name in ('out1', 'out2'):
+            return self._output(state, name, None)
+        return 0.0
+
+    def _output(self, state, output, regs):
+        regs = regs or {name: pid._params() for name, pid in self.pids.items()}
+        return sum(state['out'][name] for name, r in regs.items() if r['output_direct'] in (output, 'both'))
+
+    def _step(self, state, h, regs):
+        """One implicit Euler step of the PIDs and plants (stable for any h)."""
+        y = state['y']
+        g = self.params['gain']
+        k = h / self.params['tau']
+        new_y = dict(y)
+        closed = set()
+        for n in ('1', '2'):
+            inp, out = 'in' + n, 'out' + n
+            drivers = [name for name, r in regs.items() if r['output_direct'] in (out, 'both')]
+            loops = [name for name in drivers if regs[name]['input'] == inp]
+            loop = loops[0] if loops else None
+            drive = self.params['offset'] + g * sum(state['out'][name] for name in drivers if name != loop)
+            if loop is None:
+                new_y[inp] = (y[inp] + k * drive) / (1 + k)
+                continue
+            closed.add(loop)
+            r = regs[loop]
+            sp = y['in2'] if r['differential_mode_enabled'] else r['setpoint']
+            w, pe, pc = self._gains(state, loop, r)
+            a = state['ival'][loop] + h * w * sp
+            yn = (y[inp] + k * (g * (pe * sp + pc + a) + drive)) / (1 + k * (1 + g * pe + g * h * w))
+            ival = min(max(a - h * w * yn, -1.0), 1.0)
+            output = pe * (sp - yn) + pc + ival
+            low, high = max(r['min_voltage'], -1.0), min(r['max_voltage'], 1.0)
+            if not low <= output <= high:
+                # saturated: the plant sees the clipped output
+                output = min(max(output, low), high)
+                yn = (y[inp] + k * (g * output + drive)) / (1 + k)
+                ival = min(max(state['ival'][loop] + h * w * (sp - yn), -1.0), 1.0)
+            new_y[inp] = yn
+            self._update(state, loop, r, ival, output, pe * (sp - yn))
+        for name, r in regs.items():
+            if name in closed:
+                continue
+            sp = y['in2'] if r['differential_mode_enabled'] else r['setpoint']
+            error = sp - self._signal(state, r['input'])
+            w, pe, pc = self._gains(state, name, r)
+            ival = min(max(state['ival'][name] + h * w * error, -1.0), 1.0)
+            output = min(max(pe * error + pc + ival, max(r['min_voltage'], -1.0)), min(r['max_voltage'], 1.0))
+            self._update(state, name, r, ival, output, pe * error)
+        state['y'] = new_y
+
+    @staticmethod
+    def _gains(state, name, r):
+        """(integrator rate, active p, held p term) honouring pause_gains."""
+        frozen = r['pause_gains'] if r['paused'] else ''
+        w = 0.0 if 'i' in frozen else 2 * math.pi * r['i']
+        if 'p' in frozen:
+            return w, 0.0, state['p_hold'][name] if r['p'] else 0.0
+        return w, r['p'], 0.0
+
+    @staticmethod
+    def _update(state, name, r, ival, output, p_term):
+        state['ival'][name] = ival
+        state['out'][name] = output
+        frozen = r['pause_gains'] if r['paused'] else ''
+        if 'p' not in frozen:
+            state['p_hold'][name] = p_term
+
+    def scope_trace(self, input1, input2, duration, start_state):
+        """Simulate both scope channels over `duration` from `start_state` with the current registers.
+
+        Anything changed right after arming (the worker's `action`) thus acts
+        as a step at t = 0; so do ival writes, see SimPid._write_word(). The
+        plant dead time shifts the input traces.
+        """
+        with self._lock:
+            regs = {name: pid._params() for name, pid in self.pids.items()}
+            state = {key: dict(value) for key, value in start_state.items()}
+            h = duration / SCOPE_SIM_POINTS
+            coarse = np.empty((2, SCOPE_SIM_POINTS))
+            names = (input1, input2)
+            for j in range(SCOPE_SIM_POINTS):
+                for ch, name in enumerate(names):
+                    coarse[ch, j] = self._signal(state, name)
+                self._step(state, h, regs)
+        t_coarse = np.arange(SCOPE_SIM_POINTS) * h
+        t = np.arange(SCOPE_POINTS) * (duration / SCOPE_POINTS)
+        trace = np.empty((2, SCOPE_POINTS))
+        for ch, name in enumerate(names):
+            shift = self.params['delay'] if name in ('in1', 'in2') else 0.0
+            trace[ch] = np.interp(t - shift, t_coarse, coarse[ch], left=coarse[ch, 0])
+        if self.params['noise']:
+            trace += self._rng.normal(0, self.params['noise'], trace.shape)
+        return trace
+
+
+# ---------- Config ----------
+class SimConfig:
+    """Minimal stand-in for pyrpl's MemoryTree: a YAML file exposed as nested branches."""
+
+    def __init__(self, filename, data=None, root=None):
+        self._filename = filename
+        self._root = root or self
+        if data is None:
+            data = {}
+            if os.path.exists(filename):
+                import yaml
+                with open(filename, 'r', encoding='utf-8') as f:
+                    data = yaml.safe_load(f) or {}
+        self._data = data
+
+    def _keys(self):
+        return list(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def __getitem__(self, key):
+        value = self._data[key]
+        if isinstance(value, dict):
+            return SimConfig(self._filename, value, self._root)
+        return value
+
+    def __setitem__(self, key, value):
+        self._data[key] = value
+        self._root._save()
+
+    def _save(self):
+        import yaml
+        with open(self._filename, 'w', encoding='utf-8') as f:
+            yaml.dump(self._data, f, allow_unicode=True)
+
+
+# ---------- Entry point ----------
+_boards = {}
+_boards_lock = threading.Lock()
+
+
+class SimPyrpl:
+    """Drop-in for pyrpl.Pyrpl(hostname=..., reloadfpga=...) on a simulated board.
+
+    Boards live for the whole process, keyed by the name in the address, so
+    a second connection with reloadfpga=False finds the state the first one
+    left behind (as after a BLACS restart).
+    """
+
+    def __init__(self, hostname=SIM_SCHEME, reloadfpga=True, **kwargs):
+        name, params = parse_address(hostname)
+        with _boards_lock:
+            board = _boards.get(name)
+            if board is None:
+                board = _boards[name] = SimBoard(name, params)
+                if not params['config']:
+                    fd, params['config'] = tempfile.mkstemp(prefix=f'rp_pid_sim_{name}_', suffix='.yml')
+                    os.close(fd)
+                board.config = SimConfig(params['config'])
+            else:
+                params['config'] = params['config'] or board.params['config']
+                board.configure(params)
+        if reloadfpga:
+            board.reload()
+        self.rp = board
+        self.c = board.config
+
+
+def get_board(name='default'):
+    """The simulated board behind a sim:// address (e.g. to inject triggers or read the bus counters)."""
+    return _boards[name]
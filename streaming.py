@@ -0,0 +1,143 @@
+#####################################################################
+#                                                                   #
+# Red Pitaya PID (pyrpl) setpoint sequence streaming                #
+#                                                                   #
+# The FPGA sequence table has 16 slots and wraps around. A longer   #
+# sequence is played by treating the table as two 8-entry halves:   #
+# while the trigger edges step through one half, the host rewrites  #
+# the other half with the next page of the sequence.                #
+#                                                                   #
+#####################################################################
+
+import threading
+
+from .pid_registers import read_params, write_params
+from .shot_data import SEQUENCE_LENGTH
+
+PAGE = SEQUENCE_LENGTH // 2
+# Seconds between two polls of setpoint_index; must stay well below PAGE trigger periods
+STREAM_POLL = 0.002
+
+
+class SetpointStreamer:
+    """Plays a setpoint sequence of any length through the 16-slot table of one PID.
+
+    values are register (digital) setpoints. load() writes the first 16
+    entries and resets the index; start() then polls setpoint_index and
+    sequence_wrap_flag from a thread and refills the half of the table the
+    hardware has left. An underrun is counted whenever the hardware reaches
+    an entry that was not written in time, i.e. it played a stale value.
+    """
+
+    def __init__(self, pid, values, lock, shadow=None, poll_interval=STREAM_POLL):
+        if not len(values):
+            raise ValueError('Cannot stream an empty setpoint sequence')
+        self.pid = pid
+        self.values = [float(v) for v in values]
+        self.lock = lock
+        self.shadow = shadow
+        self.poll_interval = poll_interval
+        self.table = [0.0] * SEQUENCE_LENGTH
+        self.loaded = 0          # sequence entries written to the table so far
+        self.position = 0        # sequence entry the hardware is on
+        self.underruns = 0
+        self.pages_written = 0
+        self.error = None
+        self._cycle = 0
+        self._last_index = 0
+        self._wrapped = False
+        self._thread = None
+        self._stop = threading.Event()
+
+    def __len__(self):
+        return len(self.values)
+
+    def _value(self, entry):
+        # Past the end the last value is repeated, so extra triggers change nothing
+        return self.values[min(entry, len(self.values) - 1)]
+
+    def _fill(self, end):
+        """Write sequence entries [loaded, end) into their table slots with one block write."""
+        if end <= self.loaded:
+            return
+        for entry in range(self.loaded, end):
+            self.table[entry % SEQUENCE_LENGTH] = self._value(entry)
+        self.loaded = end
+        # The active half is rewritten with the values it already holds
+        write_params(self.pid, {'setpoint_array': list(self.table)}, self.shadow)
+        self.pages_written += 1
+
+    def load(self):
+        """Write the first table and restart the sequence at entry 0. Call with the lock held."""
+        self.loaded = 0
+        self.position = 0
+        self._cycle = 0
+        self._last_index = 0
+        self._wrapped = False
+        self._fill(SEQUENCE_LENGTH)
+        self.pid.reset_sequence_index()
+
+    def poll(self):
+        """Track the hardware position and refill the table. Call with the lock held."""
+        state = read_params(self.pid, ['setpoint_index', 'sequence_wrap_flag'])
+        index = int(state['setpoint_index'])
+        if index < self._last_index:
+            self._cycle += 1
+        elif state['sequence_wrap_flag'] and not self._wrapped and self._cycle == 0:
+            # The flag is set on the first wrap; seeing it without the index going
+            # back means a whole table went by between two polls
+            self._cycle += 1
+            self.underruns += 1
+        self._wrapped = bool(state['sequence_wrap_flag'])
+        self._last_index = index
+        self.position = self._cycle * SEQUENCE_LENGTH + index
+
+        if self.position >= self.loaded:
+            # The hardware is already playing entries that were never written
+            self.underruns += 1
+            self.loaded = (self.position // PAGE) * PAGE
+        # Keep the current half and the next one written; at the end hold the last value everywhere
+        end = (self.position // PAGE + 2) * PAGE
+        if self.done:
+            end = max(end, self.position + SEQUENCE_LENGTH)
+        self._fill(end)
+        return self.position
+
+    @property
+    def done(self):
+        return self.position >= len(self.values) - 1
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name='rp_pid_streamer', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2.0)
+            self._thread = None
+
+    def _loop(self):
+        while not self._stop.is_set() and not self.done:
+            # Don't block on the lock: stop() may be called by its holder
+            if not self.lock.acquire(timeout=self.poll_interval):
+                continue
+            try:
+                self.poll()
+            except Exception as e:
+                self.error = str(e)
+            finally:
+                self.lock.release()
+            self._stop.wait(self.poll_interval)
+
+    def status(self):
+        return {
+            'length': len(self.values),
+            'position': self.position,
+            'loaded': self.loaded,
+            'pages_written': self.pages_written,
+            'underruns': self.underruns,
+            'done': self.done,
+            'error': self.error,
+        }
@@ -0,0 +1,291 @@
+#####################################################################
+#                                                                   #
+# Red Pitaya PID (pyrpl) regression tests on the simulated board    #
+#                                                                   #
+# Drive the BLACS worker and the labscript device against sim://    #
+# (simulation.py): worker start and fast attach, shutdown, the      #
+# setpoint() compile path and one shot through                      #
+# transition_to_buffered/transition_to_manual.                      #
+#                                                                   #
+# Run from the repository directory: python -m pytest -q            #
+#                                                                   #
+#####################################################################
+
+import importlib
+import os
+import sys
+import uuid
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+labscript = pytest.importorskip('labscript')
+h5py = pytest.importorskip('h5py')
+pytest.importorskip('blacs')
+
+# The package is the repository directory itself; import it by name from its parent.
+# The directory must not be on sys.path itself (python -m pytest adds the working
+# directory), or labscript_devices would resolve to this package's module.
+ROOT = Path(__file__).resolve().parent.parent
+sys.path[:] = [entry for entry in sys.path if Path(entry or '.').resolve() != ROOT]
+sys.path.insert(0, str(ROOT.parent))
+PACKAGE = ROOT.name
+
+calibration = importlib.import_module(f'{PACKAGE}.calibration')
+simulation = importlib.import_module(f'{PACKAGE}.simulation')
+workers = importlib.import_module(f'{PACKAGE}.blacs_workers')
+device_module = importlib.import_module(f'{PACKAGE}.labscript_devices')
+shot_data = importlib.import_module(f'{PACKAGE}.shot_data')
+
+DEVICE_NAME = 'red_pitaya'
+
+
+@pytest.fixture(autouse=True)
+def calibration_dir(tmp_path, monkeypatch):
+    """Keep the calibration files of the tests out of the home directory."""
+    directory = tmp_path / 'calibration'
+    monkeypatch.setattr(calibration, 'CALIBRATION_DIR', str(directory))
+    return directory
+
+
+@pytest.fixture
+def address(tmp_path):
+    """A fresh simulated board with its pyrpl config in tmp_path."""
+    return f"sim://{uuid.uuid4().hex}?config={tmp_path / 'pyrpl.yml'}"
+
+
+@pytest.fixture
+def make_worker(address):
+    """Create and initialise workers without a BLACS process around them; shut down at the end."""
+    started = []
+
+    def make(**properties):
+        worker = workers.red_pitaya_pyrpl_pid_worker.__new__(workers.red_pitaya_pyrpl_pid_worker)
+        worker.ip_addr = address
+        worker.device_name = DEVICE_NAME
+        worker.fast_attach = False
+        for name, value in properties.items():
+            setattr(worker, name, value)
+        worker.init()
+        started.append(worker)
+        return worker
+
+    yield make
+    for worker in started:
+        worker.relock.stop()
+        worker.stop_sampler(client=None)
+
+
+def compile_shot(path, address, program):
+    """Compile a shot file; program(device) adds the instructions between start and stop."""
+    from labscript_devices.DummyIntermediateDevice import DummyIntermediateDevice
+    from labscript_devices.DummyPseudoclock.labscript_devices import DummyPseudoclock
+
+    labscript.labscript_init(str(path), new=True, overwrite=True, load_globals_values=False)
+    try:
+        pseudoclock = DummyPseudoclock('pseudoclock')
+        dio = DummyIntermediateDevice('dio', parent_device=pseudoclock.clockline)
+        trigger = labscript.DigitalOut('step_in1', dio, 'port0/line0')
+        device = device_module.red_pitaya_pyrpl_pid(DEVICE_NAME, ip_addr=address, in1_trigger=trigger)
+        # The dummy clockline cannot resolve pulses at its 1 us limit reliably
+        device.trigger_duration = 2e-6
+        labscript.start()
+        program(device)
+        labscript.stop(1.0)
+    finally:
+        labscript.labscript_cleanup()
+    return path
+
+
+def board(worker):
+    return simulation.get_board(simulation.parse_address(worker.ip_addr)[0])
+
+
+def pid_state(worker, pid_id='in1'):
+    return {name: worker._get_param(pid_id, name) for name in ('paused', 'pause_gains', 'ival')}
+
+
+# ---------- Start, fast attach and shutdown ----------
+def test_failed_attach_probe_reuses_the_connection(make_worker, monkeypatch):
+    created = []
+
+    class CountingPyrpl(simulation.SimPyrpl):
+        def __init__(self, *args, **kwargs):
+            created.append(kwargs.get('reloadfpga'))
+            super().__init__(*args, **kwargs)
+
+    monkeypatch.setattr(simulation, 'SimPyrpl', CountingPyrpl)
+    worker = make_worker(fast_attach=True)
+    assert worker.startup_mode == 'full'
+    assert worker.startup_reason == 'no previous session recorded'
+    assert created == [False]
+
+
+def test_fast_attach_keeps_the_lock_across_a_restart(make_worker):
+    worker = make_worker(fast_attach=True)
+    worker.apply_params({'in1': {'paused': False, 'pause_gains': 'off', 'ival': 0.3}})
+    worker.shutdown()
+
+    worker = make_worker(fast_attach=True)
+    assert worker.startup_mode == 'attach'
+    state = pid_state(worker)
+    assert state['paused'] is False
+    assert state['pause_gains'] == 'off'
+    assert worker.set_in1_enabled
+
+
+@pytest.mark.parametrize('properties', [{'fast_attach': True, 'park_on_shutdown': True}, {'fast_attach': False}])
+def test_shutdown_parks_the_pids_when_asked(make_worker, properties):
+    worker = make_worker(**properties)
+    worker.apply_params({'in1': {'paused': False, 'pause_gains': 'off', 'ival': 0.3}})
+    worker.shutdown()
+    assert pid_state(worker) == {'paused': True, 'pause_gains': 'pi', 'ival': pytest.approx(-0.99, abs=1e-3)}
+
+
+# ---------- setpoint() compile path ----------
+def test_setpoint_checks_the_calibrated_register_range(tmp_path, address):
+    cal = calibration.default_calibrations()['in1']
+    values = [1.05] + [0.3 + k * shot_data.SETPOINT_STEP for k in range(20)]
+
+    def program(device):
+        for k, value in enumerate(values):
+            device.setpoint(0.01 * k, value)
+
+    with pytest.raises(labscript.LabscriptError, match='more than 16'):
+        # 1.05 V is inside the register range with the in1 calibration; the slots run out instead
+        compile_shot(tmp_path / 'shot.h5', address, program)
+
+    counts = shot_data.to_counts(cal.to_digital(np.asarray(values)))
+    distinct = 1 + int(np.count_nonzero(np.diff(counts)))
+    assert distinct < len(values)
+
+    def short_program(device):
+        for k, value in enumerate(values[:12]):
+            device.setpoint(0.01 * k, value)
+
+    path = compile_shot(tmp_path / 'short.h5', address, short_program)
+    with h5py.File(path, 'r') as f:
+        dataset = f[f'devices/{DEVICE_NAME}/in1/digital_setpoint_array']
+        record = dataset[:]
+        step_times = dataset.attrs['step_times']
+    expected = shot_data.to_counts(cal.to_digital(np.asarray(values[:12])))
+    slots = 1 + int(np.count_nonzero(np.diff(expected)))
+    # One slot (and trigger pulse) per distinct register value, none for repeated counts
+    assert len(step_times) == slots
+    assert list(record['digital'][:slots]) == sorted(set(expected.tolist()), key=expected.tolist().index)
+
+
+def test_setpoint_outside_the_register_range_is_rejected(tmp_path, address):
+    with pytest.raises(labscript.LabscriptError, match='register units'):
+        compile_shot(tmp_path / 'shot.h5', address, lambda device: device.setpoint(0, 1.5))
+
+
+# ---------- Shot ----------
+def test_shot_uploads_the_compiled_counts(tmp_path, make_worker):
+    worker = make_worker()
+    # A calibration measured in the tab goes to the file the compiler reads
+    worker.calibration['in1'] = calibration.ChannelCalibration.linear(0.01, 0.46)
+    worker._save_calibration()
+
+    setpoints = [0.1, 0.2, 0.35]
+
+    def program(device):
+        for k, value in enumerate(setpoints):
+            device.setpoint(0.1 * k, value)
+
+    path = compile_shot(tmp_path / 'shot.h5', worker.ip_addr, program)
+    with h5py.File(path, 'r') as f:
+        counts = f[f'devices/{DEVICE_NAME}/in1/digital_setpoint_array'][:]['digital']
+
+    worker.clear_recent_log()
+    worker.transition_to_buffered(DEVICE_NAME, str(path), {}, True)
+    assert worker.in_shot
+    messages = [event['message'] for event in worker.get_recent_log()['events']]
+    assert not any('converting setpoints' in message for message in messages)
+    assert not any(event['level'] == 'ERROR' for event in worker.get_recent_log()['events'])
+
+    pid = worker._get_pid('in1')
+    played = [pid.setpoint_in_sequence]
+    for _ in setpoints[1:]:
+        board(worker).trigger(pid.name)
+        played.append(pid.setpoint_in_sequence)
+    np.testing.assert_allclose(played, shot_data.from_counts(counts[:len(setpoints)]))
+
+    result = worker.transition_to_manual()
+    assert not worker.in_shot
+    assert set(result) == {'in1', 'in2'}
+
+
+def test_fresh_shot_rewrites_a_board_changed_outside_the_worker(tmp_path, make_worker):
+    worker = make_worker()
+    setpoints = [0.1, 0.2]
+
+    def program(device):
+        for k, value in enumerate(setpoints):
+            device.setpoint(0.1 * k, value)
+
+    path = compile_shot(tmp_path / 'shot.h5', worker.ip_addr, program)
+    with h5py.File(path, 'r') as f:
+        counts = f[f'devices/{DEVICE_NAME}/in1/digital_setpoint_array'][:]['digital']
+    worker.transition_to_buffered(DEVICE_NAME, str(path), {}, True)
+    worker.transition_to_manual()
+
+    # Overwrite the table behind the worker's back; the shadow still holds the shot's
+    pid = worker._get_pid('in1')
+    pid.set_setpoint_array(np.zeros(shot_data.SEQUENCE_LENGTH))
+    worker.transition_to_buffered(DEVICE_NAME, str(path), {}, True)
+    table = [simulation.SETPOINT_REGISTER.to_python(pid, word)
+             for word in pid._reads(simulation.SETPOINT_ARRAY, len(setpoints))]
+    np.testing.assert_allclose(table, shot_data.from_counts(counts[:len(setpoints)]))
+    worker.transition_to_manual()
+
+
+def test_full_start_rewrites_registers_changed_outside_the_worker(make_worker):
+    worker = make_worker()
+    worker.apply_params({'in1': {'p': 0.5}})
+    worker.write_to_config()
+    pid = worker._get_pid('in1')
+    pid.p = 0.0
+    worker._full_start()
+    assert pid.p == pytest.approx(0.5)
+
+
+# ---------- Config file ----------
+def test_config_is_written_once_and_atomically(make_worker, monkeypatch):
+    worker = make_worker()
+    worker.apply_params({'in1': {'p': 0.25}})
+    saves = []
+    monkeypatch.setattr(worker.p.c, '_save', lambda: saves.append(True))
+    replaced = []
+    real_replace = os.replace
+    monkeypatch.setattr(workers.os, 'replace', lambda *args: replaced.append(args) or real_replace(*args))
+
+    path = worker.write_to_config()
+    # Only the temp file + os.replace write; pyrpl's tree must not rewrite the file in place
+    assert saves == []
+    assert [dst for _, dst in replaced] == [path]
+    assert worker._config_section('blacs')['in1_p'] == pytest.approx(0.25)
+    assert simulation.SimConfig(path)['blacs']['in1_p'] == pytest.approx(0.25)
+
+
+# ---------- Tab view ----------
+def test_view_version_ignores_volatile_fields(make_worker):
+    worker = make_worker()
+    first = worker.refresh_view()
+    worker.apply_params({'in1': {'ival': 0.4}})
+    second = worker.refresh_view()
+    assert second['ival'] != first['ival']
+    assert second['version'] == first['version']
+    worker.apply_params({'in1': {'p': 0.75}})
+    assert worker.refresh_view()['version'] == first['version'] + 1
+
+
+def test_setpoint_array_longer_than_the_table_is_rejected(tmp_path, address):
+    def program(device):
+        device.set_setpoint_array('in1', np.linspace(0.1, 0.2, shot_data.SEQUENCE_LENGTH + 1))
+
+    with pytest.raises(labscript.LabscriptError, match='stream_setpoints=True'):
+        compile_shot(tmp_path / 'shot.h5', address, program)